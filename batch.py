@@ -0,0 +1,106 @@
+# batch.py
+# -*- coding: utf-8 -*-
+"""
+추천운동1~3이 비어 있는 (사용자, 날짜) 기록을 한꺼번에 추천해서 저장
+
+  python batch.py [--date 2025-11-06] [--workers 8] [--rate 5] [--ranking-mode llm|local]
+                  [--city Seoul] [--limit 100] [--dry-run]
+
+결과는 마지막에 storage.save_recommendations_bulk()로 한 번에 기록함.
+LLM 순위는 화면용 예산/회로 차단기 없이 끝까지 기다리고, 그래도 실패해 로컬 점수로 채운
+결과는 저장하지 않음 (실패로 집계되어 다음 실행에서 다시 대상이 됨)
+"""
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from storage import get_storage
+from engine import recommend
+from local_ranker import RANKING_MODE
+from llm_guard import is_fallback
+from ratelimit import ProviderLimiter
+
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "8"))
+# 초당 최대 추천 시작 수 (0이면 제한 없음).
+# OpenAI/Spotify 호출 자체는 ratelimit의 공용 제한기(OPENAI_RPS 등)가 다른 요청과 함께 조절함
+BATCH_RATE = float(os.getenv("BATCH_RATE", "5"))
+
+
+def run_batch(storage, pick_date=None, workers=BATCH_WORKERS, rate=BATCH_RATE,
+              ranking_mode=None, city="Seoul", limit=None, dry_run=False, log=None) -> dict:
+    """
+    대상 기록마다 infer_target_intensity → filter_candidates → 순위를 동시에 실행하고
+    성공한 결과만 모아 한 번에 저장. 요약 dict 반환
+    """
+    log = log or (lambda msg: None)
+    pending = storage.pending_recommendations(pick_date)
+    if limit is not None:
+        pending = pending[:limit]
+    log(f"대상 {len(pending)}건")
+
+    # 시작 간격만 벌림 (순간 허용량 1, 동시 실행 수는 workers가 정함)
+    limiter = ProviderLimiter("batch", rate, burst=1, timeout=None)
+
+    def job(user_name, day):
+        with limiter.slot():
+            result = recommend(
+                storage, user_name, pick_date=day, city=city,
+                ranking_mode=ranking_mode, save=False, llm_budget=0, llm_breaker=False
+            )
+        if is_fallback(result["top3"]):
+            raise RuntimeError("LLM 순위 실패 (로컬 대체 결과는 저장하지 않음)")
+        return result["top3"]
+
+    t0 = time.perf_counter()
+    results = []
+    failed = []
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="batch") as pool:
+        futures = {pool.submit(job, u, d): (u, d) for u, d in pending}
+        for fut in as_completed(futures):
+            user_name, day = futures[fut]
+            try:
+                results.append((user_name, day, fut.result()))
+            except Exception as e:
+                failed.append((user_name, day, f"{type(e).__name__}: {e}"))
+                log(f"실패 {user_name} {day}: {e}")
+
+    saved = 0
+    if results and not dry_run:
+        saved = storage.save_recommendations_bulk(results)
+
+    return {
+        "pending": len(pending),
+        "ranked": len(results),
+        "saved": saved,
+        "failed": failed,
+        "seconds": round(time.perf_counter() - t0, 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="비어 있는 추천을 일괄 생성")
+    parser.add_argument("--date", default=None, help="이 날짜 기록만 (YYYY-MM-DD), 생략하면 전체")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS)
+    parser.add_argument("--rate", type=float, default=BATCH_RATE, help="초당 최대 추천 수 (0=무제한)")
+    parser.add_argument("--ranking-mode", choices=["llm", "local"], default=RANKING_MODE)
+    parser.add_argument("--city", default="Seoul")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--dry-run", action="store_true", help="저장하지 않고 결과 수만 확인")
+    args = parser.parse_args(argv)
+
+    summary = run_batch(
+        get_storage(), pick_date=args.date, workers=args.workers, rate=args.rate,
+        ranking_mode=args.ranking_mode, city=args.city, limit=args.limit,
+        dry_run=args.dry_run, log=lambda msg: print(msg, file=sys.stderr)
+    )
+    print(
+        f"대상 {summary['pending']}건 / 추천 {summary['ranked']}건 / 저장 {summary['saved']}건 / "
+        f"실패 {len(summary['failed'])}건 ({summary['seconds']}초)"
+    )
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
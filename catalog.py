@@ -0,0 +1,577 @@
+# catalog.py
+# -*- coding: utf-8 -*-
+import os
+import sys
+import json
+import shutil
+import time
+import argparse
+import threading
+import traceback
+import numpy as np
+import pandas as pd
+
+from emotions import EMOTION_NAMES
+from tracing import span
+
+INTENSITY_ORDER = ["저강도", "중강도", "고강도"]
+
+REQUIRED_COLS = ["운동명", "운동강도", "운동목적", "감정매핑", "단위체중당에너지소비량"]
+
+# 후보가 이 개수보다 적으면 인접 강도로 확장
+MIN_CANDIDATES = 5
+
+
+# =========================
+# 1) 운동 데이터 전처리
+# =========================
+def split_tags(s):
+    if pd.isna(s):
+        return []
+    return [x.strip() for x in str(s).split(",") if x.strip()]
+
+def normalize_intensity(x):
+    x = str(x).strip()
+    x = x.replace(" ", "").replace(",,", ",").strip(",")
+    return x
+
+def neighbor_intensities(target_intensity):
+    if target_intensity not in INTENSITY_ORDER:
+        return {target_intensity}
+    idx = INTENSITY_ORDER.index(target_intensity)
+    near = {target_intensity}
+    if idx - 1 >= 0:
+        near.add(INTENSITY_ORDER[idx - 1])
+    if idx + 1 < len(INTENSITY_ORDER):
+        near.add(INTENSITY_ORDER[idx + 1])
+    return near
+
+# =========================
+# 1-1) 태그 비트셋 (태그 목록 → uint64 한 칸)
+# =========================
+MAX_TAGS = 64
+
+
+class TagVocab:
+    """
+    태그 → 비트 위치. 한 번 정한 비트는 바뀌지 않고 새 태그는 뒤에만 붙음 (프로세스 전체 공유).
+    안 쓰게 된 태그의 비트도 재사용하지 않음 (예전 비트셋/컴파일 파일이 다른 태그를 가리키게 되므로) -
+    MAX_TAGS를 넘으면 ValueError이고 갱신은 이전 카탈로그를 유지, 프로세스를 다시 시작하면 새로 정함.
+    감정매핑은 emotions.py 어휘를 앞에 깔아 두어 daily의 감정_마스크와 같은 비트를 씀
+    """
+    def __init__(self, base=()):
+        self.tags = []
+        self._bit = {}
+        self._lock = threading.Lock()
+        for tag in base:
+            self._register(tag)
+
+    def __len__(self):
+        return len(self.tags)
+
+    def register_all(self, tags) -> list:
+        """tags를 순서대로 등록하고 각 비트 위치 반환"""
+        with self._lock:
+            return [self._register(tag) for tag in tags]
+
+    def _register(self, tag):
+        i = self._bit.get(tag)
+        if i is None:
+            if len(self.tags) >= MAX_TAGS:
+                raise ValueError(f"태그 종류가 {MAX_TAGS}개를 넘습니다: {tag}")
+            i = self._bit[tag] = len(self.tags)
+            self.tags.append(tag)
+        return i
+
+    def encode(self, tags, register=False) -> int:
+        """태그 목록 → 비트셋 (어휘에 없는 태그는 register=True일 때만 새로 등록, 아니면 무시)"""
+        bits = 0
+        for tag in tags:
+            i = self._bit.get(tag)
+            if i is None and register:
+                with self._lock:
+                    i = self._register(tag)
+            if i is not None:
+                bits |= 1 << i
+        return bits
+
+    def encode_column(self, tag_lists) -> np.ndarray:
+        return np.array([self.encode(tags, register=True) for tags in tag_lists], dtype=np.uint64)
+
+    def decode(self, bits) -> list:
+        bits = int(bits)
+        return [tag for i, tag in enumerate(self.tags) if bits >> i & 1]
+
+
+PURPOSE_TAGS = TagVocab()
+EMOTION_TAGS = TagVocab(EMOTION_NAMES)
+INTENSITY_TAGS = TagVocab(INTENSITY_ORDER)
+
+
+def popcount(bits) -> np.ndarray:
+    bits = np.asarray(bits, dtype=np.uint64)
+    if hasattr(np, "bitwise_count"):  # numpy 2.0+
+        return np.bitwise_count(bits)
+    return np.unpackbits(bits.reshape(-1, 1).view(np.uint8), axis=1).sum(axis=1)
+
+
+def has_any(bits: np.ndarray, query: int) -> np.ndarray:
+    """각 행 비트셋에 query 비트가 하나라도 있는지 (bool 배열)"""
+    return (bits & np.uint64(query)) != 0
+
+
+# 전처리로 생기는 컬럼 (나머지는 원본 그대로)
+DERIVED_COLS = ["_src_hash", "운동목적_bits", "감정매핑_bits", "운동강도_bits"]
+
+
+def source_hashes(wdf: pd.DataFrame) -> np.ndarray:
+    """원본 행별 해시 (다시 읽었을 때 바뀐 행만 골라내는 데 사용)"""
+    return pd.util.hash_pandas_object(wdf, index=False).to_numpy(dtype=np.uint64)
+
+
+def prepare_workouts(wdf: pd.DataFrame) -> pd.DataFrame:
+    """
+    목적/감정매핑/강도는 행마다 파이썬 리스트 대신 uint64 비트셋 컬럼(*_bits)으로 보관
+    (원문 컬럼은 프롬프트용으로 그대로 둠). _src_hash는 원본 행 해시
+    """
+    missing = [c for c in REQUIRED_COLS if c not in wdf.columns]
+    if missing:
+        raise ValueError(f"workout.csv에 컬럼이 부족합니다: {missing}")
+
+    wdf = wdf.copy()
+    wdf["_src_hash"] = source_hashes(wdf)
+    wdf["운동강도"] = wdf["운동강도"].apply(normalize_intensity)
+    wdf["운동목적_bits"] = PURPOSE_TAGS.encode_column(wdf["운동목적"].apply(split_tags))
+    wdf["감정매핑_bits"] = EMOTION_TAGS.encode_column(wdf["감정매핑"].apply(split_tags))
+    wdf["운동강도_bits"] = INTENSITY_TAGS.encode_column([[v] for v in wdf["운동강도"]])
+
+    wdf["단위체중당에너지소비량"] = pd.to_numeric(
+        wdf["단위체중당에너지소비량"], errors="coerce"
+    ).fillna(0)
+
+    return wdf.reset_index(drop=True)
+
+
+# =========================
+# 2) 후보 색인 (목적/강도 비트셋 → 행 위치)
+# =========================
+class WorkoutIndex:
+    """
+    목적/강도 비트셋 컬럼으로 후보를 고르는 색인.
+    (목적, 강도) 조합별 최종 후보 위치는 처음 조회 시 계산 후 재사용
+    """
+    def __init__(self, wdf: pd.DataFrame):
+        self.size = len(wdf)
+        self.purpose_bits = wdf["운동목적_bits"].to_numpy(dtype=np.uint64)
+        self.intensity_bits = wdf["운동강도_bits"].to_numpy(dtype=np.uint64)
+        self._positions = {}
+        self._lock = threading.Lock()
+
+    def candidate_positions(self, purpose, target_intensity) -> np.ndarray:
+        key = (purpose, target_intensity)
+        hit = self._positions.get(key)
+        if hit is not None:
+            return hit
+
+        # 목적 AND 강도를 카탈로그 전체에 한 번에
+        purpose_mask = has_any(self.purpose_bits, PURPOSE_TAGS.encode([purpose]))
+        mask = purpose_mask & has_any(self.intensity_bits, INTENSITY_TAGS.encode([target_intensity]))
+        if mask.sum() < MIN_CANDIDATES:
+            near = INTENSITY_TAGS.encode(neighbor_intensities(target_intensity))
+            mask = purpose_mask & has_any(self.intensity_bits, near)
+
+        positions = np.flatnonzero(mask)
+        with self._lock:
+            self._positions[key] = positions
+        return positions
+
+    def carry_over(self, new_df, old_to_new, affected_purposes) -> "WorkoutIndex":
+        """
+        new_df용 색인. 바뀐 행의 목적(affected_purposes 비트)과 무관한 조합은
+        기존 후보 위치를 새 위치로 옮겨서 그대로 쓰고, 나머지는 다음 조회 때 다시 계산
+        """
+        index = WorkoutIndex(new_df)
+        with self._lock:
+            cached = list(self._positions.items())
+        for (purpose, target_intensity), positions in cached:
+            if PURPOSE_TAGS.encode([purpose]) & affected_purposes:
+                continue
+            index._positions[(purpose, target_intensity)] = np.sort(old_to_new[positions])
+        return index
+
+
+class WorkoutCatalog:
+    def __init__(self, wdf: pd.DataFrame, prepared=False, index=None):
+        self.df = wdf if prepared else prepare_workouts(wdf)
+        self.index = index or WorkoutIndex(self.df)
+        # 직전 카탈로그에서 갱신된 경우 변경 내역 (refresh_catalog)
+        self.changes = None
+
+    def __len__(self):
+        return len(self.df)
+
+    def candidates(self, purpose, target_intensity) -> pd.DataFrame:
+        positions = self.index.candidate_positions(purpose, target_intensity)
+        return self.df.iloc[positions].reset_index(drop=True)
+
+
+def refresh_catalog(old: WorkoutCatalog, wdf: pd.DataFrame) -> WorkoutCatalog:
+    """
+    다시 읽은 원본(wdf)을 이전 카탈로그와 원본 행 해시(운동명 포함)로 비교해서
+    바뀌거나 새로 생긴 행만 전처리하고, 색인도 영향받는 목적의 항목만 다시 계산.
+    원본 컬럼 구성이 달라졌으면 전체를 다시 만듦
+    """
+    raw_cols = [c for c in old.df.columns if c not in DERIVED_COLS]
+    if list(wdf.columns) != raw_cols:
+        return WorkoutCatalog(wdf)
+
+    wdf = wdf.reset_index(drop=True)
+    new_hash = source_hashes(wdf)
+
+    # 행 해시(운동명 포함) + 같은 해시 안에서의 순번으로 짝지음 (완전히 같은 행이 여러 개여도 1:1)
+    def keys(hashes):
+        occurrence = pd.Series(hashes).groupby(hashes).cumcount().to_numpy()
+        return pd.MultiIndex.from_arrays([hashes, occurrence])
+
+    reuse = keys(old.df["_src_hash"].to_numpy(dtype=np.uint64)).get_indexer(keys(new_hash))
+
+    changed = reuse < 0
+    kept_new = np.flatnonzero(~changed)
+    kept_old = reuse[kept_new]
+    removed = np.setdiff1d(np.arange(len(old.df)), kept_old)
+    if not changed.any() and not len(removed) and np.array_equal(kept_old, kept_new):
+        return old
+
+    parts = [old.df.iloc[kept_old].set_axis(kept_new)]
+    prepared = None
+    if changed.any():
+        prepared = prepare_workouts(wdf[changed]).set_axis(np.flatnonzero(changed))
+        parts.append(prepared)
+    df = pd.concat(parts).sort_index().reset_index(drop=True)
+
+    # 없어진 행(이전 값)과 새로 전처리한 행이 가진 목적 → 그 목적의 후보 위치만 무효
+    affected = np.bitwise_or.reduce(
+        old.df["운동목적_bits"].to_numpy(dtype=np.uint64)[removed], initial=np.uint64(0)
+    )
+    if prepared is not None:
+        affected |= np.bitwise_or.reduce(
+            prepared["운동목적_bits"].to_numpy(dtype=np.uint64), initial=np.uint64(0)
+        )
+
+    old_to_new = np.full(len(old.df), -1)
+    old_to_new[kept_old] = kept_new
+    catalog = WorkoutCatalog(
+        df, prepared=True, index=old.index.carry_over(df, old_to_new, int(affected))
+    )
+    catalog.changes = {
+        "reused": len(kept_new), "prepared": int(changed.sum()), "removed": len(removed),
+        "index_kept": len(catalog.index._positions),
+    }
+    return catalog
+
+
+# =========================
+# 3) 컴파일된 카탈로그 파일 (콜드 스타트용)
+#   catalog_cache/v<형식>-<원본 내용 해시>/ 에 전처리 결과를 컬럼별 .npy로 저장하고 mmap으로 읽음
+#   (같은 파일을 읽는 여러 프로세스가 OS 페이지 캐시를 공유).
+#   원본 내용이 바뀌면 해시가 달라지므로 자동으로 원본 → 전처리 경로로 돌아감
+# =========================
+CATALOG_ARTIFACT_DIR = os.getenv("CATALOG_ARTIFACT_DIR", "catalog_cache")
+CATALOG_ARTIFACT_DISABLED = os.getenv("CATALOG_ARTIFACT_DISABLED", "").strip().lower() in ("1", "true", "yes")
+ARTIFACT_FORMAT = 2
+
+_TAG_VOCABS = {
+    "운동목적_bits": PURPOSE_TAGS,
+    "감정매핑_bits": EMOTION_TAGS,
+    "운동강도_bits": INTENSITY_TAGS,
+}
+
+
+def artifact_path(content_hash, root=None) -> str:
+    return os.path.join(root or CATALOG_ARTIFACT_DIR, f"v{ARTIFACT_FORMAT}-{content_hash}")
+
+
+def save_artifact(catalog, content_hash, root=None):
+    """
+    전처리된 카탈로그를 파일로 저장하고 경로 반환.
+    숫자/비트셋 외 컬럼에 문자열이 아닌 값이 섞여 있으면 저장하지 않고 None
+    """
+    path = artifact_path(content_hash, root)
+    if os.path.exists(os.path.join(path, "meta.json")):
+        return path
+
+    df = catalog.df
+    arrays, columns = {}, []
+    for i, col in enumerate(df.columns):
+        s = df[col]
+        if s.dtype.kind in "biuf":
+            arrays[f"c{i}"] = s.to_numpy()
+            kind = "num"
+        else:
+            values = s.to_numpy(dtype=object)
+            null = pd.isna(values).astype(bool)
+            if not all(isinstance(v, str) for v in values[~null]):
+                return None
+            arrays[f"c{i}"] = np.array(["" if n else v for v, n in zip(values, null)], dtype=str)
+            arrays[f"c{i}_null"] = null
+            kind = "str"
+        columns.append({"name": col, "kind": kind, "dtype": str(s.dtype)})
+
+    meta = {
+        "format": ARTIFACT_FORMAT,
+        "source_hash": content_hash,
+        "rows": len(df),
+        "columns": columns,
+        # 비트 위치 = 목록 순서 (읽을 때 현재 프로세스 어휘와 다르면 다시 매핑)
+        "tags": {col: list(vocab.tags) for col, vocab in _TAG_VOCABS.items()},
+    }
+
+    # 임시 폴더에 다 쓴 뒤 이름만 바꿔서, 읽는 쪽이 덜 쓴 파일을 보지 않게 함
+    tmp = f"{path}.tmp{os.getpid()}-{threading.get_ident()}"
+    os.makedirs(tmp, exist_ok=True)
+    try:
+        for name, arr in arrays.items():
+            np.save(os.path.join(tmp, name + ".npy"), arr, allow_pickle=False)
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    except OSError:
+        # 다른 프로세스가 먼저 만들었으면 그것을 씀
+        shutil.rmtree(tmp, ignore_errors=True)
+        if not os.path.exists(os.path.join(path, "meta.json")):
+            return None
+    return path
+
+
+def _remap_bits(bits, old_to_new) -> np.ndarray:
+    out = np.zeros(len(bits), dtype=np.uint64)
+    for old, new in enumerate(old_to_new):
+        out |= ((bits >> np.uint64(old)) & np.uint64(1)) << np.uint64(new)
+    return out
+
+
+def load_artifact(content_hash, root=None):
+    """저장된 카탈로그를 mmap으로 읽어 WorkoutCatalog로, 없거나 해시/형식이 다르면 None"""
+    path = artifact_path(content_hash, root)
+    try:
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("format") != ARTIFACT_FORMAT or meta.get("source_hash") != content_hash:
+        return None
+
+    data = {}
+    try:
+        for i, c in enumerate(meta["columns"]):
+            arr = np.load(os.path.join(path, f"c{i}.npy"), mmap_mode="r")
+            if c["kind"] == "str":
+                null = np.load(os.path.join(path, f"c{i}_null.npy"))
+                values = arr.astype(object)
+                values[null] = np.nan
+                data[c["name"]] = pd.Series(values, dtype=c["dtype"])
+            else:
+                data[c["name"]] = arr
+    except (OSError, ValueError, KeyError):
+        return None
+
+    for col, tags in meta["tags"].items():
+        bits = _TAG_VOCABS[col].register_all(tags)
+        if col in data and bits != list(range(len(tags))):
+            data[col] = _remap_bits(np.asarray(data[col]), bits)
+
+    df = pd.DataFrame(data, copy=False)
+    if len(df) != meta["rows"]:
+        return None
+    return WorkoutCatalog(df, prepared=True)
+
+
+def prune_artifacts(keep_hash=None, root=None) -> int:
+    """keep_hash 외의 컴파일 파일 삭제, 지운 개수 반환"""
+    root = root or CATALOG_ARTIFACT_DIR
+    if not os.path.isdir(root):
+        return 0
+    keep = os.path.basename(artifact_path(keep_hash, root)) if keep_hash else None
+    removed = 0
+    for name in os.listdir(root):
+        if name != keep:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+            removed += 1
+    return removed
+
+
+# =========================
+# 4) 카탈로그 로딩 / 변경 감지
+#   - 버전(파일 mtime/크기 등)은 CATALOG_POLL_SEC 간격으로만 확인 (감시 스레드가 있으면 그쪽에서)
+#   - 바뀌면 옆에서 새 카탈로그를 다 만든 뒤 (버전, 카탈로그) 튜플을 한 번에 바꿔 끼움
+#     → 진행 중인 요청은 이전 카탈로그를 끝까지 쓰고, 덜 만든 색인을 보는 일이 없음
+# =========================
+CATALOG_POLL_SEC = float(os.getenv("CATALOG_POLL_SEC", "1.0"))
+
+
+class _CatalogSlot:
+    def __init__(self):
+        self.state = None       # (version, WorkoutCatalog)
+        self.checked = 0.0      # 마지막으로 버전을 확인한 시각 (monotonic)
+        self.build_lock = threading.Lock()
+        self.watcher = None
+        self.failed_version = None  # 읽다가 실패한 버전 (바뀔 때까지 다시 시도하지 않음)
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def _slot(storage) -> _CatalogSlot:
+    key = id(storage)
+    with _catalogs_lock:
+        slot = _catalogs.get(key)
+        if slot is None:
+            slot = _catalogs[key] = _CatalogSlot()
+        return slot
+
+
+def build_catalog(storage, previous=None, use_artifact=not CATALOG_ARTIFACT_DISABLED):
+    """
+    컴파일 파일이 최신이면 그것을, 아니면 원본을 전처리해서 WorkoutCatalog 반환 (원본이 없으면 None).
+    previous가 있으면 바뀐 행만 다시 전처리. 원본에서 만든 경우 다음 시작을 위해 컴파일 파일도 남김
+    """
+    content_hash = storage.workouts_content_hash() if use_artifact else None
+    if content_hash is not None:
+        catalog = load_artifact(content_hash)
+        if catalog is not None:
+            return catalog
+
+    wdf = storage.load_workouts_raw()
+    if wdf is None:
+        return None
+    catalog = refresh_catalog(previous, wdf) if previous is not None else WorkoutCatalog(wdf)
+
+    if content_hash is not None:
+        try:
+            saved = save_artifact(catalog, content_hash)
+            if saved is not None and previous is not None:
+                # 갱신으로 새 버전을 남겼으면 이전 버전 파일은 지움 (편집할 때마다 쌓이지 않게)
+                prune_artifacts(keep_hash=content_hash)
+        except OSError:
+            pass  # 저장 실패는 다음 시작이 느려질 뿐
+    return catalog
+
+
+def _refresh(storage, slot, wait=True):
+    slot.checked = time.monotonic()
+    version = storage.workouts_version()
+    current = slot.state
+    if version is None:
+        slot.state = None
+        return None
+    if current is not None and version in (current[0], slot.failed_version):
+        return current[1]
+
+    # 다른 스레드가 이미 새로 만드는 중이면 기다리지 않고 이전 카탈로그를 씀
+    if not slot.build_lock.acquire(blocking=wait or current is None):
+        return current[1]
+    try:
+        current = slot.state
+        if current is not None and current[0] == version:
+            return current[1]
+        try:
+            catalog = build_catalog(storage, previous=current[1] if current else None)
+        except ValueError as e:
+            if current is None:
+                raise
+            # 편집 중 잘못된 파일이면 이전 카탈로그를 유지
+            slot.failed_version = version
+            print(f"catalog: 변경된 카탈로그를 읽지 못해 이전 카탈로그를 유지합니다: {e}", file=sys.stderr)
+            return current[1]
+        slot.state = (version, catalog) if catalog is not None else None
+        slot.failed_version = None
+        return catalog
+    finally:
+        slot.build_lock.release()
+
+
+def load_catalog(storage):
+    """
+    storage에서 운동 카탈로그를 읽어 WorkoutCatalog로 반환 (파일/테이블이 없으면 None).
+    storage.workouts_version()이 같으면 전처리와 색인을 다시 하지 않고,
+    바뀌었으면 바뀐 행만 반영한 새 카탈로그로 교체함
+    """
+    with span("load_catalog") as sp:
+        slot = _slot(storage)
+        current = slot.state
+        if current is not None:
+            watched = slot.watcher is not None and slot.watcher.is_alive()
+            if watched or time.monotonic() - slot.checked < CATALOG_POLL_SEC:
+                sp.set(cache_hit=True)
+                return current[1]
+        sp.set(cache_hit=False)
+        return _refresh(storage, slot, wait=False)
+
+
+def start_catalog_watcher(storage, interval=CATALOG_POLL_SEC) -> threading.Thread:
+    """
+    interval초마다 카탈로그 변경을 확인해 미리 교체하는 데몬 스레드 (저장소당 하나).
+    요청 처리 중에는 버전 확인도 하지 않게 됨. fork하는 서버는 fork한 뒤 프로세스마다 부를 것
+    """
+    slot = _slot(storage)
+    with _catalogs_lock:
+        if slot.watcher is not None and slot.watcher.is_alive():
+            return slot.watcher
+
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    _refresh(storage, slot)
+                except Exception:
+                    traceback.print_exc()
+
+        slot.watcher = threading.Thread(target=run, name="catalog-watcher", daemon=True)
+        slot.watcher.start()
+        return slot.watcher
+
+
+# =========================
+# 5) 1차 룰 기반 후보군 생성
+# =========================
+def filter_candidates(workouts, purpose, target_intensity):
+    """
+    workouts: WorkoutCatalog (색인 사용) 또는 전처리된 DataFrame
+    """
+    with span("filter_candidates", purpose=purpose, intensity=target_intensity) as sp:
+        if not isinstance(workouts, WorkoutCatalog):
+            positions = WorkoutIndex(workouts).candidate_positions(purpose, target_intensity)
+            out = workouts.iloc[positions].reset_index(drop=True)
+        else:
+            out = workouts.candidates(purpose, target_intensity)
+        sp.set(rows=len(out))
+        return out
+
+
+def main(argv=None):
+    from storage import get_storage
+
+    parser = argparse.ArgumentParser(description="운동 카탈로그 컴파일")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("build", help="현재 카탈로그를 컴파일 파일로 저장 (이전 버전은 삭제)")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "build":
+        storage = get_storage()
+        content_hash = storage.workouts_content_hash()
+        if content_hash is None:
+            print("운동 카탈로그가 없습니다.", file=sys.stderr)
+            return 1
+        catalog = WorkoutCatalog(storage.load_workouts_raw())
+        path = save_artifact(catalog, content_hash)
+        if path is None:
+            print("컴파일할 수 없는 값이 있습니다.", file=sys.stderr)
+            return 1
+        prune_artifacts(keep_hash=content_hash)
+        print(f"{path} ({len(catalog)} rows)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+# clients.py
+# -*- coding: utf-8 -*-
+import os
+import threading
+
+import requests
+import spotipy
+from requests.adapters import HTTPAdapter
+from spotipy.cache_handler import MemoryCacheHandler
+from spotipy.oauth2 import SpotifyClientCredentials
+from dotenv import load_dotenv
+from openai import OpenAI
+
+import fakes
+
+load_dotenv()
+
+# 외부 API 타임아웃 (초) / 호스트별 keep-alive 커넥션 수
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT_SEC", "30"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+SPOTIFY_TIMEOUT = float(os.getenv("SPOTIFY_TIMEOUT_SEC", "5"))
+WEATHER_TIMEOUT = float(os.getenv("WEATHER_TIMEOUT_SEC", "5"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+
+# 프로세스 전체(모든 Streamlit 세션)가 같이 쓰는 클라이언트
+# (자격 증명이 바뀌면 새로 만들도록 키에 포함)
+_clients = {}
+_lock = threading.Lock()
+
+# 외부 API 대신 fakes.py 대역 사용 (부하 테스트/오프라인)
+_fake = os.getenv("MOODFIT_FAKE_PROVIDERS", "").strip().lower() in ("1", "true", "yes")
+
+
+def use_fake_providers(enabled=True) -> None:
+    global _fake
+    _fake = bool(enabled)
+
+
+def fake_providers_enabled() -> bool:
+    return _fake
+
+
+def _get_or_create(key, factory):
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = factory()
+    return client
+
+
+def _pooled_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# =========================
+# 1) 일반 HTTP (날씨 API)
+# =========================
+def get_http_session() -> requests.Session:
+    if _fake:
+        return _get_or_create(("fake-http",), fakes.FakeWeatherSession)
+    return _get_or_create(("http",), _pooled_session)
+
+
+# =========================
+# 2) OpenAI
+# =========================
+def get_openai_client():
+    """
+    키가 없으면 None. 같은 키면 같은 클라이언트(내부 커넥션 풀 재사용)를 반환
+    """
+    if _fake:
+        return _get_or_create(("fake-openai",), fakes.FakeOpenAI)
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        return None
+
+    def factory():
+        return OpenAI(api_key=api_key, timeout=OPENAI_TIMEOUT, max_retries=OPENAI_MAX_RETRIES)
+
+    return _get_or_create(("openai", api_key), factory)
+
+
+# =========================
+# 3) Spotify (토큰은 만료될 때까지 메모리에서 재사용)
+# =========================
+def get_spotify_client():
+    if _fake:
+        return _get_or_create(("fake-spotify",), fakes.FakeSpotify)
+    cid = os.getenv("SPOTIFY_CLIENT_ID")
+    csec = os.getenv("SPOTIFY_CLIENT_SECRET")
+    if (not cid) or (not csec):
+        return None
+
+    def factory():
+        # 세션은 spotipy가 재시도 설정과 함께 만든 것을 그대로 씀 (클라이언트가 공유되므로 커넥션도 공유)
+        auth_manager = SpotifyClientCredentials(
+            client_id=cid, client_secret=csec,
+            cache_handler=MemoryCacheHandler(),
+            requests_timeout=SPOTIFY_TIMEOUT
+        )
+        return spotipy.Spotify(auth_manager=auth_manager, requests_timeout=SPOTIFY_TIMEOUT)
+
+    return _get_or_create(("spotify", cid, csec), factory)
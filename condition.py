@@ -0,0 +1,307 @@
+# condition.py
+# -*- coding: utf-8 -*-
+# daily_info 한 행(오늘 컨디션) → 장소 권장 / 각성도 / 감정 / 목표 강도
+import numpy as np
+import pandas as pd
+
+from emotions import EMOTION_AROUSAL, POSITIVE_EMOTIONS, NEGATIVE_EMOTIONS, emotion_name
+
+
+# =========================
+# 0-1) 각성도 레벨 구분 (감정 어휘/각성도 매핑은 emotions.py)
+# =========================
+def get_arousal_level(score: float) -> str:
+    if pd.isna(score):
+        return ""
+    if score < 1:
+        return "매우 낮음"
+    elif score < 2:
+        return "낮음"
+    elif score < 3:
+        return "중간"
+    elif score < 4:
+        return "높음"
+    else:
+        return "매우 높음"
+
+# =========================
+# 0-2) 감정 리스트 → 평균 각성 점수
+# =========================
+def compute_avg_arousal(emotion_list):
+    scores = []
+    for e in emotion_list:
+        if e in EMOTION_AROUSAL:
+            scores.append(EMOTION_AROUSAL[e])
+        # 매핑 없는 감정은 그냥 무시
+
+    if not scores:
+        return np.nan
+
+    return float(sum(scores) / len(scores))
+
+
+# =========================
+# 1) 장소 권장 (날씨 반영)
+# =========================
+def infer_place_preference(daily_row, weather):
+    """
+    daily_info의 운동장소 + 현재 날씨를 합쳐
+    실내/실외 권장을 반환
+    """
+    place_pref = str(daily_row.get("운동장소", "")).strip()
+    if place_pref == "nan":
+        place_pref = ""
+
+    bad_weather = any(w in weather for w in ["rain", "drizzle", "thunderstorm", "snow"])
+
+    if bad_weather:
+        final_place = "실내"
+        msg = "☔/❄ 날씨 영향으로 실내 운동을 우선 추천합니다."
+    else:
+        if place_pref in ["실내", "실외"]:
+            final_place = place_pref
+            msg = f"🌤 사용자 선호 장소({place_pref})를 반영해 추천합니다."
+        else:
+            final_place = "상관없음"
+            msg = "🌤 날씨가 무난해 실내/실외 모두 고려해 추천합니다."
+
+    return final_place, msg
+
+
+# =========================
+# 2) 목표 강도 추정 (arousal>=4 → 고강도)
+# =========================
+def get_arousal_from_daily(daily_row):
+    candidates = ["감정_평균각성점수", "각성도", "감정각성도", "감정각성도점수", "arousal", "emotion_arousal"]
+    for col in candidates:
+        if col in daily_row.index:
+            try:
+                return float(daily_row[col])
+            except:
+                pass
+    return 3.0
+
+def get_emotion_from_daily(daily_row):
+    # 저장 시 계산해 둔 대표 감정 ID가 있으면 문자열을 나누지 않고 사용
+    if "감정_대표ID" in daily_row.index:
+        name = emotion_name(daily_row["감정_대표ID"])
+        if name:
+            return name
+    candidates = ["감정_리스트", "감정", "오늘감정", "emotion", "감정상태"]
+    for col in candidates:
+        if col in daily_row.index:
+            v = str(daily_row[col]).strip()
+            if v and v != "nan":
+                return v.split(",")[0].strip()
+    return ""
+
+def infer_target_intensity(daily_row, user_row):
+    arousal = get_arousal_from_daily(daily_row)
+    emotion = get_emotion_from_daily(daily_row)
+
+    # ✅ 기본 강도: arousal>=4 → 고강도
+    if arousal >= 4.0:
+        base = "고강도"
+    elif arousal >= 2.5:
+        base = "중강도"
+    else:
+        base = "저강도"
+
+    sleep_hours = float(daily_row.get("수면시간", 7) or 7)
+    stress_level = str(daily_row.get("스트레스", "보통") or "보통")
+    exercise_time = float(daily_row.get("운동가능시간(분)", 30) or 30)
+    activity = str(user_row.get("활동량", "보통") or "보통")
+    injury_status = str(user_row.get("부상 이력", "없음") or "없음")
+    purpose = str(daily_row.get("운동목적", "") or "")
+
+    target = base
+
+    # 1) 부정 감정/스트레스 높으면 고강도 제한
+    if emotion in NEGATIVE_EMOTIONS or stress_level == "높음":
+        if target == "고강도":
+            target = "중강도"
+
+    # 2) 수면 부족/부상 있으면 하향
+    if sleep_hours < 5 or injury_status == "있음":
+        if target == "고강도":
+            target = "중강도"
+        elif target == "중강도":
+            target = "저강도"
+
+    # 3) 활동량 높고 시간 충분하면 상향
+    if activity == "높음" and exercise_time >= 60 and injury_status != "있음":
+        if target == "저강도":
+            target = "중강도"
+        elif target == "중강도" and emotion in POSITIVE_EMOTIONS:
+            target = "고강도"
+
+    # 4) 스트레스 해소 목적일 때 과한 고강도 제한
+    if "스트레스 해소" in purpose and target == "고강도" and stress_level == "높음":
+        target = "중강도"
+
+    return target, arousal
+
+
+# =========================
+# 3) 일괄(DataFrame) 버전 - 백필/분석/배치 추천용
+#   행 단위 함수와 결과가 같도록, 값 변환은 "서로 다른 값"마다 한 번만 같은 규칙으로 계산하고
+#   나머지 분기는 NumPy 마스크로 처리
+# =========================
+AROUSAL_COLS = ["감정_평균각성점수", "각성도", "감정각성도", "감정각성도점수", "arousal", "emotion_arousal"]
+EMOTION_COLS = ["감정_리스트", "감정", "오늘감정", "emotion", "감정상태"]
+
+_LOW, _MID, _HIGH = 0, 1, 2
+_INTENSITY_NAMES = np.array(["저강도", "중강도", "고강도"], dtype=object)
+
+
+def _map_values(values, fn) -> np.ndarray:
+    """
+    원소별 fn(x) 결과(object 배열). fn은 서로 다른 값마다 한 번만 호출.
+    object 컬럼은 repr로 구분해서 1 / 1.0 / True / "1", None / NaN 같은 값이 섞이지 않게 함
+    """
+    arr = np.asarray(values)
+    if arr.dtype == object:
+        keys = np.frompyfunc(repr, 1, 1)(arr).astype(str)
+    else:
+        keys = arr
+    codes, uniques = pd.factorize(keys, use_na_sentinel=False)
+    _, first = np.unique(codes, return_index=True)
+    mapped = np.empty(len(uniques), dtype=object)
+    for code, pos in enumerate(first):
+        mapped[code] = fn(arr[pos])
+    return mapped[codes]
+
+
+def _column_or(df, col, default, fn) -> np.ndarray:
+    """daily_row.get(col, default)를 fn으로 변환한 것과 같은 원소별 값"""
+    if col not in df.columns:
+        out = np.empty(len(df), dtype=object)
+        out[:] = [fn(default)] * len(df)
+        return out
+    return _map_values(df[col].to_numpy(), fn)
+
+
+def _try_float(x):
+    try:
+        return float(x)
+    except:
+        return None
+
+
+def get_arousal_batch(daily_df: pd.DataFrame) -> np.ndarray:
+    """get_arousal_from_daily를 모든 행에 적용한 결과 (float 배열)"""
+    n = len(daily_df)
+    out = np.full(n, 3.0)
+    resolved = np.zeros(n, dtype=bool)
+    for col in AROUSAL_COLS:
+        if col not in daily_df.columns:
+            continue
+        conv = _map_values(daily_df[col].to_numpy(), _try_float)
+        ok = (conv != None) & ~resolved  # noqa: E711 (원소별 비교)
+        out[ok] = conv[ok].astype(float)
+        resolved |= ok
+    return out
+
+
+def _first_emotion(x):
+    v = str(x).strip()
+    if v and v != "nan":
+        return v.split(",")[0].strip()
+    return None
+
+
+def get_emotion_batch(daily_df: pd.DataFrame) -> np.ndarray:
+    """get_emotion_from_daily를 모든 행에 적용한 결과 (str object 배열)"""
+    n = len(daily_df)
+    out = np.full(n, "", dtype=object)
+    resolved = np.zeros(n, dtype=bool)
+    if "감정_대표ID" in daily_df.columns:
+        conv = _map_values(daily_df["감정_대표ID"].to_numpy(), emotion_name)
+        resolved = conv != None  # noqa: E711
+        out[resolved] = conv[resolved]
+    for col in EMOTION_COLS:
+        if col not in daily_df.columns:
+            continue
+        conv = _map_values(daily_df[col].to_numpy(), _first_emotion)
+        ok = (conv != None) & ~resolved  # noqa: E711
+        out[ok] = conv[ok]
+        resolved |= ok
+    return out
+
+
+def align_users(daily_df: pd.DataFrame, users_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    daily 행마다 그 사용자의 users 행을 붙인 DataFrame (같은 이름은 첫 행, 없는 사용자는 NaN 행).
+    행 단위로는 storage.get_user(이름)에 해당
+    """
+    first = users_df.assign(_name=users_df["이름"].astype(str)).drop_duplicates("_name", keep="first")
+    aligned = first.set_index("_name").reindex(daily_df["이름"].astype(str).to_numpy())
+    return aligned.reset_index(drop=True)
+
+
+def infer_target_intensity_batch(daily_df: pd.DataFrame, users_df: pd.DataFrame):
+    """
+    infer_target_intensity를 모든 행에 적용한 결과 (목표강도 object 배열, 각성도 float 배열).
+    users_df는 users 테이블 전체 (align_users로 행을 맞춤)
+    """
+    user_aligned = align_users(daily_df, users_df)
+
+    arousal = get_arousal_batch(daily_df)
+    emotion = get_emotion_batch(daily_df)
+
+    sleep_hours = _column_or(daily_df, "수면시간", 7, lambda x: float(x or 7)).astype(float)
+    stress_level = _column_or(daily_df, "스트레스", "보통", lambda x: str(x or "보통"))
+    exercise_time = _column_or(daily_df, "운동가능시간(분)", 30, lambda x: float(x or 30)).astype(float)
+    activity = _column_or(user_aligned, "활동량", "보통", lambda x: str(x or "보통"))
+    injury_status = _column_or(user_aligned, "부상 이력", "없음", lambda x: str(x or "없음"))
+    stress_purpose = _column_or(daily_df, "운동목적", "", lambda x: "스트레스 해소" in str(x or "")).astype(bool)
+
+    with np.errstate(invalid="ignore"):
+        target = np.where(arousal >= 4.0, _HIGH, np.where(arousal >= 2.5, _MID, _LOW))
+        negative = np.isin(emotion, list(NEGATIVE_EMOTIONS))
+        positive = np.isin(emotion, list(POSITIVE_EMOTIONS))
+        stress_high = stress_level == "높음"
+        injured = injury_status == "있음"
+
+        # 1) 부정 감정/스트레스 높으면 고강도 제한
+        target = np.where((negative | stress_high) & (target == _HIGH), _MID, target)
+
+        # 2) 수면 부족/부상 있으면 한 단계 하향
+        down = (sleep_hours < 5) | injured
+        target = np.where(down & (target > _LOW), target - 1, target)
+
+        # 3) 활동량 높고 시간 충분하면 상향
+        up = (activity == "높음") & (exercise_time >= 60) & ~injured
+        target = np.where(
+            up & (target == _LOW), _MID,
+            np.where(up & (target == _MID) & positive, _HIGH, target)
+        )
+
+    # 4) 스트레스 해소 목적일 때 과한 고강도 제한
+    target = np.where(stress_purpose & (target == _HIGH) & stress_high, _MID, target)
+
+    return _INTENSITY_NAMES[target], arousal
+
+
+def get_arousal_level_batch(scores) -> np.ndarray:
+    """get_arousal_level의 일괄 버전"""
+    s = np.asarray(scores, dtype=float)
+    with np.errstate(invalid="ignore"):
+        return np.select(
+            [np.isnan(s), s < 1, s < 2, s < 3, s < 4],
+            ["", "매우 낮음", "낮음", "중간", "높음"],
+            default="매우 높음"
+        ).astype(object)
+
+
+def compute_avg_arousal_batch(emotion_lists) -> np.ndarray:
+    """
+    compute_avg_arousal의 일괄 버전. 원소는 감정 리스트
+    (CSV에서 읽은 "감정_리스트"처럼 쉼표로 이어진 문자열이면 나눠서 사용)
+    """
+    s = pd.Series(list(emotion_lists), dtype=object)
+    s = s.map(lambda v: [x.strip() for x in v.split(",") if x.strip()] if isinstance(v, str) else v)
+    scores = s.explode().map(EMOTION_AROUSAL)
+    total = scores.groupby(level=0).sum(min_count=1)
+    count = scores.notna().groupby(level=0).sum()
+    return (total / count.where(count > 0)).reindex(range(len(s))).to_numpy(dtype=float)
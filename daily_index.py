@@ -0,0 +1,136 @@
+# daily_index.py
+# -*- coding: utf-8 -*-
+import bisect
+import threading
+from datetime import date, datetime
+
+import pandas as pd
+
+
+def to_date(d):
+    """문자열/Timestamp/date → datetime.date, 해석 불가면 None"""
+    if isinstance(d, date) and not isinstance(d, datetime):
+        return d
+    dt = pd.to_datetime(d, errors="coerce")
+    if pd.isna(dt):
+        return None
+    return dt.date()
+
+
+class UserDailyIndex:
+    """
+    한 사용자의 daily 기록을 날짜순으로 정렬해 둔 색인.
+    - dates: 정렬된 (중복 없는) 날짜 목록
+    - 같은 날짜 기록이 여러 개면 정확히 일치할 때는 첫 기록, 이전/최근 기록을 찾을 때는 마지막 기록
+    - 조회는 bisect로 O(log n), add()로 한 행씩 추가
+    날짜를 해석할 수 없는 기록은 색인에 넣지 않음
+    """
+    def __init__(self, user_df: pd.DataFrame):
+        self._records = []   # 행 dict (파일 순서)
+        self._dates = []     # 정렬된 날짜
+        self._first = []     # 날짜별 첫 기록 위치
+        self._last = []      # 날짜별 마지막 기록 위치
+        self._lock = threading.Lock()
+        self.columns = list(user_df.columns)
+        if "_date" not in self.columns:
+            self.columns.append("_date")
+
+        if len(user_df) == 0:
+            return
+        dates = pd.to_datetime(user_df["날짜"], errors="coerce").dt.date
+        for rec, d in zip(user_df.to_dict("records"), dates):
+            self._add(rec, None if pd.isna(d) else d)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._dates)
+
+    @property
+    def dates(self) -> list:
+        with self._lock:
+            return list(self._dates)
+
+    def _add(self, rec, d):
+        rec["_date"] = d
+        pos = len(self._records)
+        self._records.append(rec)
+        if d is None:
+            return
+        i = bisect.bisect_left(self._dates, d)
+        if i < len(self._dates) and self._dates[i] == d:
+            self._last[i] = pos
+        else:
+            self._dates.insert(i, d)
+            self._first.insert(i, pos)
+            self._last.insert(i, pos)
+
+    def add(self, row) -> None:
+        rec = dict(row)
+        with self._lock:
+            for k in rec:
+                if k not in self.columns:
+                    self.columns.append(k)
+            self._add(rec, to_date(rec.get("날짜")))
+
+    def update(self, d, values: dict) -> bool:
+        """해당 날짜 첫 기록의 값 일부를 바꿈 (추천 저장 반영용)"""
+        d = to_date(d)
+        with self._lock:
+            i = bisect.bisect_left(self._dates, d) if d is not None else len(self._dates)
+            if i >= len(self._dates) or self._dates[i] != d:
+                return False
+            for k, v in values.items():
+                if k not in self.columns:
+                    self.columns.append(k)
+            self._records[self._first[i]].update(values)
+            return True
+
+    def _row(self, pos) -> pd.Series:
+        rec = self._records[pos]
+        return pd.Series([rec.get(c) for c in self.columns], index=self.columns, dtype=object)
+
+    # =========================
+    # 조회 (add/update와 같은 락 - 삽입 도중의 목록을 읽지 않게)
+    # =========================
+    def exact(self, d):
+        """그 날짜 기록(pd.Series) 또는 None"""
+        d = to_date(d)
+        if d is None:
+            return None
+        with self._lock:
+            i = bisect.bisect_left(self._dates, d)
+            if i < len(self._dates) and self._dates[i] == d:
+                return self._row(self._first[i])
+            return None
+
+    def on_or_before(self, d):
+        """(그 날짜 이전 가장 최근 기록, 그 날짜) 또는 (None, None)"""
+        d = to_date(d)
+        if d is None:
+            return None, None
+        with self._lock:
+            i = bisect.bisect_right(self._dates, d) - 1
+            if i < 0:
+                return None, None
+            return self._row(self._last[i]), self._dates[i]
+
+    def latest(self):
+        with self._lock:
+            if not self._dates:
+                return None, None
+            return self._row(self._last[-1]), self._dates[-1]
+
+    def lookup(self, pick_date=None):
+        """
+        추천 기준 기록 (daily_row, used_date).
+        pick_date 기록이 있으면 그것, 없으면 그 이전 최근 기록, 그것도 없으면 가장 최근 기록
+        """
+        if pick_date is None:
+            return self.latest()
+        row = self.exact(pick_date)
+        if row is not None:
+            return row, to_date(pick_date)
+        row, used = self.on_or_before(pick_date)
+        if row is not None:
+            return row, used
+        return self.latest()
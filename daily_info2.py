@@ -145,75 +145,11 @@
 
 # -*- coding: utf-8 -*-
 import streamlit as st
-import pandas as pd
-import os
-import numpy as np
 from datetime import date
 from streamlit_extras.stylable_container import stylable_container
-
-# =========================
-# 1. 감정별 각성도 점수 매핑
-# =========================
-EMOTION_AROUSAL = {
-    # 긍정 감정
-    "행복": 3,
-    "기쁨": 4,
-    "설렘": 4,
-    "자신감": 3,
-    "활력": 5,
-    "만족": 2,
-
-    # 부정 감정
-    "슬픔": 1,
-    "분노": 5,
-    "불안": 4,
-    "두려움": 4,
-    "피로": 1,
-    "스트레스": 4,
-    "무기력": 1,
-    "지루함": 2,
-    "외로움": 2,
-
-    # 중립 감정
-    "차분함": 2,
-    "집중": 3,
-    "긴장": 4,
-    "놀람": 4,
-    "혼란": 3,
-}
-
-# =========================
-# 2. 각성도 레벨 구분 함수
-# =========================
-def get_arousal_level(score: float) -> str:
-    if pd.isna(score):
-        return ""
-    if score < 1:
-        return "매우 낮음"
-    elif score < 2:
-        return "낮음"
-    elif score < 3:
-        return "중간"
-    elif score < 4:
-        return "높음"
-    else:
-        return "매우 높음"
-
-# =========================
-# 3. 감정 리스트 → 평균 각성 점수
-# =========================
-def compute_avg_arousal(emotion_list):
-    scores = []
-    for e in emotion_list:
-        if e in EMOTION_AROUSAL:
-            scores.append(EMOTION_AROUSAL[e])
-        # 매핑 없는 감정은 그냥 무시
-
-    if not scores:
-        return np.nan
-
-    return float(sum(scores) / len(scores))
-
+from storage import get_storage
+from condition import get_arousal_level
+from emotions import emotions_in_group, emotion_features
 
 # =========================
 # 페이지 기본 설정
@@ -237,8 +173,8 @@ st.markdown(
     unsafe_allow_html=True
 )
 
-user_csv = "users.csv"
-daily_csv = "daily_info.csv"
+# 저장소 (MOODFIT_STORAGE=csv|sqlite)
+storage = get_storage()
 
 # ⏳ 날짜 입력 카드
 st.markdown("### 📅 오늘 날짜")
@@ -249,22 +185,22 @@ selected_date = st.date_input(
 )
 
 # 👤 사용자 선택
-if not os.path.exists(user_csv):
+user_names = storage.list_user_names()
+if not user_names:
     st.error("⚠️ 먼저 '정적 정보' 메뉴에서 회원을 등록해주세요.")
     st.stop()
 else:
-    users_df = pd.read_csv(user_csv)
     st.markdown("### 👤 사용자 선택")
-    user_name = st.selectbox("기록할 사용자", users_df["이름"].tolist())
+    user_name = st.selectbox("기록할 사용자", user_names)
 
     st.markdown("---")
 
     # 😄 감정 상태
     st.markdown("### 😄 오늘의 감정 상태")
 
-    positive_emotions = ["행복", "기쁨", "설렘", "자신감", "활력", "만족"]
-    negative_emotions = ["슬픔", "분노", "불안", "두려움", "피로", "스트레스", "무기력", "지루함", "외로움"]
-    neutral_emotions = ["차분함", "집중", "긴장", "놀람", "혼란"]
+    positive_emotions = emotions_in_group("positive")
+    negative_emotions = emotions_in_group("negative")
+    neutral_emotions = emotions_in_group("neutral")
 
     all_emotions = positive_emotions + negative_emotions + neutral_emotions
 
@@ -333,47 +269,36 @@ else:
             st.warning("⚠️ 감정을 최소 1개 이상 선택해주세요.")
             st.stop()
 
-        user_info = users_df[users_df["이름"] == user_name].iloc[0]
+        user_info = storage.get_user(user_name)
 
-        # ✅ 감정 각성도/레벨 자동 계산
-        avg_arousal = compute_avg_arousal(emotions)
-        arousal_level = get_arousal_level(avg_arousal)
+        # ✅ 감정 특징(비트마스크/대표 감정 ID/정서가/평균 각성도)과 레벨을 저장 시점에 계산
+        features = emotion_features(emotions)
+        arousal_level = get_arousal_level(features["감정_평균각성점수"])
 
-        new_data = pd.DataFrame({
-            "날짜": [selected_date],
-            "이름": [user_info["이름"]],
-            "나이": [user_info["나이"]],
-            "성별": [user_info["성별"]],
-            "키(cm)": [user_info["키(cm)"]],
-            "몸무게(kg)": [user_info["몸무게(kg)"]],
-            "감정": [', '.join(emotions)],
+        new_row = {
+            "날짜": selected_date,
+            "이름": user_info["이름"],
+            "나이": user_info["나이"],
+            "성별": user_info["성별"],
+            "키(cm)": user_info["키(cm)"],
+            "몸무게(kg)": user_info["몸무게(kg)"],
+            "감정": ', '.join(emotions),
 
             # ✅ 추가 저장 컬럼
-            "감정_리스트": [', '.join(emotions)],
-            "감정_평균각성점수": [avg_arousal],
-            "감정_활성도레벨": [arousal_level],
-
-            "수면시간": [sleep_hours],
-            "운동가능시간(분)": [exercise_time],
-            "스트레스": [stress_level],
-            "운동목적": [purpose],
-            "운동장소": [exercise_place],
-            "보유장비": [owned_equipment_str]
-        })
-
-        # 기존 파일 있으면 concat, 없으면 새로 생성
-        if os.path.exists(daily_csv):
-            old = pd.read_csv(daily_csv)
-
-            # 혹시 기존 파일에 위 3개 컬럼이 없으면 미리 만들어주기
-            for c in ["감정_리스트", "감정_평균각성점수", "감정_활성도레벨"]:
-                if c not in old.columns:
-                    old[c] = ""
-
-            updated = pd.concat([old, new_data], ignore_index=True)
-            updated.to_csv(daily_csv, index=False, encoding="utf-8-sig")
-        else:
-            new_data.to_csv(daily_csv, index=False, encoding="utf-8-sig")
+            "감정_리스트": ', '.join(emotions),
+            **features,
+            "감정_활성도레벨": arousal_level,
+
+            "수면시간": sleep_hours,
+            "운동가능시간(분)": exercise_time,
+            "스트레스": stress_level,
+            "운동목적": purpose,
+            "운동장소": exercise_place,
+            "보유장비": owned_equipment_str
+        }
+
+        # 기존 기록을 읽지 않고 한 줄만 추가 (새 컬럼이 생기면 헤더만 확장)
+        storage.append_daily(new_row)
 
         st.success("✔️ 오늘의 컨디션이 성공적으로 저장되었습니다!")
 
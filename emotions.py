@@ -0,0 +1,197 @@
+# emotions.py
+# -*- coding: utf-8 -*-
+"""
+감정 어휘 (정수 ID / 분류 / 각성도)와 daily 기록에 함께 저장하는 감정 특징 컬럼
+
+  python emotions.py migrate   # 기존 daily 기록에 특징 컬럼 채우기 (1회)
+"""
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+
+# =========================
+# 1) 감정 어휘 - ID는 목록 순서 (새 감정은 반드시 끝에 추가)
+# =========================
+EMOTIONS = [
+    # (이름, 분류, 각성도)
+    ("행복", "positive", 3),
+    ("기쁨", "positive", 4),
+    ("설렘", "positive", 4),
+    ("자신감", "positive", 3),
+    ("활력", "positive", 5),
+    ("만족", "positive", 2),
+
+    ("슬픔", "negative", 1),
+    ("분노", "negative", 5),
+    ("불안", "negative", 4),
+    ("두려움", "negative", 4),
+    ("피로", "negative", 1),
+    ("스트레스", "negative", 4),
+    ("무기력", "negative", 1),
+    ("지루함", "negative", 2),
+    ("외로움", "negative", 2),
+
+    ("차분함", "neutral", 2),
+    ("집중", "neutral", 3),
+    ("긴장", "neutral", 4),
+    ("놀람", "neutral", 4),
+    ("혼란", "neutral", 3),
+]
+
+VALENCE = {"positive": 1, "negative": -1, "neutral": 0}
+
+EMOTION_NAMES = [name for name, _, _ in EMOTIONS]
+EMOTION_ID = {name: i for i, name in enumerate(EMOTION_NAMES)}
+EMOTION_AROUSAL = {name: arousal for name, _, arousal in EMOTIONS}
+EMOTION_VALENCE = {name: VALENCE[group] for name, group, _ in EMOTIONS}
+
+# 목표 강도 규칙용 감정 집합 (UI 분류와 별개 - 어휘에 없는 초조/우울, 중립인 긴장도 부정으로 봄)
+POSITIVE_EMOTIONS = frozenset({"행복", "기쁨", "설렘", "자신감", "활력", "만족"})
+NEGATIVE_EMOTIONS = frozenset({"슬픔", "분노", "불안", "초조", "우울", "긴장", "스트레스"})
+
+
+def emotions_in_group(group) -> list:
+    return [name for name, g, _ in EMOTIONS if g == group]
+
+
+# =========================
+# 2) 문자열 ↔ ID / 비트마스크
+# =========================
+def _clean(token) -> str:
+    return str(token).strip().strip("[]").strip().strip("'\"").strip()
+
+
+def parse_emotions(value) -> list:
+    """
+    "피로, 집중" 같은 저장값 → ["피로", "집중"] (빈 값이면 []).
+    예전 기록처럼 리스트 repr("['피로', '집중']")로 저장된 값도 같이 처리
+    """
+    if value is None or (not isinstance(value, (list, tuple)) and pd.isna(value)):
+        return []
+    tokens = value if isinstance(value, (list, tuple)) else str(value).split(",")
+    return [t for t in map(_clean, tokens) if t]
+
+
+def encode_mask(names) -> int:
+    mask = 0
+    for name in names:
+        i = EMOTION_ID.get(name)
+        if i is not None:
+            mask |= 1 << i
+    return mask
+
+
+def decode_mask(mask) -> list:
+    """비트마스크 → 감정 이름 목록 (ID 순서)"""
+    try:
+        mask = int(mask)
+    except (TypeError, ValueError):
+        return []
+    return [EMOTION_NAMES[i] for i in range(len(EMOTION_NAMES)) if mask >> i & 1]
+
+
+def emotion_name(emotion_id):
+    """대표 감정 ID → 이름, 없거나 잘못된 ID면 None"""
+    try:
+        i = int(emotion_id)
+    except (TypeError, ValueError):
+        return None
+    if 0 <= i < len(EMOTION_NAMES):
+        return EMOTION_NAMES[i]
+    return None
+
+
+# =========================
+# 3) 저장용 특징 컬럼
+#   감정_마스크: 어휘에 있는 감정들의 비트마스크
+#   감정_대표ID: 첫 번째 감정의 ID (어휘에 없으면 -1 → 읽을 때 문자열로 대체)
+#   감정_정서가: 긍정 +1 / 부정 -1 / 중립 0 의 평균
+#   감정_평균각성점수: 각성도 평균 (기존 컬럼)
+# =========================
+FEATURE_COLS = ["감정_마스크", "감정_대표ID", "감정_정서가", "감정_평균각성점수"]
+SOURCE_COLS = ["감정_리스트", "감정"]
+
+
+def _mean(values):
+    return float(sum(values) / len(values)) if values else np.nan
+
+
+def emotion_features(names) -> dict:
+    names = parse_emotions(names)
+    known = [n for n in names if n in EMOTION_ID]
+    return {
+        "감정_마스크": encode_mask(known),
+        "감정_대표ID": EMOTION_ID.get(names[0], -1) if names else -1,
+        "감정_정서가": _mean([EMOTION_VALENCE[n] for n in known]),
+        "감정_평균각성점수": _mean([EMOTION_AROUSAL[n] for n in known]),
+    }
+
+
+def add_emotion_features(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    특징 컬럼이 비어 있는 행만 감정 문자열에서 계산해 채움 (마이그레이션용).
+    이미 저장된 각성 점수는 덮어쓰지 않음
+    """
+    df = df.copy()
+    for col in FEATURE_COLS:
+        if col not in df.columns:
+            df[col] = np.nan
+
+    source = pd.Series([""] * len(df), index=df.index, dtype=object)
+    for col in reversed(SOURCE_COLS):  # 앞쪽 컬럼이 우선
+        if col in df.columns:
+            has = df[col].notna() & (df[col].astype(str).str.strip() != "")
+            source = source.where(~has, df[col])
+
+    todo = df["감정_마스크"].isna()
+    if not todo.any():
+        return df
+
+    # 서로 다른 감정 문자열마다 한 번만 계산
+    codes, uniques = pd.factorize(source[todo].astype(str))
+    feats = pd.DataFrame([emotion_features(u) for u in uniques], columns=FEATURE_COLS)
+    rows = feats.iloc[codes].set_index(df.index[todo])
+
+    for col in ["감정_마스크", "감정_대표ID", "감정_정서가"]:
+        df.loc[todo, col] = rows[col]
+    arousal = pd.to_numeric(df["감정_평균각성점수"], errors="coerce")
+    fill = todo & arousal.isna()
+    df["감정_평균각성점수"] = arousal.where(~fill, rows["감정_평균각성점수"].reindex(df.index))
+    # 정수 컬럼이 CSV에 "3.0"처럼 써지지 않게
+    for col in ["감정_마스크", "감정_대표ID"]:
+        df[col] = pd.to_numeric(df[col], errors="coerce").astype("Int64")
+    return df
+
+
+# =========================
+# 4) 일괄 디코딩 (마스크 → 감정 수 / 특정 감정 포함 여부)
+# =========================
+def masks_to_array(values) -> np.ndarray:
+    """저장된 마스크 컬럼(float/NaN 섞임) → int64 배열, 없는 값은 -1"""
+    s = pd.to_numeric(pd.Series(values), errors="coerce")
+    return s.fillna(-1).to_numpy(dtype=np.int64)
+
+
+def has_emotion(masks: np.ndarray, names) -> np.ndarray:
+    """각 행 마스크에 names 중 하나라도 있는지 (마스크가 없는 행은 False)"""
+    want = encode_mask(names)
+    return (masks >= 0) & ((masks & want) != 0)
+
+
+def main(argv=None):
+    from storage import get_storage
+
+    parser = argparse.ArgumentParser(description="감정 특징 컬럼 도구")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("migrate", help="기존 daily 기록에 감정 특징 컬럼 채우기")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "migrate":
+        n = get_storage().rewrite_daily(add_emotion_features, FEATURE_COLS)
+        print(f"{n} rows updated")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
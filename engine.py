@@ -0,0 +1,133 @@
+# engine.py
+# -*- coding: utf-8 -*-
+"""
+Streamlit 없이 쓰는 추천 엔진 (HTTP API / 배치 / 페이지 공용)
+"""
+import os
+import pandas as pd
+
+from catalog import load_catalog, filter_candidates, split_tags
+from condition import infer_place_preference, infer_target_intensity
+from weather import get_weather
+from clients import get_spotify_client
+from pipeline import build_top3_pipeline
+from llm import to_json_safe
+from daily_index import to_date
+from tracing import traced
+
+# 한 요청이 순위/음악 단계를 기다리는 최대 시간 (초)
+ENGINE_TIMEOUT = float(os.getenv("ENGINE_TIMEOUT_SEC", "60"))
+
+
+class RecommendError(ValueError):
+    """요청을 처리할 수 없는 경우 (status는 HTTP 응답 코드로 사용)"""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+# =========================
+# 1) 기준 날짜 기록 고르기 / 정적 정보 합치기
+# =========================
+def select_daily_row(daily_index, pick_date=None):
+    """
+    (daily_row, used_date). 선택 날짜 기록이 없으면 그 이전 최근 기록, 그것도 없으면 가장 최근 기록.
+    pick_date가 None이면 가장 최근 기록. 날짜 형식이 잘못되면 RecommendError
+    """
+    if pick_date is not None and to_date(pick_date) is None:
+        raise RecommendError(f"날짜 형식이 올바르지 않습니다: {pick_date}")
+    return daily_index.lookup(pick_date)
+
+
+def merge_user_info(user_row, daily_row) -> dict:
+    """users.csv(정적) + daily_info(보완) 합치기"""
+    merged = user_row.to_dict()
+    for k, v in daily_row.to_dict().items():
+        if k not in merged or pd.isna(merged.get(k)):
+            merged[k] = v
+    return merged
+
+
+# =========================
+# 2) 요청 → 파이프라인 입력
+# =========================
+def build_context(storage, user_name, pick_date=None, city="Seoul") -> dict:
+    """
+    pipeline.build_top3_pipeline().start()에 그대로 넘길 입력 dict
+    (+ 응답용 place_msg)
+    """
+    try:
+        catalog = load_catalog(storage)
+    except ValueError as e:
+        raise RecommendError(str(e), status=503)
+    if catalog is None:
+        raise RecommendError("workout.csv가 없습니다.", status=503)
+
+    user_row = storage.get_user(user_name)
+    if user_row is None:
+        raise RecommendError(f"등록되지 않은 사용자입니다: {user_name}", status=404)
+
+    daily_index = storage.get_daily_index(user_name)
+    if len(daily_index) == 0:
+        raise RecommendError("해당 사용자의 동적 정보 기록이 없습니다.", status=404)
+    daily_row, used_date = select_daily_row(daily_index, pick_date)
+
+    weather, temp = get_weather(city)
+    purpose = str(daily_row.get("운동목적", "체력 향상") or "체력 향상")
+    target_intensity, _ = infer_target_intensity(daily_row, user_row)
+    place_pref, place_msg = infer_place_preference(daily_row, weather)
+
+    candidates_df = filter_candidates(catalog, purpose, target_intensity)
+    if len(candidates_df) == 0:
+        raise RecommendError("추천할 후보 운동이 없습니다. 운동목적/강도 조건을 확인해주세요.", status=422)
+
+    return {
+        "storage": storage,
+        "candidates_df": candidates_df, "user_row": user_row, "daily_row": daily_row,
+        "weather": weather, "temp": temp, "city": city,
+        "place_pref": place_pref, "place_msg": place_msg,
+        "equip_list": split_tags(daily_row.get("보유장비", "")),
+        "merged_user_info": merge_user_info(user_row, daily_row),
+        "user_name": user_name, "used_date": used_date,
+        "target_intensity": target_intensity, "purpose": purpose,
+    }
+
+
+# =========================
+# 3) 추천 실행 (JSON으로 바로 보낼 수 있는 dict 반환)
+# =========================
+@traced("recommend")
+def recommend(storage, user_name, pick_date=None, city="Seoul", with_music=False,
+              ranking_mode=None, market="KR", save=True, timeout=ENGINE_TIMEOUT,
+              llm_budget=None, llm_breaker=True) -> dict:
+    """
+    save=False면 결과를 daily_info에 기록하지 않음 (부하 테스트 등).
+    llm_budget/llm_breaker는 순위 단계 예산(초, 0=끝까지 기다림)과 회로 차단기 사용 여부 (배치용).
+    순위 단계의 예외(MissingApiKeyError 등)와 시간 초과(TimeoutError)는 그대로 올라감
+    """
+    ctx = build_context(storage, user_name, pick_date, city)
+    inputs = dict(ctx)
+    inputs.pop("place_msg")
+    inputs["ranking_mode"] = ranking_mode
+    inputs["llm_budget"] = llm_budget
+    inputs["llm_breaker"] = llm_breaker
+    if with_music:
+        inputs["sp"] = get_spotify_client()
+        inputs["market"] = market
+
+    run = build_top3_pipeline(with_music=with_music, save=save).start(**inputs)
+    out = {
+        "user_name": user_name,
+        "used_date": str(ctx["used_date"]),
+        "city": city,
+        "weather": ctx["weather"],
+        "temp": ctx["temp"],
+        "purpose": ctx["purpose"],
+        "target_intensity": ctx["target_intensity"],
+        "place": ctx["place_msg"],
+        "top3": run.result("rank", timeout=timeout),
+    }
+    if with_music:
+        out["playlists"] = run.result("playlists", timeout=timeout)
+    out["timings"] = run.timing_rows()
+    return to_json_safe(out)
@@ -0,0 +1,107 @@
+# fakes.py
+# -*- coding: utf-8 -*-
+"""
+부하 테스트/오프라인 개발용 외부 API 대역 (OpenAI / Spotify / 날씨).
+clients.use_fake_providers() 또는 MOODFIT_FAKE_PROVIDERS=1 이면 클라이언트 레지스트리가 이쪽을 돌려줌.
+FAKE_LATENCY_MS로 호출당 지연을 흉내냄.
+"""
+import os
+import json
+import time
+import hashlib
+from types import SimpleNamespace
+
+FAKE_LATENCY = float(os.getenv("FAKE_LATENCY_MS", "0")) / 1000.0
+
+
+def _sleep():
+    if FAKE_LATENCY > 0:
+        time.sleep(FAKE_LATENCY)
+
+
+# =========================
+# 1) OpenAI (chat.completions.create만)
+# =========================
+def _candidate_names(content) -> list:
+    """prompt.py 순위 프롬프트의 "후보:" 아래 줄들에서 운동명만"""
+    _, _, body = content.partition("\n후보:\n")
+    return [line.split("|", 1)[0] for line in body.splitlines() if line.strip()]
+
+
+def _fake_answer(messages) -> str:
+    try:
+        content = messages[-1]["content"]
+    except (KeyError, IndexError, TypeError):
+        content = ""
+    try:
+        data = json.loads(content)
+    except (ValueError, TypeError):
+        data = {}
+
+    # 순위 요청: 후보 목록 앞에서부터 3개
+    names = _candidate_names(content)[:3] if isinstance(content, str) else []
+    if names:
+        top3 = [
+            {"rank": i + 1, "운동명": n, "이유": "테스트용 응답입니다."}
+            for i, n in enumerate(names)
+        ]
+        return json.dumps({"top3": top3}, ensure_ascii=False)
+
+    # 음악 검색어 요청
+    if "top3_운동" in data:
+        queries = {n: [f"{n} workout playlist", f"{n} 운동 음악"] for n in data["top3_운동"]}
+        return json.dumps({"queries": queries}, ensure_ascii=False)
+
+    return "{}"
+
+
+class _FakeCompletions:
+    def create(self, model=None, messages=None, stream=False, **kwargs):
+        _sleep()
+        content = _fake_answer(messages or [])
+        if not stream:
+            message = SimpleNamespace(content=content)
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+        def chunks():
+            for i in range(0, len(content), 16):
+                delta = SimpleNamespace(content=content[i:i + 16])
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+        return chunks()
+
+
+class FakeOpenAI:
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=_FakeCompletions())
+
+
+# =========================
+# 2) Spotify (search만)
+# =========================
+class FakeSpotify:
+    def search(self, q, type="playlist", limit=3, market=None):
+        _sleep()
+        digest = hashlib.sha1(str(q).encode("utf-8")).hexdigest()[:12]
+        item = {
+            "name": f"{q} mix",
+            "owner": {"display_name": "moodfit"},
+            "external_urls": {"spotify": f"https://open.spotify.com/playlist/fake-{digest}"},
+        }
+        return {"playlists": {"items": [item]}}
+
+
+# =========================
+# 3) 날씨 (requests.Session.get 자리)
+# =========================
+class _FakeResponse:
+    def __init__(self, data):
+        self._data = data
+
+    def json(self):
+        return self._data
+
+
+class FakeWeatherSession:
+    def get(self, url, params=None, timeout=None):
+        _sleep()
+        return _FakeResponse({"weather": [{"main": "Clear"}], "main": {"temp": 20.0}})
@@ -0,0 +1,336 @@
+# llm.py
+# -*- coding: utf-8 -*-
+import os
+import re
+import json
+import pandas as pd
+import numpy as np
+from datetime import date, datetime
+from dotenv import load_dotenv
+
+from clients import get_openai_client
+from rank_cache import get_rank_cache, make_rank_key
+from local_ranker import local_rank_top3
+from prompt import build_rank_messages, PROMPT_MODEL
+from ratelimit import call_limited
+from singleflight import get_flight, request_key
+from llm_guard import hedged_call, note_cache_hit, LLM_CALL_TIMEOUT
+from tracing import span, traced
+
+load_dotenv()
+
+# 순위 응답을 스트리밍으로 받아 항목별로 먼저 보여줄지 (LLM_STREAMING=0이면 한 번에)
+LLM_STREAMING = os.getenv("LLM_STREAMING", "1").strip().lower() not in ("0", "false", "no")
+
+
+class MissingApiKeyError(RuntimeError):
+    pass
+
+
+# =========================
+# 1) JSON 직렬화 안전 변환
+# =========================
+def to_json_safe(obj):
+    """
+    json.dumps에서 깨지는 타입(date, datetime, Timestamp, numpy 등)을
+    전부 안전하게 str/float/int/list/dict로 바꿔주는 함수
+    """
+    if isinstance(obj, (pd.Timestamp, datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, (np.integer,)):
+        return int(obj)
+    if isinstance(obj, (np.floating,)):
+        return float(obj)
+    if isinstance(obj, (np.ndarray,)):
+        return obj.tolist()
+    if isinstance(obj, dict):
+        return {k: to_json_safe(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [to_json_safe(v) for v in obj]
+    if pd.isna(obj):
+        return None
+    return obj
+
+
+# =========================
+# 2) LLM 응답 JSON 파싱
+# =========================
+def robust_json_parse(text):
+    text = text.strip()
+    text = re.sub(r"```(json)?", "", text).strip("` \n")
+    m = re.search(r"\{.*\}", text, flags=re.S)
+    if m:
+        text = m.group(0)
+    return json.loads(text)
+
+
+# =========================
+# 3) LLM Top3 + 이유 생성
+#   - 프롬프트는 prompt.py (필요한 항목만, 로컬 점수 상위 후보만, 토큰 예산 안에서)
+# =========================
+def _fallback_top3(candidates_df, user_row, daily_row):
+    # LLM 응답을 못 쓰면 로컬 점수 Top3로 대신함
+    fallback = local_rank_top3(candidates_df, daily_row, user_row)
+    for item in fallback:
+        item["이유"] = "LLM 파싱 실패로 로컬 점수 기준 추천: " + item["이유"]
+    return fallback
+
+
+def _rank_cache_lookup(use_cache, candidates_df, user_row, daily_row, place_pref, equip_list):
+    """
+    (cache, cache_key, 캐시된 top3 또는 None)
+    """
+    cache = get_rank_cache()
+    if not (use_cache and cache.enabled):
+        cache.record_bypass()
+        return cache, None, None
+    with span("rank_cache") as sp:
+        cache_key = make_rank_key(candidates_df, user_row, daily_row, place_pref, equip_list)
+        cached = cache.get(cache_key)
+        sp.set(cache_hit=cached is not None)
+    if cached is not None:
+        note_cache_hit()
+    return cache, cache_key, cached
+
+
+def _openai_client():
+    client = get_openai_client()
+    if client is None:
+        raise MissingApiKeyError("OPENAI_API_KEY 환경변수가 없습니다. .env 또는 환경변수에 넣어주세요.")
+    return client
+
+
+@traced("llm_rank_top3")
+def llm_rank_top3(candidates_df, user_row, daily_row,
+                  weather, temp, city, place_pref, equip_list,
+                  merged_user_info, use_cache=True):
+    """
+    use_cache=False면 의미 캐시(rank_cache)를 건너뛰고 항상 LLM 호출
+    """
+    # 비슷한 조건의 이전 결과(파싱 완료된 top3)가 있으면 LLM 호출 없이 반환
+    cache, cache_key, cached = _rank_cache_lookup(
+        use_cache, candidates_df, user_row, daily_row, place_pref, equip_list
+    )
+    if cached is not None:
+        return cached
+
+    client = _openai_client()
+    # 로컬 점수 상위 후보만 넘김 (캐시 키는 줄이기 전 후보 집합 기준 그대로)
+    messages, candidates_df = build_rank_messages(
+        candidates_df, user_row, daily_row, weather, temp, city, place_pref, equip_list,
+        merged_user_info
+    )
+
+    # 같은 프롬프트로 이미 진행 중인 호출이 있으면 그 결과를 같이 받음
+    return get_flight("rank").do(
+        _rank_flight_key(messages), _rank_once,
+        client, messages, candidates_df, user_row, daily_row, cache, cache_key
+    )
+
+
+def _rank_flight_key(messages) -> str:
+    return request_key("rank", PROMPT_MODEL, messages)
+
+
+def _rank_once(client, messages, candidates_df, user_row, daily_row, cache, cache_key):
+    # 요청마다 타임아웃, 느리면 (LLM_HEDGE일 때) 같은 요청을 한 번 더 보내 먼저 온 응답 사용
+    with span("openai_chat", model=PROMPT_MODEL) as sp:
+        resp = hedged_call(
+            call_limited, "openai", client.chat.completions.create,
+            model=PROMPT_MODEL,
+            messages=messages,
+            temperature=0.7,
+            timeout=LLM_CALL_TIMEOUT
+        )
+        content = resp.choices[0].message.content
+        sp.set(bytes=len((content or "").encode("utf-8")))
+    try:
+        parsed = robust_json_parse(content)
+        top3 = parsed["top3"]
+    except:
+        return _fallback_top3(candidates_df, user_row, daily_row)
+
+    if cache_key is not None:
+        cache.put(cache_key, top3)
+    return top3
+
+
+# =========================
+# 4) 스트리밍 Top3
+#   - 응답이 오는 대로 "top3" 배열 안의 객체가 닫히는 순간 하나씩 꺼냄
+# =========================
+class Top3StreamParser:
+    """
+    스트림 조각을 feed()로 넣으면 새로 완성된 top3 항목(dict) 리스트를 돌려주는 증분 파서.
+    문자열 안의 중괄호/이스케이프는 건너뛰고, 지금까지 본 위치부터만 이어서 훑음.
+    """
+    def __init__(self):
+        self.buf = ""
+        self.pos = -1          # "top3" 배열 '[' 다음부터 훑은 위치 (-1: 아직 못 찾음)
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.obj_start = None
+        self.done = False
+        self.items = []
+
+    def _find_array(self):
+        m = re.search(r'"top3"\s*:\s*\[', self.buf)
+        if m:
+            self.pos = m.end()
+
+    def feed(self, chunk):
+        if self.done or not chunk:
+            return []
+        self.buf += chunk
+        if self.pos < 0:
+            self._find_array()
+            if self.pos < 0:
+                return []
+
+        new_items = []
+        buf = self.buf
+        i = self.pos
+        while i < len(buf):
+            ch = buf[i]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch == "{":
+                if self.depth == 0:
+                    self.obj_start = i
+                self.depth += 1
+            elif ch == "}":
+                self.depth -= 1
+                if self.depth == 0 and self.obj_start is not None:
+                    try:
+                        item = json.loads(buf[self.obj_start:i + 1])
+                    except ValueError:
+                        item = None
+                    if isinstance(item, dict) and item.get("운동명"):
+                        self.items.append(item)
+                        new_items.append(item)
+                    self.obj_start = None
+            elif ch == "]" and self.depth == 0:
+                self.done = True
+                i += 1
+                break
+            i += 1
+        self.pos = i
+        return new_items
+
+
+def _fill_top3(got, more) -> list:
+    """이미 보낸 got 뒤에 붙일 more의 항목 (운동명이 겹치지 않게, 합쳐서 3개까지)"""
+    seen = {item.get("운동명") for item in got}
+    extra = []
+    for item in more:
+        if len(got) + len(extra) >= 3:
+            break
+        if isinstance(item, dict) and item.get("운동명") and item["운동명"] not in seen:
+            seen.add(item["운동명"])
+            extra.append(item)
+    return extra
+
+
+def llm_rank_top3_stream(candidates_df, user_row, daily_row,
+                         weather, temp, city, place_pref, equip_list,
+                         merged_user_info, use_cache=True):
+    """
+    llm_rank_top3의 스트리밍 버전: rank 항목이 완성되는 대로 하나씩 yield.
+    캐시 적중이면 바로 전부 yield. 배열이 닫히고 3개가 다 온 응답만 캐시하고,
+    모자라면 전체 파싱 → 로컬 점수 fallback 순으로 나머지를 채움.
+    """
+    cache, cache_key, cached = _rank_cache_lookup(
+        use_cache, candidates_df, user_row, daily_row, place_pref, equip_list
+    )
+    if cached is not None:
+        for item in cached:
+            yield item
+        return
+
+    client = _openai_client()
+    # 로컬 점수 상위 후보만 넘김 (캐시 키는 줄이기 전 후보 집합 기준 그대로)
+    messages, candidates_df = build_rank_messages(
+        candidates_df, user_row, daily_row, weather, temp, city, place_pref, equip_list,
+        merged_user_info
+    )
+
+    # 같은 프롬프트로 진행 중인 호출(스트리밍이든 아니든)이 있으면 끝난 결과를 한꺼번에 받음
+    flight = get_flight("rank")
+    flight_key = _rank_flight_key(messages)
+    fut, shared = flight.wait(flight_key)
+    if fut is None:
+        for item in shared:
+            yield item
+        return
+
+    top3, complete = None, False
+    try:
+        top3, complete = yield from _stream_rank_once(
+            client, messages, candidates_df, user_row, daily_row, cache, cache_key
+        )
+    except Exception as e:
+        flight.finish(flight_key, fut, exc=e)
+        raise
+    finally:
+        # 결과든 중단이든 여기서 반드시 정리 (소비하는 쪽이 중간에 닫으면 GeneratorExit로 옴).
+        # 중단되거나 응답이 온전하지 않았으면 기다리던 쪽이 새로 호출
+        if not fut.done():
+            if complete:
+                flight.finish(flight_key, fut, top3)
+            else:
+                flight.abandon(flight_key, fut)
+
+
+def _stream_rank_once(client, messages, candidates_df, user_row, daily_row, cache, cache_key):
+    """
+    항목을 yield하고, (최종 top3, 온전한 응답인지)를 반환.
+    배열이 닫히고 3개가 다 온 응답만 캐시하고 기다리던 쪽과 공유함
+    """
+    # call_limited(stream=True)가 돌려준 스트림은 다 읽거나 닫을 때까지 동시 호출 자리를 잡고 있음
+    # (제너레이터 안이라 구간은 응답이 시작될 때까지만 잼)
+    with span("openai_chat", model=PROMPT_MODEL, stream=True):
+        stream = call_limited(
+            "openai", client.chat.completions.create, stream=True,
+            model=PROMPT_MODEL,
+            messages=messages,
+            temperature=0.7,
+            timeout=LLM_CALL_TIMEOUT
+        )
+
+    parser = Top3StreamParser()
+    try:
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content or ""
+            for item in parser.feed(delta):
+                yield item
+    finally:
+        # 소비하는 쪽이 중간에 닫아도 자리를 바로 돌려줌
+        stream.close()
+
+    top3 = list(parser.items)
+    if parser.done and len(top3) >= 3:
+        if cache_key is not None:
+            cache.put(cache_key, top3)
+        return top3, True
+
+    # 스트림이 끊겼거나 항목이 모자람: 전체 파싱 → 로컬 점수 fallback 순으로 빈자리만 채움 (캐시 안 함)
+    try:
+        more = robust_json_parse(parser.buf)["top3"]
+    except:
+        more = []
+    extra = _fill_top3(top3, more)
+    if len(top3) + len(extra) < 3:
+        extra += _fill_top3(top3 + extra, _fallback_top3(candidates_df, user_row, daily_row))
+    for item in extra:
+        yield item
+    return top3 + extra, False
@@ -0,0 +1,335 @@
+# llm_guard.py
+# -*- coding: utf-8 -*-
+"""
+LLM 순위 단계의 지연 상한 (평균보다 꼬리 지연을 줄이는 쪽)
+
+- 단계 예산: LLM_BUDGET_SEC 안에 순위가 안 나오면 로컬 점수 Top3를 바로 돌려줌.
+  LLM 호출은 뒤에서 끝까지 돌고, 결과는 llm.py가 rank_cache에 넣어 다음 요청에서 씀
+- 헤지: (선택) 최근 호출의 p95를 넘기면 같은 요청을 한 번 더 보내 먼저 온 응답을 씀
+- 회로 차단기: 실패/예산 초과가 연속 LLM_BREAKER_FAILURES번이면 LLM_BREAKER_COOLDOWN_SEC 동안
+  LLM을 건너뛰고 로컬 순위만 씀. 그 뒤 한 요청만 시험 삼아 보내 성공하면 다시 엶
+"""
+import os
+import sys
+import time
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait as wait_futures
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from tracing import bind
+
+
+def _env_flag(name, default="0"):
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes")
+
+
+# 순위 단계 예산 (초, 0이면 예산 없이 LLM을 끝까지 기다림) / OpenAI 요청 한 번의 타임아웃 (초)
+LLM_BUDGET_SEC = float(os.getenv("LLM_BUDGET_SEC", "8"))
+LLM_CALL_TIMEOUT = float(os.getenv("LLM_CALL_TIMEOUT_SEC", "20"))
+# 헤지 요청: 최근 성공 호출 지연의 LLM_HEDGE_PERCENTILE 분위수를 넘기면 한 번 더 보냄
+LLM_HEDGE = _env_flag("LLM_HEDGE")
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_MIN_SEC = float(os.getenv("LLM_HEDGE_MIN_SEC", "1.0"))
+# 회로 차단기
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "3"))
+LLM_BREAKER_COOLDOWN_SEC = float(os.getenv("LLM_BREAKER_COOLDOWN_SEC", "30"))
+
+# 예산을 넘겨 뒤에 남은 LLM 호출을 돌리는 풀 / 헤지 호출 풀 (서로 기다리다 막히지 않게 분리)
+_llm_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm")
+_hedge_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm-hedge")
+
+REASON_SLOW = "LLM 응답 지연으로 로컬 점수 기준 추천: "
+REASON_OPEN = "LLM 응답 지연이 계속되어 로컬 점수 기준 추천: "
+REASON_ERROR = "LLM 호출 실패로 로컬 점수 기준 추천: "
+
+
+# =========================
+# 1) 지연 기록 (최근 성공 호출)
+# =========================
+class LatencyWindow:
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        i = min(len(samples) - 1, int(len(samples) * p / 100))
+        return samples[i]
+
+    def __len__(self):
+        return len(self._samples)
+
+
+# =========================
+# 2) 회로 차단기
+# =========================
+class CircuitBreaker:
+    def __init__(self, failures=LLM_BREAKER_FAILURES, cooldown=LLM_BREAKER_COOLDOWN_SEC):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.state = "closed"           # closed / open / half_open
+        self._fails = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.cooldown:
+                # 시험 요청 하나만 통과 (결과가 나올 때까지 나머지는 계속 건너뜀)
+                self.state = "half_open"
+                return True
+            return False
+
+    def record(self, ok) -> None:
+        """ok=None: 판정 없음 (API 키 없음 등 제공자 상태와 무관한 실패)"""
+        with self._lock:
+            if ok is None:
+                if self.state == "half_open":
+                    # 시험 요청이 판정 없이 끝남: 다음 요청이 바로 다시 시험
+                    self.state = "open"
+                    self._opened_at = time.monotonic() - self.cooldown
+                return
+            if ok:
+                self.state = "closed"
+                self._fails = 0
+                return
+            self._fails += 1
+            if self.state == "half_open" or self._fails >= self.failures:
+                if self.state != "open":
+                    print(f"llm: 회로 차단 ({self.cooldown:.0f}초 동안 로컬 순위 사용)", file=sys.stderr)
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+latency = LatencyWindow()
+breaker = CircuitBreaker()
+_local = threading.local()
+
+
+def note_cache_hit() -> None:
+    """llm.py: 이번 순위는 rank_cache에서 나옴 (제공자 상태를 알 수 없으므로 차단기에 반영 안 함)"""
+    _local.cache_hit = True
+
+
+def _cache_hit() -> bool:
+    hit = getattr(_local, "cache_hit", False)
+    _local.cache_hit = False
+    return hit
+
+
+_stats = {"llm": 0, "over_budget": 0, "errors": 0, "skipped": 0, "hedged": 0, "hedge_won": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def guard_stats() -> dict:
+    with _stats_lock:
+        out = dict(_stats)
+    out["breaker"] = breaker.state
+    p95 = latency.percentile(95)
+    out["p95_sec"] = None if p95 is None else round(p95, 3)
+    return out
+
+
+# =========================
+# 3) 헤지 호출
+# =========================
+def hedge_delay():
+    """헤지를 보낼 대기 시간 (초). 꺼져 있거나 표본이 부족하면 None"""
+    if not LLM_HEDGE or len(latency) < LLM_HEDGE_MIN_SAMPLES:
+        return None
+    return max(LLM_HEDGE_MIN_SEC, latency.percentile(LLM_HEDGE_PERCENTILE))
+
+
+def hedged_call(fn, *args, **kwargs):
+    """
+    fn(*args, **kwargs)를 부르고 지연을 기록. 헤지가 켜져 있으면 p95를 넘길 때 한 번 더 보내
+    먼저 성공한 응답을 반환 (둘 다 실패하면 마지막 예외)
+    """
+    start = time.perf_counter()
+    delay = hedge_delay()
+    if delay is None:
+        result = fn(*args, **kwargs)
+        latency.add(time.perf_counter() - start)
+        return result
+
+    futures = [_hedge_pool.submit(bind(fn), *args, **kwargs)]
+    done, _ = wait_futures(futures, timeout=delay)
+    if not done:
+        futures.append(_hedge_pool.submit(bind(fn), *args, **kwargs))
+        _count("hedged")
+
+    pending = set(futures)
+    error = None
+    while pending:
+        done, pending = wait_futures(pending, return_when=FIRST_COMPLETED)
+        for f in done:
+            if f.exception() is None:
+                latency.add(time.perf_counter() - start)
+                if f is not futures[0]:
+                    _count("hedge_won")
+                return f.result()
+            error = f.exception()
+    raise error
+
+
+# =========================
+# 4) 예산 안에서 순위 (넘기면 로컬 순위)
+# =========================
+class _Attempt:
+    """LLM 호출 한 번의 판정 (예산 초과/실패/성공 중 먼저 정해진 것 하나만 차단기에 반영)"""
+    def __init__(self, use_breaker=True):
+        self._judged = not use_breaker
+        self._lock = threading.Lock()
+
+    def judge(self, ok) -> None:
+        with self._lock:
+            if self._judged:
+                return
+            self._judged = True
+        breaker.record(ok)
+
+
+def _marked(items, reason, start_rank=1):
+    out = []
+    for i, item in enumerate(items):
+        out.append(dict(item, rank=start_rank + i, 이유=reason + item.get("이유", "")))
+    return out
+
+
+def _fill_local(local_fn, shown, reason):
+    """이미 보여준 항목은 빼고 로컬 순위로 나머지를 채움"""
+    names = {item.get("운동명") for item in shown}
+    need = max(0, 3 - len(shown))
+    rest = [item for item in local_fn(3 + len(shown)) if item.get("운동명") not in names][:need]
+    return _marked(rest, reason, start_rank=len(shown) + 1)
+
+
+def is_fallback(items) -> bool:
+    """LLM 대신 로컬 점수로 채운 항목이 있는지 (예산 초과/회로 차단/호출 실패)"""
+    return any(str(item.get("이유", "")).startswith((REASON_SLOW, REASON_OPEN, REASON_ERROR)) for item in items)
+
+
+def rank_within_budget(llm_fn, local_fn, budget=LLM_BUDGET_SEC, passthrough=(), use_breaker=True):
+    """
+    llm_fn(): LLM Top3, local_fn(k): 로컬 점수 상위 k개 (같은 형식).
+    budget초 안에 LLM 결과가 없거나, 실패하거나, 차단기가 열려 있으면 로컬 Top3를 반환.
+    passthrough에 든 예외(API 키 없음 등)는 그대로 올림.
+    use_breaker=False면 차단기를 보지도, 기록하지도 않음 (배치처럼 화면 지연과 무관한 호출)
+    """
+    if use_breaker and not breaker.allow():
+        _count("skipped")
+        return _marked(local_fn(3), REASON_OPEN)
+
+    _count("llm")
+    attempt = _Attempt(use_breaker)
+    start = time.perf_counter()
+
+    def run():
+        _cache_hit()
+        try:
+            result = llm_fn()
+        except passthrough:
+            attempt.judge(None)
+            raise
+        except Exception:
+            attempt.judge(False)
+            raise
+        if _cache_hit():
+            attempt.judge(None)
+        else:
+            attempt.judge(not budget or time.perf_counter() - start <= budget)
+        return result
+
+    fut = _llm_pool.submit(bind(run))
+    try:
+        return fut.result(timeout=budget or None)
+    except FutureTimeout:
+        # 호출은 계속 돌고, 끝나면 rank_cache에 남음
+        _count("over_budget")
+        attempt.judge(False)
+        return _marked(local_fn(3), REASON_SLOW)
+    except passthrough:
+        raise
+    except Exception:
+        _count("errors")
+        return _marked(local_fn(3), REASON_ERROR)
+
+
+def rank_stream_within_budget(llm_stream_fn, local_fn, budget=LLM_BUDGET_SEC, passthrough=(),
+                              use_breaker=True):
+    """
+    rank_within_budget의 스트리밍 버전: LLM 항목이 오는 대로 yield하다가
+    budget초가 지나거나 실패하면 남은 자리를 로컬 순위로 채움
+    """
+    if use_breaker and not breaker.allow():
+        _count("skipped")
+        yield from _marked(local_fn(3), REASON_OPEN)
+        return
+
+    _count("llm")
+    attempt = _Attempt(use_breaker)
+    start = time.perf_counter()
+    deadline = start + budget if budget else None
+    events = queue.Queue()
+
+    def pump():
+        # 예산을 넘겨도 스트림은 끝까지 읽어서 결과가 rank_cache에 남게 함
+        _cache_hit()
+        try:
+            for item in llm_stream_fn():
+                events.put(("item", item))
+        except passthrough as e:
+            attempt.judge(None)
+            events.put(("raise", e))
+            return
+        except Exception as e:
+            attempt.judge(False)
+            events.put(("error", e))
+            return
+        if _cache_hit():
+            attempt.judge(None)
+        else:
+            attempt.judge(deadline is None or time.perf_counter() <= deadline)
+        events.put(("done", None))
+
+    _llm_pool.submit(bind(pump))
+    shown = []
+    while True:
+        remaining = None if deadline is None else deadline - time.perf_counter()
+        try:
+            if remaining is not None and remaining <= 0:
+                raise queue.Empty
+            kind, value = events.get(timeout=remaining)
+        except queue.Empty:
+            _count("over_budget")
+            attempt.judge(False)
+            yield from _fill_local(local_fn, shown, REASON_SLOW)
+            return
+        if kind == "item":
+            shown.append(value)
+            yield value
+        elif kind == "done":
+            return
+        elif kind == "raise":
+            raise value
+        else:
+            _count("errors")
+            yield from _fill_local(local_fn, shown, REASON_ERROR)
+            return
@@ -0,0 +1,173 @@
+# local_ranker.py
+# -*- coding: utf-8 -*-
+import os
+import re
+import numpy as np
+
+from catalog import INTENSITY_ORDER, split_tags, PURPOSE_TAGS, EMOTION_TAGS, popcount, has_any
+from condition import infer_target_intensity
+from emotions import decode_mask
+
+# 점수 가중치 (합이 1일 필요는 없음)
+DEFAULT_WEIGHTS = {
+    "emotion": 0.30,
+    "purpose": 0.30,
+    "intensity": 0.25,
+    "energy": 0.15,
+}
+
+# RANKING_MODE=llm|local (기본 llm)
+RANKING_MODE = os.getenv("RANKING_MODE", "llm").strip().lower()
+
+_INTENSITY_POS = {v: i for i, v in enumerate(INTENSITY_ORDER)}
+
+
+def _num(v, default):
+    try:
+        x = float(v)
+    except (TypeError, ValueError):
+        return default
+    return default if np.isnan(x) else x
+
+
+def day_emotions(daily_row) -> list:
+    # 저장 시 계산해 둔 감정 비트마스크가 있으면 문자열을 나누지 않고 사용
+    if "감정_마스크" in daily_row.index:
+        names = decode_mask(daily_row["감정_마스크"])
+        if names:
+            return names
+    for col in ["감정_리스트", "감정"]:
+        if col in daily_row.index:
+            tags = split_tags(daily_row[col])
+            if tags:
+                return tags
+    return []
+
+
+def _base_name(name) -> str:
+    # "크런치(보통으로)" / "크런치(강하게)" 같은 변형은 같은 운동으로 취급
+    return re.sub(r"\(.*?\)", "", str(name)).strip()
+
+
+# =========================
+# 1) 후보 전체를 한 번에 점수화
+# =========================
+def score_candidates(candidates_df, daily_row, user_row, target_intensity=None, weights=None):
+    """
+    후보별 점수(np.ndarray)와 항목별 점수 dict 반환
+    - emotion: 오늘 감정과 감정매핑이 겹치는 비율
+    - purpose: 운동목적 일치 여부
+    - intensity: 목표 강도와의 거리 (같으면 1, 한 단계 차이 0.5)
+    - energy: 단위체중당에너지소비량 × 체중 × 운동가능시간 (후보 내 최대값 기준 0~1)
+    """
+    weights = weights or DEFAULT_WEIGHTS
+    n = len(candidates_df)
+    if n == 0:
+        return np.zeros(0), {}
+
+    if target_intensity is None:
+        target_intensity, _ = infer_target_intensity(daily_row, user_row)
+
+    # 감정 겹침: 후보 감정매핑 비트셋 AND 오늘 감정 비트셋의 popcount
+    emotions = day_emotions(daily_row)
+    if emotions:
+        day_bits = np.uint64(EMOTION_TAGS.encode(emotions))
+        hits = popcount(candidates_df["감정매핑_bits"].to_numpy(dtype=np.uint64) & day_bits)
+        emotion = hits.astype(float) / len(emotions)
+    else:
+        emotion = np.zeros(n)
+
+    purpose = str(daily_row.get("운동목적", "") or "").strip()
+    purpose_bits = candidates_df["운동목적_bits"].to_numpy(dtype=np.uint64)
+    purpose_match = has_any(purpose_bits, PURPOSE_TAGS.encode([purpose])).astype(float)
+
+    target_pos = _INTENSITY_POS.get(target_intensity, 1)
+    pos = candidates_df["운동강도"].map(_INTENSITY_POS).to_numpy(dtype=float)
+    dist = np.where(np.isnan(pos), 1.0, np.abs(pos - target_pos))
+    intensity = 1.0 - dist / max(1, len(INTENSITY_ORDER) - 1)
+
+    weight_kg = _num(user_row.get("몸무게(kg)"), _num(daily_row.get("몸무게(kg)"), 65.0))
+    minutes = _num(daily_row.get("운동가능시간(분)"), 30.0)
+    met = candidates_df["단위체중당에너지소비량"].to_numpy(dtype=float)
+    kcal = met * weight_kg * (minutes / 60.0)
+    top_kcal = kcal.max() if n else 0.0
+    energy = kcal / top_kcal if top_kcal > 0 else np.zeros(n)
+
+    parts = {
+        "emotion": emotion,
+        "purpose": purpose_match,
+        "intensity": intensity,
+        "energy": energy,
+        "kcal": kcal,
+    }
+    score = (
+        weights["emotion"] * emotion
+        + weights["purpose"] * purpose_match
+        + weights["intensity"] * intensity
+        + weights["energy"] * energy
+    )
+    return score, parts
+
+
+def prerank(candidates_df, daily_row, user_row, target_intensity=None, top_k=None):
+    """
+    LLM에 넘기기 전 로컬 점수순으로 후보 정렬 (top_k가 있으면 상위 k개만)
+    """
+    if len(candidates_df) == 0:
+        return candidates_df
+    score, _ = score_candidates(candidates_df, daily_row, user_row, target_intensity)
+    order = np.argsort(-score, kind="stable")
+    if top_k is not None:
+        order = order[:top_k]
+    return candidates_df.iloc[order].reset_index(drop=True)
+
+
+# =========================
+# 2) 로컬 Top3 (네트워크 없음)
+# =========================
+def _reason(row, parts, i, target_intensity, emotions):
+    bits = []
+    tags = EMOTION_TAGS.decode(row["감정매핑_bits"])
+    matched = [e for e in emotions if e in tags]
+    if matched:
+        bits.append(f"오늘 감정({', '.join(matched)})과 잘 맞고")
+    if parts["purpose"][i] > 0:
+        bits.append("운동 목적에 부합하며")
+    if parts["intensity"][i] >= 1.0:
+        bits.append(f"목표 강도({target_intensity})와 일치하고")
+    else:
+        bits.append(f"목표 강도({target_intensity})에 가까운 {row['운동강도']} 운동이며")
+    bits.append(f"가능한 시간 동안 약 {parts['kcal'][i]:.0f}kcal를 소모할 수 있습니다.")
+    return " ".join(bits)
+
+
+def local_rank_top3(candidates_df, daily_row, user_row, target_intensity=None, k=3):
+    """
+    llm_rank_top3와 같은 형식([{"rank", "운동명", "이유"}])으로 반환.
+    같은 운동의 강도 변형(괄호 표기)은 한 번만 고름.
+    """
+    if target_intensity is None:
+        target_intensity, _ = infer_target_intensity(daily_row, user_row)
+
+    score, parts = score_candidates(candidates_df, daily_row, user_row, target_intensity)
+    if len(score) == 0:
+        return []
+
+    emotions = day_emotions(daily_row)
+    order = np.argsort(-score, kind="stable")
+    top = []
+    seen = set()
+    for i in order:
+        row = candidates_df.iloc[i]
+        base = _base_name(row["운동명"])
+        if base in seen:
+            continue
+        seen.add(base)
+        top.append({
+            "rank": len(top) + 1,
+            "운동명": row["운동명"],
+            "이유": _reason(row, parts, i, target_intensity, emotions),
+        })
+        if len(top) >= k:
+            break
+    return top
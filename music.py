@@ -0,0 +1,329 @@
+# music.py
+# -*- coding: utf-8 -*-
+import os
+import re
+import sys
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from dotenv import load_dotenv
+from spotipy import SpotifyException
+
+from clients import get_openai_client
+from llm import to_json_safe, robust_json_parse
+from condition import get_emotion_from_daily
+from ratelimit import call_limited, RateLimitTimeout
+from singleflight import get_flight, request_key
+from tracing import span, bind
+
+load_dotenv()
+
+# 동시 검색 스레드 수 (모든 세션이 공유하는 풀)
+SPOTIFY_MAX_WORKERS = int(os.getenv("SPOTIFY_MAX_WORKERS", "8"))
+MUSIC_QUERY_MODEL = "gpt-4o-mini"
+_search_pool = ThreadPoolExecutor(max_workers=SPOTIFY_MAX_WORKERS, thread_name_prefix="spotify")
+
+
+# =========================
+# 1) Spotify 하이브리드 추천
+#   - LLM이 운동별 검색어 생성
+#   - 실패 시 강도/목적 기반 카테고리 fallback
+# =========================
+# 강도/목적 기반 fallback 맵 (작고 유지 쉬움)
+INTENSITY_MUSIC = {
+    "고강도": ["high energy workout playlist", "HIIT gym music", "cardio beast mode"],
+    "중강도": ["motivating workout playlist", "cardio running music", "upbeat fitness"],
+    "저강도": ["stretching yoga chill playlist", "lofi workout", "calm fitness music"]
+}
+
+PURPOSE_MUSIC = {
+    "근력": ["strength training playlist", "gym motivation music"],
+    "체력": ["endurance workout playlist", "running cardio music"],
+    "유연": ["yoga stretching relaxing", "pilates calm playlist"],
+    "다이어트": ["fat burn cardio playlist", "dance workout music"],
+    "스트레스": ["stress relief chill playlist", "relaxing workout music"]
+}
+
+def make_queries_from_category(target_intensity, purpose="", emotion=""):
+    queries = []
+
+    base_list = INTENSITY_MUSIC.get(target_intensity, INTENSITY_MUSIC["중강도"])
+    for b in base_list:
+        queries.append(b)
+
+    p = str(purpose or "")
+    for key in PURPOSE_MUSIC:
+        if key in p:
+            for q in PURPOSE_MUSIC[key]:
+                queries.append(q)
+
+    if emotion:
+        queries.append(f"{emotion} mood playlist")
+        queries.append(f"{emotion} 음악 플레이리스트")
+
+    dedup = []
+    for q in queries:
+        if q not in dedup:
+            dedup.append(q)
+    return dedup
+
+
+def make_queries_for_workout(workout_name):
+    """
+    운동 이름만으로 만드는 검색어 (LLM 없이, 스트리밍에서 운동이 정해지는 즉시 검색할 때).
+    "크런치(가볍게)" 같은 변형은 괄호를 떼고 검색
+    """
+    base = re.sub(r"\(.*?\)", "", str(workout_name or "")).strip()
+    if not base:
+        return []
+    return [f"{base} 플레이리스트", f"{base} workout playlist"]
+
+
+def llm_make_music_queries(top3, daily_row, target_intensity, purpose):
+    """
+    Top3 운동 각각에 대해 스포티파이 검색어(한+영)를 2~3개 생성.
+    실패 시 빈 dict 반환.
+    """
+    client = get_openai_client()
+    if client is None:
+        return {}
+
+    prompt = {
+        "top3_운동": [top3[i]["운동명"] for i in range(len(top3))],
+        "강도": target_intensity,
+        "목적": purpose,
+        "감정": str(daily_row.get("감정_리스트","") or daily_row.get("감정","")),
+        "운동가능시간": daily_row.get("운동가능시간(분)", "")
+    }
+
+    system = """
+당신은 운동별 음악/플레이리스트 추천 전문가입니다.
+입력된 Top3 운동 각각에 대해 스포티파이에서 잘 검색될 '플레이리스트 검색어'를
+한국어+영어 혼합으로 2~3개씩 만들어주세요.
+
+규칙:
+- 운동 성격에 맞는 음악 분위기(템포/무드)를 반영
+- 실제 스포티파이에서 검색될 법한 짧은 키워드
+- 반드시 JSON만 출력
+
+출력:
+{
+  "queries": {
+    "운동명1": ["검색어1", "검색어2", "검색어3"],
+    "운동명2": ["..."],
+    "운동명3": ["..."]
+  }
+}
+"""
+
+    messages = [
+        {"role":"system","content":system},
+        {"role":"user","content":json.dumps(to_json_safe(prompt), ensure_ascii=False)}
+    ]
+    # 같은 입력으로 진행 중인 검색어 생성이 있으면 그 결과를 같이 받음
+    return get_flight("music_queries").do(
+        request_key("music_queries", MUSIC_QUERY_MODEL, messages), _music_queries_once, client, messages
+    )
+
+
+def _music_queries_once(client, messages):
+    try:
+        with span("openai_chat", model=MUSIC_QUERY_MODEL, purpose="music_queries"):
+            resp = call_limited(
+                "openai", client.chat.completions.create,
+                model=MUSIC_QUERY_MODEL,
+                messages=messages,
+                temperature=0.5
+            )
+    except RateLimitTimeout:
+        # 한도 대기 시간 초과: 카테고리 기반 검색어로 대신함
+        return {}
+
+    try:
+        data = robust_json_parse(resp.choices[0].message.content)
+    except (ValueError, AttributeError, IndexError) as e:
+        # 응답이 JSON이 아님: 카테고리 기반 검색어로 대신함
+        print(f"music: 검색어 응답 파싱 실패 ({type(e).__name__}: {e})", file=sys.stderr)
+        return {}
+    queries = data.get("queries") if isinstance(data, dict) else None
+    return queries if isinstance(queries, dict) else {}
+
+
+# =========================
+# 2) 플레이리스트 검색
+#   - 순차: 쿼리를 하나씩 검색
+#   - 동시: 쿼리를 한꺼번에 날리고, 앞 쿼리부터 결과를 확인해 다 모이면 나머지는 취소
+#   어느 쪽이든 "쿼리 순서대로 보고, URL 중복 제거" 결과는 같음
+# =========================
+def _search_items(sp, q, per_query_limit, market):
+    # 같은 검색이 진행 중이면 그 결과를 같이 받음 (순차/동시/파이프라인 검색 모두 여기를 거침)
+    return get_flight("spotify_search").do(
+        request_key("spotify_search", q, per_query_limit, market), _search_once,
+        sp, q, per_query_limit, market
+    )
+
+
+def _search_once(sp, q, per_query_limit, market):
+    with span("spotify_search", q=q) as s:
+        try:
+            res = call_limited("spotify", sp.search, q=q, type="playlist", limit=per_query_limit, market=market)
+        except RateLimitTimeout:
+            # 한도 대기 시간 초과: 이 검색어는 결과 없음으로 보고 다음 검색어/fallback으로 넘어감
+            s.set(error="rate_limit", items=0)
+            return []
+        except (SpotifyException, requests.RequestException) as e:
+            print(f"music: 스포티파이 검색 실패 ({q!r}: {type(e).__name__}: {e})", file=sys.stderr)
+            s.set(error=type(e).__name__, items=0)
+            return []
+        items = ((res or {}).get("playlists") or {}).get("items") or []
+        s.set(items=len(items))
+        return items
+
+
+def _pick_playlists(query_items, total_limit):
+    """
+    query_items: (검색어, items) 를 쿼리 순서대로 내주는 iterable
+    """
+    results = []
+    seen = set()
+
+    for q, items in query_items:
+        for i in range(len(items)):  # enumerate 금지
+            pl = items[i]
+            if pl is None:
+                continue
+
+            title = pl.get("name") or ""
+            owner_obj = pl.get("owner") or {}
+            owner = owner_obj.get("display_name") or owner_obj.get("id") or "unknown"
+            ext = pl.get("external_urls") or {}
+            url = ext.get("spotify") or ""
+
+            if not url or url in seen:
+                continue
+
+            seen.add(url)
+            results.append({
+                "title": title,
+                "url": url,
+                "owner": owner,
+                "query_used": q
+            })
+
+            if len(results) >= total_limit:
+                return results
+
+    return results
+
+
+def _submit_searches(sp, queries, per_query_limit, market):
+    futures = []
+    for qi in range(len(queries)):
+        futures.append(_search_pool.submit(bind(_search_items), sp, queries[qi], per_query_limit, market))
+    return futures
+
+
+def _pick_from_futures(queries, futures, total_limit):
+    def query_items():
+        for qi in range(len(queries)):
+            yield queries[qi], futures[qi].result()
+
+    try:
+        return _pick_playlists(query_items(), total_limit)
+    finally:
+        # 이미 충분히 모았으면 아직 시작 안 한 검색은 취소
+        for f in futures:
+            f.cancel()
+
+
+def spotify_search_playlists(sp, queries, per_query_limit=3, total_limit=1, market="KR",
+                             concurrent=False):
+    """
+    여러 쿼리를 검색 → URL 중복 제거 → total_limit개 반환
+    concurrent=True면 쿼리를 동시에 검색 (결과는 순차 검색과 동일)
+    """
+    if sp is None:
+        return []
+
+    if concurrent:
+        futures = _submit_searches(sp, queries, per_query_limit, market)
+        return _pick_from_futures(queries, futures, total_limit)
+
+    def query_items():
+        for qi in range(len(queries)):
+            q = queries[qi]
+            yield q, _search_items(sp, q, per_query_limit, market)
+
+    return _pick_playlists(query_items(), total_limit)
+
+
+def get_playlists_for_top3_with_llm(sp, top3, daily_row, target_intensity, purpose, market="KR",
+                                    concurrent=True):
+    """
+    Top3 운동 각각에 대해:
+    1) LLM이 만든 운동별 음악 검색어로 검색
+    2) 실패하면 강도/목적 기반 fallback 쿼리로 검색
+    concurrent=True면 3개 운동의 검색어를 모두 한 번에 날려 왕복 1회 수준으로 끝냄
+    """
+    emotion = get_emotion_from_daily(daily_row)
+    llm_queries = llm_make_music_queries(top3, daily_row, target_intensity, purpose)
+
+    plans = []
+    for t in top3:
+        wname = t.get("운동명", "")
+        queries = llm_queries.get(wname, [])
+
+        if not queries:
+            queries = make_queries_from_category(target_intensity, purpose, emotion)
+        plans.append((wname, queries))
+
+    if not concurrent or sp is None:
+        out = []
+        for wname, queries in plans:
+            pls = spotify_search_playlists(
+                sp, queries,
+                per_query_limit=3,
+                total_limit=1,
+                market=market
+            )
+            out.append({"운동명": wname, "playlists": pls})
+        return out
+
+    # 운동별 검색을 먼저 전부 제출한 뒤 결과를 모음
+    submitted = []
+    for wname, queries in plans:
+        submitted.append((wname, queries, _submit_searches(sp, queries, 3, market)))
+
+    out = []
+    for wname, queries, futures in submitted:
+        pls = _pick_from_futures(queries, futures, total_limit=1)
+        out.append({"운동명": wname, "playlists": pls})
+    return out
+
+
+def start_playlist_search(sp, queries, per_query_limit=3, total_limit=1, market="KR"):
+    """
+    검색을 지금 (동시) 제출하고, 결과를 모으는 함수를 돌려줌.
+    결과는 spotify_search_playlists(concurrent=True)와 같음
+    """
+    futures = _submit_searches(sp, queries, per_query_limit, market) if (queries and sp is not None) else []
+    return lambda: _pick_from_futures(queries, futures, total_limit) if futures else []
+
+
+def search_playlists_for_top3(sp, top3, llm_queries, fallback_playlists, market="KR"):
+    """
+    파이프라인용: LLM 검색어가 있는 운동만 새로 (동시) 검색하고,
+    검색어가 없거나 검색 결과가 없는 운동은 미리 검색해 둔 fallback 결과를 사용
+    """
+    submitted = []
+    for t in top3:
+        wname = t.get("운동명", "")
+        queries = (llm_queries or {}).get(wname, [])
+        submitted.append((wname, start_playlist_search(sp, queries, 3, 1, market)))
+
+    out = []
+    for wname, collect in submitted:
+        pls = collect() or list(fallback_playlists or [])
+        out.append({"운동명": wname, "playlists": pls})
+    return out
@@ -0,0 +1,319 @@
+# pipeline.py
+# -*- coding: utf-8 -*-
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from llm import llm_rank_top3, llm_rank_top3_stream, MissingApiKeyError
+from llm_guard import rank_within_budget, rank_stream_within_budget
+from local_ranker import RANKING_MODE, local_rank_top3
+from music import (
+    make_queries_from_category, llm_make_music_queries, make_queries_for_workout,
+    start_playlist_search, spotify_search_playlists, search_playlists_for_top3
+)
+from condition import get_emotion_from_daily
+from tracing import span, bind
+
+# 모든 세션이 공유하는 단계 실행 풀
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="pipeline")
+
+
+class StageSkipped(RuntimeError):
+    """앞 단계가 실패해서 실행하지 못한 단계"""
+    pass
+
+
+# =========================
+# 1) 단계 + 의존 그래프 실행기
+# =========================
+class Stage:
+    """
+    fn(r): r은 입력값 + 끝난 단계 결과가 담긴 dict (단계 이름 = 결과 키)
+    background=True면 Pipeline.start()가 끝나기를 기다리지 않는 단계 (예: 저장)
+    """
+    def __init__(self, name, fn, deps=(), background=False):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.background = background
+
+
+class PipelineRun:
+    def __init__(self, stages, inputs):
+        self.stages = {s.name: s for s in stages}
+        self.results = dict(inputs)
+        self.errors = {}
+        self.timings = {}  # 이름 → (시작 오프셋, 소요 시간) 초
+        self._done = {name: threading.Event() for name in self.stages}
+        self._lock = threading.Lock()
+        self._started = set()
+        self._t0 = time.perf_counter()
+
+    def _ready(self, stage):
+        return all(self._done[d].is_set() for d in stage.deps if d in self._done)
+
+    def _schedule(self):
+        to_submit = []
+        with self._lock:
+            for name, stage in self.stages.items():
+                if name in self._started or not self._ready(stage):
+                    continue
+                self._started.add(name)
+                to_submit.append(stage)
+        for stage in to_submit:
+            # 단계 구간이 start()를 부른 쪽의 추적에 붙도록 컨텍스트를 넘김
+            _executor.submit(bind(self._run_stage), stage)
+
+    def _run_stage(self, stage):
+        failed = [d for d in stage.deps if d in self.errors]
+        start = time.perf_counter()
+        try:
+            if failed:
+                raise StageSkipped(f"{stage.name}: 선행 단계 실패 ({', '.join(failed)})")
+            with span(f"stage:{stage.name}", background=stage.background):
+                value = stage.fn(self.results)
+            with self._lock:
+                self.results[stage.name] = value
+        except Exception as e:
+            with self._lock:
+                self.errors[stage.name] = e
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                self.timings[stage.name] = (start - self._t0, end - start)
+            self._done[stage.name].set()
+            self._schedule()
+
+    def result(self, name, timeout=None):
+        """해당 단계가 끝날 때까지 기다렸다가 결과 반환 (실패했으면 그 예외를 다시 발생)"""
+        if not self._done[name].wait(timeout):
+            raise TimeoutError(f"{name} 단계가 {timeout}초 안에 끝나지 않았습니다.")
+        if name in self.errors:
+            raise self.errors[name]
+        return self.results[name]
+
+    def wait(self, include_background=False, timeout=None):
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        for name, stage in self.stages.items():
+            if stage.background and not include_background:
+                continue
+            remain = None if deadline is None else max(0.0, deadline - time.perf_counter())
+            self._done[name].wait(remain)
+        return self
+
+    def timing_rows(self):
+        """표시용: 시작 순서대로 (단계, 시작ms, 소요ms, 상태)"""
+        with self._lock:
+            items = sorted(self.timings.items(), key=lambda kv: kv[1][0])
+            rows = []
+            for name, (offset, duration) in items:
+                status = "실패" if name in self.errors else "완료"
+                if self.stages[name].background:
+                    status += "(백그라운드)"
+                rows.append({
+                    "단계": name,
+                    "시작(ms)": round(offset * 1000, 1),
+                    "소요(ms)": round(duration * 1000, 1),
+                    "상태": status,
+                })
+        return rows
+
+
+class Pipeline:
+    def __init__(self, stages):
+        names = {s.name for s in stages}
+        for s in stages:
+            unknown = [d for d in s.deps if d not in names]
+            if unknown:
+                raise ValueError(f"{s.name}: 없는 단계에 의존합니다 {unknown}")
+        self.stages = list(stages)
+
+    def start(self, **inputs) -> PipelineRun:
+        """의존성이 없는 단계부터 바로 실행을 시작하고 PipelineRun을 즉시 반환"""
+        run = PipelineRun(self.stages, inputs)
+        run._schedule()
+        return run
+
+
+# =========================
+# 2) Top3 추천 파이프라인
+#   rank ──┬─> save (백그라운드 저장)
+#          └─> music_queries ─┐
+#   fallback_search ──────────┴─> playlists
+#   (fallback 검색어는 rank 결과와 무관하므로 LLM이 도는 동안 미리 검색)
+#
+#   streaming=True면 rank가 항목을 하나씩 내놓을 때마다 rank_queue로 화면에 넘기고,
+#   그 운동 이름으로 만든 검색어(LLM 없이)로 플리 검색을 바로 시작
+#   (music_queries 단계 없이 playlists가 운동별 결과를 모음, 결과가 없으면 fallback)
+#
+#   세션 playlist_cache 키: 조건(강도|목적|감정) + Top3 / fallback / 운동 하나.
+#   적중하면 그 검색(과 LLM 검색어 생성)을 아예 하지 않음
+# =========================
+def _rank_args(r):
+    return (
+        r["candidates_df"], r["user_row"], r["daily_row"],
+        r["weather"], r["temp"], r["city"],
+        r["place_pref"], r["equip_list"],
+        r["merged_user_info"]
+    )
+
+def _is_local(r):
+    return (r.get("ranking_mode") or RANKING_MODE) == "local"
+
+def _local_top3(r, k=3):
+    return local_rank_top3(r["candidates_df"], r["daily_row"], r["user_row"], r.get("target_intensity"), k=k)
+
+def _guard_args(r):
+    # 입력에 llm_budget이 있으면 그 예산 사용 (배치: 0 = 끝까지 기다림), llm_breaker=False면 차단기 건너뜀
+    kwargs = {"passthrough": (MissingApiKeyError,), "use_breaker": r.get("llm_breaker", True)}
+    if r.get("llm_budget") is not None:
+        kwargs["budget"] = r["llm_budget"]
+    return kwargs
+
+def _llm_top3(r):
+    # 예산(LLM_BUDGET_SEC)을 넘기거나 실패/회로 차단이면 로컬 순위로 대신함
+    return rank_within_budget(
+        lambda: llm_rank_top3(*_rank_args(r)), lambda k: _local_top3(r, k), **_guard_args(r)
+    )
+
+def _llm_top3_stream(r):
+    return rank_stream_within_budget(
+        lambda: llm_rank_top3_stream(*_rank_args(r)), lambda k: _local_top3(r, k), **_guard_args(r)
+    )
+
+def _emit_done(r):
+    q = r.get("rank_queue")
+    if q is not None:
+        q.put(None)
+
+def _rank(r):
+    try:
+        top3 = _local_top3(r) if _is_local(r) else _llm_top3(r)
+        q = r.get("rank_queue")
+        if q is not None:
+            for item in top3:
+                q.put(item)
+        return top3
+    finally:
+        _emit_done(r)
+
+def _cache_key(r, suffix):
+    emotion = get_emotion_from_daily(r["daily_row"])
+    return f"{r['target_intensity']}|{r['purpose']}|{emotion}|{suffix}"
+
+def _top3_cache_key(r):
+    return _cache_key(r, "/".join(t.get("운동명", "") for t in r["rank"]))
+
+def _cached(r, key):
+    cache = r.get("playlist_cache")
+    return None if cache is None else cache.get(key)
+
+def _make_rank_stream(with_music):
+    def _rank_stream(r):
+        q = r.get("rank_queue")
+        # 운동별 (항목, 캐시 결과 또는 결과를 모으는 함수) - playlists 단계가 읽음
+        item_music = r["_item_music"] = []
+        top3 = []
+        try:
+            items = _local_top3(r) if _is_local(r) else _llm_top3_stream(r)
+            for item in items:
+                top3.append(item)
+                if q is not None:
+                    q.put(item)
+                if not with_music:
+                    continue
+                wname = item.get("운동명", "")
+                cached = _cached(r, _cache_key(r, f"item:{wname}"))
+                if cached is not None:
+                    item_music.append((item, cached))
+                else:
+                    item_music.append((item, start_playlist_search(
+                        r.get("sp"), make_queries_for_workout(wname), market=r.get("market", "KR")
+                    )))
+            return top3
+        finally:
+            _emit_done(r)
+    return _rank_stream
+
+def _save(r):
+    return r["storage"].save_recommendations(r["user_name"], r["used_date"], r["rank"])
+
+def _fallback_search(r):
+    # 조건이 같으면 fallback 결과는 같으므로 세션 캐시에 있으면 검색하지 않음
+    key = _cache_key(r, "fallback")
+    cached = _cached(r, key)
+    if cached is not None:
+        return cached
+    emotion = get_emotion_from_daily(r["daily_row"])
+    queries = make_queries_from_category(r["target_intensity"], r["purpose"], emotion)
+    pls = spotify_search_playlists(
+        r["sp"], queries,
+        per_query_limit=3,
+        total_limit=1,
+        market=r.get("market", "KR"),
+        concurrent=True
+    )
+    if r.get("playlist_cache") is not None and r["sp"] is not None:
+        r["playlist_cache"][key] = pls
+    return pls
+
+def _music_queries(r):
+    # 이 Top3의 플리가 이미 세션 캐시에 있거나 검색할 수 없으면 LLM 검색어를 만들지 않음
+    if r["sp"] is None or _cached(r, _top3_cache_key(r)) is not None:
+        return None
+    return llm_make_music_queries(r["rank"], r["daily_row"], r["target_intensity"], r["purpose"])
+
+def _playlists(r):
+    # 같은 세션에서 같은 Top3면 이전 결과 재사용
+    cache = r.get("playlist_cache")
+    cache_key = _top3_cache_key(r)
+    cached = _cached(r, cache_key)
+    if cached is not None:
+        return cached
+
+    fallback = r["fallback_search"]
+    if "_item_music" in r:
+        # 스트리밍: 운동이 정해질 때마다 시작한 검색 결과를 모음 (없으면 fallback)
+        pairs = []
+        for item, music in r["_item_music"]:
+            wname = item.get("운동명", "")
+            if callable(music):
+                music = music()
+                if cache is not None and music:
+                    cache[_cache_key(r, f"item:{wname}")] = music
+            pairs.append({"운동명": wname, "playlists": music or list(fallback or [])})
+    else:
+        pairs = search_playlists_for_top3(
+            r["sp"], r["rank"], r["music_queries"], fallback,
+            market=r.get("market", "KR")
+        )
+    if cache is not None:
+        cache[cache_key] = pairs
+    return pairs
+
+
+def build_top3_pipeline(with_music=True, streaming=False, save=True) -> Pipeline:
+    """
+    입력(start 인자): storage, candidates_df, user_row, daily_row, weather, temp, city,
+    place_pref, equip_list, merged_user_info, user_name, used_date
+    + 음악 사용 시 target_intensity, purpose, sp, market, playlist_cache
+    + 화면에 순위를 하나씩 넘겨받으려면 rank_queue (끝나면 None)
+    + ranking_mode="llm"|"local" (없으면 RANKING_MODE 환경변수, local은 네트워크 없이 점수로 순위)
+    + llm_budget (순위 단계 예산 초, 없으면 LLM_BUDGET_SEC) / llm_breaker=False면 회로 차단기 미사용
+    """
+    rank_fn = _make_rank_stream(with_music) if streaming else _rank
+    stages = [Stage("rank", rank_fn)]
+    if save:
+        stages.append(Stage("save", _save, deps=["rank"], background=True))
+    if with_music and streaming:
+        stages += [
+            Stage("fallback_search", _fallback_search),
+            Stage("playlists", _playlists, deps=["rank", "fallback_search"]),
+        ]
+    elif with_music:
+        stages += [
+            Stage("fallback_search", _fallback_search),
+            Stage("music_queries", _music_queries, deps=["rank"]),
+            Stage("playlists", _playlists, deps=["rank", "music_queries", "fallback_search"]),
+        ]
+    return Pipeline(stages)
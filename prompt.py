@@ -0,0 +1,188 @@
+# prompt.py
+# -*- coding: utf-8 -*-
+"""
+LLM 순위 프롬프트 (필요한 항목만, 짧은 텍스트 형식, 토큰 예산 안에서)
+
+- 사용자/오늘 정보는 화이트리스트 항목만 "키=값"으로
+- 후보는 로컬 점수 상위 PROMPT_TOP_K개만 "운동명|강도|목적|감정|MET" 한 줄씩
+- 전체가 PROMPT_TOKEN_BUDGET을 넘으면 점수 낮은 후보부터 뺌 (최소 3개는 유지)
+"""
+import os
+import logging
+import threading
+
+import pandas as pd
+
+from local_ranker import prerank, day_emotions
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+PROMPT_TOP_K = int(os.getenv("PROMPT_TOP_K", "15"))
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1500"))
+PROMPT_MODEL = "gpt-4o-mini"
+# 프롬프트 형식/문구를 바꾸면 올릴 것 (rank_cache 키에 들어가서 이전 형식의 응답을 재사용하지 않음)
+PROMPT_VERSION = 1
+MIN_CANDIDATES = 3
+
+# (프롬프트 표기, 컬럼명)
+USER_FIELDS = [
+    ("나이", "나이"), ("성별", "성별"), ("키", "키(cm)"), ("몸무게", "몸무게(kg)"),
+    ("활동량", "활동량"), ("부상", "부상 이력"), ("부상상세", "부상 상세"),
+]
+DAILY_FIELDS = [
+    ("수면", "수면시간"), ("스트레스", "스트레스"), ("가능시간(분)", "운동가능시간(분)"),
+    ("목적", "운동목적"),
+]
+
+
+# =========================
+# 1) 토큰 수 (tiktoken이 있으면 정확히, 없으면 보수적으로 추정)
+# =========================
+_encoder = None
+
+
+def count_tokens(text: str) -> int:
+    global _encoder
+    if tiktoken is not None:
+        if _encoder is None:
+            try:
+                _encoder = tiktoken.encoding_for_model(PROMPT_MODEL)
+            except KeyError:
+                _encoder = tiktoken.get_encoding("o200k_base")
+        return len(_encoder.encode(text))
+    # 영문/숫자는 약 4자당 1토큰, 한글 등은 글자당 1토큰으로 넉넉하게 잡음
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+def count_message_tokens(messages) -> int:
+    # 메시지마다 붙는 역할/구분 토큰 몫으로 4개씩 더함
+    return sum(count_tokens(m["content"]) + 4 for m in messages)
+
+
+# =========================
+# 2) 짧은 텍스트 형식
+# =========================
+def _fmt(v) -> str:
+    if v is None or (not isinstance(v, (list, tuple, dict)) and pd.isna(v)):
+        return ""
+    if isinstance(v, float) and v.is_integer():
+        v = int(v)
+    return str(v).strip().replace("\n", " ").replace("|", "/")
+
+
+def _pairs(source, fields) -> str:
+    out = []
+    for label, col in fields:
+        v = _fmt(source.get(col))
+        if v and v != "nan":
+            out.append(f"{label}={v}")
+    return " ".join(out)
+
+
+def _candidate_line(r) -> str:
+    tags = lambda s: ",".join(x.strip() for x in _fmt(s).split(",") if x.strip())
+    return "|".join([
+        _fmt(r["운동명"]), _fmt(r["운동강도"]), tags(r["운동목적"]), tags(r["감정매핑"]),
+        _fmt(round(float(r["단위체중당에너지소비량"]), 1)),
+    ])
+
+
+def _system_prompt(place_pref, equip_list) -> str:
+    return f"""당신은 운동 처방 코치입니다.
+후보 운동 중 사용자에게 가장 잘 맞는 Top3를 고르고 각각 구체적인 이유를 쓰세요.
+
+[규칙]
+1) Top3는 서로 다른 유형/계열 (예: 요가/스트레칭 계열 2개 이상 금지, 유산소/근력/유연성/균형을 섞기)
+2) 사용자 정보(나이/성별/키/몸무게/활동량/부상)를 반드시 고려
+3) 오늘 상태(수면, 스트레스, 가능시간, 감정, 목적)로 현실적으로 가능한 운동 우선
+4) 비/눈이거나 실내 권장이면 실내/홈트 중심. 장소 권장: {place_pref}
+5) 보유 장비로 가능한 운동 우선. 보유장비: {", ".join(equip_list) if equip_list else "없음/미기재"}
+6) 운동명은 후보 목록에 있는 그대로 쓰고, JSON 외 텍스트는 출력 금지
+
+후보 형식: 운동명|강도|목적|감정매핑|MET(단위체중당에너지소비량)
+출력 형식:
+{{"top3": [{{"rank": 1, "운동명": "...", "이유": "..."}}, {{"rank": 2, "운동명": "...", "이유": "..."}}, {{"rank": 3, "운동명": "...", "이유": "..."}}]}}"""
+
+
+def _user_header(daily_row, weather, temp, city, merged_user_info) -> str:
+    today = _pairs(daily_row, DAILY_FIELDS)
+    emotions = day_emotions(daily_row)
+    if emotions:
+        today = f"감정={','.join(emotions)} " + today
+    return "\n".join([
+        f"날씨: {city} {weather} {_fmt(round(float(temp), 1)) if temp is not None else ''}°C",
+        f"사용자: {_pairs(merged_user_info or {}, USER_FIELDS)}",
+        f"오늘: {today}",
+    ])
+
+
+# =========================
+# 3) 메시지 만들기 + 크기 기록
+# =========================
+# 프롬프트마다 토큰 수/후보 수를 DEBUG로 남김 (보일지는 앱의 로깅 설정에서 정함)
+_log = logging.getLogger("moodfit.prompt")
+
+_stats = {"calls": 0, "tokens": 0, "trimmed": 0, "over_budget": 0, "last": None}
+_stats_lock = threading.Lock()
+
+
+def prompt_stats() -> dict:
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _record(info):
+    with _stats_lock:
+        _stats["calls"] += 1
+        _stats["tokens"] += info["tokens"]
+        _stats["trimmed"] += info["candidates_in"] - info["candidates"]
+        _stats["over_budget"] += int(info["tokens"] > info["budget"])
+        _stats["last"] = info
+    _log.debug(
+        "prompt: %d tokens (budget %d), candidates %d/%d, %d chars",
+        info["tokens"], info["budget"], info["candidates"], info["candidates_in"], info["chars"]
+    )
+
+
+def build_rank_messages(candidates_df, user_row, daily_row, weather, temp, city,
+                        place_pref, equip_list, merged_user_info,
+                        top_k=PROMPT_TOP_K, budget=PROMPT_TOKEN_BUDGET):
+    """
+    (messages, 프롬프트에 넣은 후보 DataFrame). 후보는 로컬 점수순.
+    LLM 파싱 실패 시 fallback도 이 후보들로 하면 됨
+    """
+    ranked = prerank(candidates_df, daily_row, user_row, top_k=top_k)
+
+    system = _system_prompt(place_pref, equip_list)
+    header = _user_header(daily_row, weather, temp, city, merged_user_info)
+    lines = [_candidate_line(ranked.iloc[i]) for i in range(len(ranked))]
+
+    # 고정 부분 + 후보 줄을 예산 안에서 점수순으로 채움 (최소 MIN_CANDIDATES개)
+    used = count_tokens(system) + count_tokens(header) + count_tokens("후보:") + 8 + 2
+    keep = 0
+    for line in lines:
+        cost = count_tokens(line) + 1
+        if keep >= MIN_CANDIDATES and used + cost > budget:
+            break
+        used += cost
+        keep += 1
+
+    ranked = ranked.iloc[:keep].reset_index(drop=True)
+    user = header + "\n후보:\n" + "\n".join(lines[:keep])
+    messages = [
+        {"role": "system", "content": system},
+        {"role": "user", "content": user},
+    ]
+
+    _record({
+        "tokens": count_message_tokens(messages),
+        "budget": budget,
+        "chars": len(system) + len(user),
+        "candidates": keep,
+        "candidates_in": len(candidates_df),
+    })
+    return messages, ranked
@@ -0,0 +1,163 @@
+# rank_cache.py
+# -*- coding: utf-8 -*-
+import os
+import json
+import time
+import math
+import sqlite3
+import hashlib
+import threading
+
+from condition import infer_target_intensity
+from prompt import PROMPT_MODEL, PROMPT_VERSION
+
+# 저장 위치 / 유효기간 / 최대 항목 수 / 끄기 스위치
+RANK_CACHE_DB = os.getenv("RANK_CACHE_DB", "rank_cache.db")
+RANK_CACHE_TTL = float(os.getenv("RANK_CACHE_TTL_SEC", str(7 * 24 * 3600)))
+RANK_CACHE_MAX = int(os.getenv("RANK_CACHE_MAX", "5000"))
+RANK_CACHE_DISABLED = os.getenv("RANK_CACHE_DISABLED", "").strip().lower() in ("1", "true", "yes")
+
+
+# =========================
+# 1) 캐시 키: 정규화 + 구간화한 특징 시그니처
+#   비슷한 컨디션이면 같은 키가 나오도록 연속값은 구간으로 묶음
+# =========================
+def arousal_bucket(arousal) -> str:
+    try:
+        a = float(arousal)
+    except (TypeError, ValueError):
+        return "nan"
+    if math.isnan(a):
+        return "nan"
+    return f"{round(a * 2) / 2:.1f}"  # 0.5 단위
+
+
+def candidate_set_hash(candidates_df) -> str:
+    names = sorted(str(x) for x in candidates_df["운동명"].tolist())
+    return hashlib.sha1("\n".join(names).encode("utf-8")).hexdigest()[:16]
+
+
+def rank_signature(candidates_df, user_row, daily_row, place_pref, equip_list) -> dict:
+    target_intensity, arousal = infer_target_intensity(daily_row, user_row)
+    injury = str(user_row.get("부상 이력", "없음") or "없음").strip()
+    return {
+        "intensity": target_intensity,
+        "purpose": str(daily_row.get("운동목적", "") or "").strip(),
+        "place": str(place_pref or "").strip(),
+        "equipment": sorted({str(e).strip() for e in (equip_list or []) if str(e).strip()}),
+        "candidates": candidate_set_hash(candidates_df),
+        "injury": injury == "있음",
+        "arousal": arousal_bucket(arousal),
+        # 모델/프롬프트가 바뀌면 예전 응답과 섞이지 않게
+        "prompt": f"{PROMPT_MODEL}/v{PROMPT_VERSION}",
+    }
+
+
+def make_rank_key(candidates_df, user_row, daily_row, place_pref, equip_list) -> str:
+    sig = rank_signature(candidates_df, user_row, daily_row, place_pref, equip_list)
+    raw = json.dumps(sig, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# =========================
+# 2) 디스크 캐시 (SQLite, TTL + LRU)
+# =========================
+class RankCache:
+    def __init__(self, db_path=RANK_CACHE_DB, ttl=RANK_CACHE_TTL, max_entries=RANK_CACHE_MAX,
+                 enabled=not RANK_CACHE_DISABLED):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {"hit": 0, "miss": 0, "expired": 0, "put": 0, "evicted": 0, "bypass": 0}
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rank_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_rank_cache_access ON rank_cache(last_access)")
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._stats[name] += n
+
+    def record_bypass(self) -> None:
+        self._count("bypass")
+
+    def get(self, key):
+        """파싱된 top3 리스트 또는 None"""
+        if not self.enabled:
+            return None
+
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT value, created_at FROM rank_cache WHERE key = ?", (key,)
+        ).fetchone()
+        now = time.time()
+        if row is None:
+            self._count("miss")
+            return None
+        if now - row[1] > self.ttl:
+            conn.execute("DELETE FROM rank_cache WHERE key = ?", (key,))
+            conn.commit()
+            self._count("expired")
+            self._count("miss")
+            return None
+
+        conn.execute("UPDATE rank_cache SET last_access = ? WHERE key = ?", (now, key))
+        conn.commit()
+        self._count("hit")
+        return json.loads(row[0])
+
+    def put(self, key, top3) -> None:
+        if not self.enabled:
+            return
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO rank_cache (key, value, created_at, last_access) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(top3, ensure_ascii=False), now, now)
+        )
+        # 최대 개수를 넘으면 가장 오래 안 쓴 항목부터 제거
+        cur = conn.execute(
+            "DELETE FROM rank_cache WHERE key IN ("
+            "SELECT key FROM rank_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+        conn.commit()
+        self._count("put")
+        if cur.rowcount and cur.rowcount > 0:
+            self._count("evicted", cur.rowcount)
+
+    def clear(self) -> None:
+        conn = self._conn()
+        conn.execute("DELETE FROM rank_cache")
+        conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self._stats)
+        lookups = out["hit"] + out["miss"]
+        out["hit_rate"] = (out["hit"] / lookups) if lookups else 0.0
+        return out
+
+
+_rank_cache = None
+
+
+def get_rank_cache() -> RankCache:
+    global _rank_cache
+    if _rank_cache is None:
+        _rank_cache = RankCache()
+    return _rank_cache
@@ -0,0 +1,236 @@
+# ratelimit.py
+# -*- coding: utf-8 -*-
+"""
+외부 API(OpenAI / Spotify) 호출을 프로세스 전체에서 함께 조절하는 제한기
+
+- 제공자별 토큰 버킷(초당 요청 수 + 순간 허용량)과 동시 호출 수 상한
+- 자리가 날 때까지 대기열에서 기다리되, 정해진 시간 안에 못 얻으면 RateLimitTimeout
+- 제공자가 429를 돌려주면 그 제공자 전체를 Retry-After 동안 멈추고 같은 대기열에서 다시 시도
+  (세션마다 제각각 재시도하다 fallback으로 빠지는 대신 한도 근처에서 계속 처리)
+"""
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+
+def _env_float(name, default):
+    return float(os.getenv(name, str(default)))
+
+
+# 제공자별 설정: 초당 요청 수 / 순간 허용량 / 동시 호출 수 / 자리 대기 최대 시간(초)
+LIMITS = {
+    "openai": {
+        "rate": _env_float("OPENAI_RPS", 3),
+        "burst": _env_float("OPENAI_BURST", 5),
+        "concurrency": int(_env_float("OPENAI_CONCURRENCY", 8)),
+        "timeout": _env_float("OPENAI_QUEUE_TIMEOUT_SEC", 30),
+    },
+    "spotify": {
+        "rate": _env_float("SPOTIFY_RPS", 10),
+        "burst": _env_float("SPOTIFY_BURST", 10),
+        "concurrency": int(_env_float("SPOTIFY_CONCURRENCY", 8)),
+        "timeout": _env_float("SPOTIFY_QUEUE_TIMEOUT_SEC", 10),
+    },
+}
+# 429에 Retry-After가 없을 때 멈추는 시간 (초)
+DEFAULT_BACKOFF = _env_float("RATE_LIMIT_BACKOFF_SEC", 1.0)
+
+
+class RateLimitTimeout(TimeoutError):
+    """대기 시간 안에 호출 자리를 얻지 못함"""
+    def __init__(self, provider, waited):
+        super().__init__(f"{provider} 호출 대기 시간 초과 ({waited:.1f}초)")
+        self.provider = provider
+
+
+# =========================
+# 1) 토큰 버킷 + 동시 호출 상한
+# =========================
+class ProviderLimiter:
+    def __init__(self, name, rate, burst=None, concurrency=None, timeout=None):
+        self.name = name
+        self.rate = float(rate or 0)                      # 0이면 속도 제한 없음
+        self.capacity = float(burst or max(1.0, self.rate))
+        self.concurrency = int(concurrency or 0)          # 0이면 동시 호출 제한 없음
+        self.timeout = timeout
+
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._in_flight = 0
+        self._waiting = 0
+        self._cond = threading.Condition()
+        self._stats = {"acquired": 0, "timeouts": 0, "throttled": 0, "wait_sec": 0.0}
+
+    def _refill(self, now):
+        if self.rate > 0:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout=None) -> None:
+        """토큰 1개 + 동시 호출 자리 1개를 얻을 때까지 대기 (timeout=None이면 기본값)"""
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+        with self._cond:
+            self._waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if now < self._blocked_until:
+                        wait = self._blocked_until - now
+                    elif self.concurrency and self._in_flight >= self.concurrency:
+                        wait = None  # release() 알림까지
+                    elif self.rate > 0 and self._tokens < 1:
+                        wait = (1 - self._tokens) / self.rate
+                    else:
+                        if self.rate > 0:
+                            self._tokens -= 1
+                        self._in_flight += 1
+                        self._stats["acquired"] += 1
+                        self._stats["wait_sec"] += now - start
+                        return
+
+                    if deadline is not None:
+                        remaining = deadline - now
+                        if remaining <= 0:
+                            self._stats["timeouts"] += 1
+                            raise RateLimitTimeout(self.name, now - start)
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self._cond.wait(wait)
+            finally:
+                self._waiting -= 1
+
+    def release(self) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def slot(self, timeout=None):
+        self.acquire(timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def backoff(self, seconds) -> None:
+        """제공자가 429를 돌려줌: seconds 동안 아무도 새로 호출하지 않게 함"""
+        with self._cond:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + max(0.0, seconds))
+            self._tokens = 0.0
+            self._stats["throttled"] += 1
+
+    @property
+    def queue_depth(self) -> int:
+        return self._waiting
+
+    def stats(self) -> dict:
+        with self._cond:
+            self._refill(time.monotonic())
+            out = dict(self._stats, wait_sec=round(self._stats["wait_sec"], 3))
+            out.update({
+                "queue": self._waiting,
+                "in_flight": self._in_flight,
+                "tokens": round(self._tokens, 2),
+                "blocked_sec": round(max(0.0, self._blocked_until - time.monotonic()), 2),
+            })
+            return out
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(provider) -> ProviderLimiter:
+    with _limiters_lock:
+        limiter = _limiters.get(provider)
+        if limiter is None:
+            limiter = _limiters[provider] = ProviderLimiter(provider, **LIMITS.get(provider, {"rate": 0}))
+        return limiter
+
+
+def limiter_stats() -> dict:
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {name: limiter.stats() for name, limiter in limiters.items()}
+
+
+# =========================
+# 2) 429 판별 / 제한 안에서 호출
+# =========================
+def retry_after(exc):
+    """
+    제공자 한도 초과(429) 예외면 멈출 시간(초), 아니면 None.
+    openai(status_code/response.headers)와 spotipy(http_status/headers) 예외 모두 처리
+    """
+    status = getattr(exc, "status_code", None) or getattr(exc, "http_status", None)
+    if status != 429:
+        return None
+    headers = getattr(exc, "headers", None)
+    if headers is None:
+        headers = getattr(getattr(exc, "response", None), "headers", None)
+    try:
+        return float((headers or {}).get("Retry-After") or (headers or {}).get("retry-after"))
+    except (TypeError, ValueError):
+        return DEFAULT_BACKOFF
+
+
+class _HeldStream:
+    """스트림을 다 읽거나 닫을 때까지 동시 호출 자리를 잡고 있는 래퍼"""
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+        self._released = False
+
+    def _done(self):
+        if not self._released:
+            self._released = True
+            self._release()
+
+    def __iter__(self):
+        try:
+            for chunk in self._stream:
+                yield chunk
+        finally:
+            self._done()
+
+    def close(self):
+        close = getattr(self._stream, "close", None)
+        if close is not None:
+            close()
+        self._done()
+
+    def __del__(self):
+        self._done()
+
+
+def call_limited(provider, fn, *args, queue_timeout=None, stream=False, **kwargs):
+    """
+    provider 제한 안에서 fn(*args, **kwargs) 호출.
+    429면 제공자 전체를 멈추고 남은 대기 시간(queue_timeout) 안에서 다시 줄을 섬 (넘기면 RateLimitTimeout).
+    stream=True면 fn에도 stream=True를 넘기고, 돌려받은 스트림을 다 읽을 때까지 동시 호출 자리를 유지
+    """
+    if stream:
+        kwargs["stream"] = True
+    limiter = get_limiter(provider)
+    timeout = limiter.timeout if queue_timeout is None else queue_timeout
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        limiter.acquire(remaining)
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            limiter.release()
+            wait = retry_after(e)
+            if wait is None:
+                raise
+            limiter.backoff(wait)
+            continue
+        if stream:
+            return _HeldStream(result, limiter.release)
+        limiter.release()
+        return result
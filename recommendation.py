@@ -1,15 +1,17 @@
 # recommend.py
 # -*- coding: utf-8 -*-
-import os
-import re
-import json
-import requests
-import pandas as pd
-import numpy as np
+import queue
 import streamlit as st
-from dotenv import load_dotenv
-from openai import OpenAI
-from datetime import date, datetime
+from storage import get_storage
+from catalog import load_catalog, filter_candidates, split_tags
+from weather import get_weather
+from llm import MissingApiKeyError, LLM_STREAMING
+from pipeline import build_top3_pipeline
+from engine import merge_user_info
+from local_ranker import RANKING_MODE
+from rank_cache import get_rank_cache
+from tracing import start_trace, render_sidebar
+from condition import infer_place_preference, infer_target_intensity
 
 # =========================
 # 0) 기본 설정
@@ -20,6 +22,9 @@ st.set_page_config(
     page_icon="🏋️"
 )
 
+# rerun마다 새 추적 (MOODFIT_TRACE=1일 때만, 사이드바에서 폭포도 확인)
+trace = start_trace("recommendation")
+
 st.markdown("""
     <h1 style='text-align:center; font-weight:700;'>
         🏋️ 맞춤 운동 추천
@@ -29,385 +34,35 @@ st.markdown("""
     </p>
 """, unsafe_allow_html=True)
 
-USER_CSV = "users.csv"
-DAILY_CSV = "daily_info.csv"
-WORKOUT_CSV = "workout.csv"
-
-
-# =========================
-# 1) CSV 인코딩 안전 읽기
-# =========================
-def read_csv_robust(path: str) -> pd.DataFrame:
-    encodings_to_try = ["utf-8-sig", "utf-8", "cp949"]
-    last_err = None
-    for enc in encodings_to_try:
-        try:
-            return pd.read_csv(path, encoding=enc)
-        except Exception as e:
-            last_err = e
-    raise last_err
-
-
-# =========================
-# 1-1) JSON 직렬화 안전 변환
-# =========================
-def to_json_safe(obj):
-    """
-    json.dumps에서 깨지는 타입(date, datetime, Timestamp, numpy 등)을
-    전부 안전하게 str/float/int/list/dict로 바꿔주는 함수
-    """
-    if isinstance(obj, (pd.Timestamp, datetime, date)):
-        return obj.isoformat()
-    if isinstance(obj, (np.integer,)):
-        return int(obj)
-    if isinstance(obj, (np.floating,)):
-        return float(obj)
-    if isinstance(obj, (np.ndarray,)):
-        return obj.tolist()
-    if isinstance(obj, dict):
-        return {k: to_json_safe(v) for k, v in obj.items()}
-    if isinstance(obj, list):
-        return [to_json_safe(v) for v in obj]
-    if pd.isna(obj):
-        return None
-    return obj
+# 저장소 (MOODFIT_STORAGE=csv|sqlite)
+storage = get_storage()
 
 
 # =========================
-# 2) 운동 데이터 전처리
+# 2) 운동 카탈로그 (전처리 + 역색인은 catalog.py에서 한 번만)
 # =========================
-def split_tags(s):
-    if pd.isna(s):
-        return []
-    return [x.strip() for x in str(s).split(",") if x.strip()]
-
-def normalize_intensity(x):
-    x = str(x).strip()
-    x = x.replace(" ", "").replace(",,", ",").strip(",")
-    return x
-
 def load_workouts():
-    if not os.path.exists(WORKOUT_CSV):
-        st.error("workout.csv 파일이 없습니다. recommend.py와 같은 폴더에 넣어주세요.")
-        st.stop()
-
-    wdf = read_csv_robust(WORKOUT_CSV)
-
-    required_cols = ["운동명", "운동강도", "운동목적", "감정매핑", "단위체중당에너지소비량"]
-    missing = [c for c in required_cols if c not in wdf.columns]
-    if missing:
-        st.error(f"workout.csv에 컬럼이 부족합니다: {missing}")
-        st.stop()
-
-    wdf["운동강도"] = wdf["운동강도"].apply(normalize_intensity)
-    wdf["운동목적_list"] = wdf["운동목적"].apply(split_tags)
-    wdf["감정매핑_list"] = wdf["감정매핑"].apply(split_tags)
-
-    wdf["단위체중당에너지소비량"] = pd.to_numeric(
-        wdf["단위체중당에너지소비량"], errors="coerce"
-    ).fillna(0)
-
-    return wdf
-
-
-# =========================
-# 3) 날씨 조회
-# =========================
-def get_weather(city: str):
-    load_dotenv()
-    key = os.getenv("WEATHER_API_KEY")
-    if not key:
-        return "unknown", 0.0
-
-    url = (
-        "http://api.openweathermap.org/data/2.5/weather"
-        f"?q={city}&appid={key}&lang=kr&units=metric"
-    )
     try:
-        res = requests.get(url, timeout=5)
-        data = res.json()
-        weather = data.get("weather", [{}])[0].get("main", "unknown").lower()
-        temp = float(data.get("main", {}).get("temp", 0))
-        return weather, temp
-    except Exception:
-        return "unknown", 0.0
-
-
-def infer_place_preference(daily_row, weather):
-    """
-    daily_info의 운동장소 + 현재 날씨를 합쳐
-    실내/실외 권장을 반환
-    """
-    place_pref = str(daily_row.get("운동장소", "")).strip()
-    if place_pref == "nan":
-        place_pref = ""
-
-    bad_weather = any(w in weather for w in ["rain", "drizzle", "thunderstorm", "snow"])
-
-    if bad_weather:
-        final_place = "실내"
-        msg = "☔/❄ 날씨 영향으로 실내 운동을 우선 추천합니다."
-    else:
-        if place_pref in ["실내", "실외"]:
-            final_place = place_pref
-            msg = f"🌤 사용자 선호 장소({place_pref})를 반영해 추천합니다."
-        else:
-            final_place = "상관없음"
-            msg = "🌤 날씨가 무난해 실내/실외 모두 고려해 추천합니다."
-
-    return final_place, msg
-
-
-# =========================
-# 4) 목표 강도 추정 (arousal>=4 → 고강도)
-# =========================
-INTENSITY_ORDER = ["저강도", "중강도", "고강도"]
-
-POSITIVE_EMOTIONS = {"행복", "기쁨", "설렘", "자신감", "활력", "만족"}
-NEGATIVE_EMOTIONS = {"슬픔", "분노", "불안", "초조", "우울", "긴장", "스트레스"}
-
-def get_arousal_from_daily(daily_row):
-    candidates = ["감정_평균각성점수", "각성도", "감정각성도", "감정각성도점수", "arousal", "emotion_arousal"]
-    for col in candidates:
-        if col in daily_row.index:
-            try:
-                return float(daily_row[col])
-            except:
-                pass
-    return 3.0
-
-def get_emotion_from_daily(daily_row):
-    candidates = ["감정_리스트", "감정", "오늘감정", "emotion", "감정상태"]
-    for col in candidates:
-        if col in daily_row.index:
-            v = str(daily_row[col]).strip()
-            if v and v != "nan":
-                return v.split(",")[0].strip()
-    return ""
-
-def infer_target_intensity(daily_row, user_row):
-    arousal = get_arousal_from_daily(daily_row)
-    emotion = get_emotion_from_daily(daily_row)
-
-    # ✅ 기본 강도: arousal>=4 → 고강도
-    if arousal >= 4.0:
-        base = "고강도"
-    elif arousal >= 2.5:
-        base = "중강도"
-    else:
-        base = "저강도"
-
-    sleep_hours = float(daily_row.get("수면시간", 7) or 7)
-    stress_level = str(daily_row.get("스트레스", "보통") or "보통")
-    exercise_time = float(daily_row.get("운동가능시간(분)", 30) or 30)
-    activity = str(user_row.get("활동량", "보통") or "보통")
-    injury_status = str(user_row.get("부상 이력", "없음") or "없음")
-    purpose = str(daily_row.get("운동목적", "") or "")
-
-    target = base
-
-    # 1) 부정 감정/스트레스 높으면 고강도 제한
-    if emotion in NEGATIVE_EMOTIONS or stress_level == "높음":
-        if target == "고강도":
-            target = "중강도"
-
-    # 2) 수면 부족/부상 있으면 하향
-    if sleep_hours < 5 or injury_status == "있음":
-        if target == "고강도":
-            target = "중강도"
-        elif target == "중강도":
-            target = "저강도"
-
-    # 3) 활동량 높고 시간 충분하면 상향
-    if activity == "높음" and exercise_time >= 60 and injury_status != "있음":
-        if target == "저강도":
-            target = "중강도"
-        elif target == "중강도" and emotion in POSITIVE_EMOTIONS:
-            target = "고강도"
-
-    # 4) 스트레스 해소 목적일 때 과한 고강도 제한
-    if "스트레스 해소" in purpose and target == "고강도" and stress_level == "높음":
-        target = "중강도"
-
-    return target, arousal
-
-
-# =========================
-# 5) 1차 룰 기반 후보군 생성
-# =========================
-def filter_candidates(workouts_df, purpose, target_intensity):
-    cand = workouts_df[workouts_df["운동목적_list"].apply(lambda lst: purpose in lst)]
-    cand2 = cand[cand["운동강도"] == target_intensity]
-
-    # 후보가 너무 적으면 인접 강도로 확장
-    if len(cand2) < 5:
-        idx = INTENSITY_ORDER.index(target_intensity)
-        near = {target_intensity}
-        if idx - 1 >= 0:
-            near.add(INTENSITY_ORDER[idx - 1])
-        if idx + 1 < len(INTENSITY_ORDER):
-            near.add(INTENSITY_ORDER[idx + 1])
-        cand2 = cand[cand["운동강도"].isin(list(near))]
-
-    return cand2.reset_index(drop=True)
-
-
-# =========================
-# 6) LLM Top3 + 이유 생성
-#   - users.csv 정적정보 + daily_info 동적/장소/장비 전부 전달
-# =========================
-def robust_json_parse(text):
-    text = text.strip()
-    text = re.sub(r"```(json)?", "", text).strip("` \n")
-    m = re.search(r"\{.*\}", text, flags=re.S)
-    if m:
-        text = m.group(0)
-    return json.loads(text)
-
-def llm_rank_top3(candidates_df, user_row, daily_row,
-                  weather, temp, city, place_pref, equip_list,
-                  merged_user_info):
-    load_dotenv()
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        st.error("OPENAI_API_KEY 환경변수가 없습니다. .env 또는 환경변수에 넣어주세요.")
+        catalog = load_catalog(storage)
+    except ValueError as e:
+        st.error(str(e))
         st.stop()
 
-    client = OpenAI(api_key=api_key)
-
-    cand_list = []
-    for i in range(len(candidates_df)):
-        r = candidates_df.iloc[i]
-        cand_list.append({
-            "운동명": r["운동명"],
-            "운동강도": r["운동강도"],
-            "운동목적": r["운동목적"],
-            "감정매핑": r["감정매핑"],
-            "단위체중당에너지소비량": r["단위체중당에너지소비량"]
-        })
-
-    system = f"""
-당신은 운동 처방 코치입니다.
-후보 운동 목록 중 사용자에게 가장 잘 맞는 운동 Top3를 고르고,
-각 추천에 대해 구체적인 이유를 쓰세요.
-
-[중요 규칙]
-1) Top3는 서로 다른 유형/계열로 다양해야 합니다.
-   - 예: 요가/스트레칭 계열만 2개 이상 포함되면 안 됩니다.
-   - 가능하면 유산소/근력/유연성/균형 등 성격이 다른 운동을 섞어주세요.
-2) 사용자 정적정보(users.csv)를 반드시 고려하세요.
-   - 나이/성별/키/몸무게/활동량/부상 이력/부상 상세 등
-3) 오늘의 동적 상태(daily_info)를 종합해
-   - 수면시간, 스트레스, 운동가능시간(분), 감정, 운동목적
-   현실적으로 수행 가능한 운동을 우선하세요.
-4) 운동 장소/날씨:
-   - 비/눈이거나 실내 선호면 실내/홈트 중심으로 추천하세요.
-   - 사용자 장소 권장: {place_pref}
-5) 보유 장비:
-   - 사용자가 가진 장비로 가능한 운동을 우선하세요.
-   - 보유장비: {", ".join(equip_list) if equip_list else "없음/미기재"}
-6) JSON 형식 외 텍스트는 절대 출력하지 마세요.
-
-반드시 JSON만 출력합니다.
-형식:
-{{
-  "top3": [
-    {{"rank": 1, "운동명": "...", "이유": "..."}},
-    {{"rank": 2, "운동명": "...", "이유": "..."}},
-    {{"rank": 3, "운동명": "...", "이유": "..."}}
-  ]
-}}
-"""
-
-    user_prompt = {
-        "현재날씨": {"도시": city, "상태": weather, "온도": temp},
-        "사용자정적정보(users.csv+보완)": merged_user_info,
-        "오늘동적정보(daily_info)": daily_row.to_dict(),
-        "운동장소선호/권장": place_pref,
-        "보유장비": equip_list,
-        "후보운동목록": cand_list
-    }
-
-    # 내부용 컬럼 제거
-    if isinstance(user_prompt.get("오늘동적정보(daily_info)"), dict):
-        user_prompt["오늘동적정보(daily_info)"].pop("_date", None)
-
-    safe_prompt = to_json_safe(user_prompt)
-
-    resp = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": system},
-            {"role": "user", "content": json.dumps(safe_prompt, ensure_ascii=False)}
-        ],
-        temperature=0.7
-    )
-
-    content = resp.choices[0].message.content
-    try:
-        parsed = robust_json_parse(content)
-        return parsed["top3"]
-    except:
-        fallback = []
-        take_n = min(3, len(candidates_df))
-        for j in range(take_n):
-            fallback.append({
-                "rank": j+1,
-                "운동명": candidates_df.iloc[j]["운동명"],
-                "이유": "LLM 파싱 실패로 룰 기반 상위 후보를 임시 추천했습니다."
-            })
-        return fallback
-
-
-# =========================
-# 7) 추천 결과 저장 (날짜 robust)
-# =========================
-def save_recommendations(daily_df, user_name, pick_date, top3):
-    df = daily_df.copy()
-
-    df["_date"] = pd.to_datetime(df["날짜"], errors="coerce").dt.date
-    pick_date_dt = pd.to_datetime(pick_date, errors="coerce").date()
-
-    idx = df[
-        (df["이름"].astype(str) == str(user_name)) &
-        (df["_date"] == pick_date_dt)
-    ].index
-
-    if len(idx) == 0:
-        df.drop(columns=["_date"], inplace=True, errors="ignore")
-        return daily_df
-
-    idx = idx[0]
-
-    for k in range(1, 4):
-        wcol = f"추천운동{k}"
-        rcol = f"추천이유{k}"
-        if wcol not in df.columns:
-            df[wcol] = ""
-        if rcol not in df.columns:
-            df[rcol] = ""
-
-    for item in top3:
-        rk = int(item["rank"])
-        if 1 <= rk <= 3:
-            df.loc[idx, f"추천운동{rk}"] = item["운동명"]
-            df.loc[idx, f"추천이유{rk}"] = item["이유"]
+    if catalog is None:
+        st.error("workout.csv 파일이 없습니다. recommend.py와 같은 폴더에 넣어주세요.")
+        st.stop()
 
-    df.drop(columns=["_date"], inplace=True, errors="ignore")
-    df.to_csv(DAILY_CSV, index=False, encoding="utf-8-sig")
-    return df
+    return catalog
 
 
 # =========================
 # 8) UI (날씨 표시 + 중간과정 숨김 + 날짜 없어도 추천)
 # =========================
-if not os.path.exists(USER_CSV) or not os.path.exists(DAILY_CSV):
+if not storage.is_ready():
     st.warning("users.csv / daily_info.csv가 없습니다. 먼저 정적/동적 정보를 입력해주세요.")
     st.stop()
 
-users_df = read_csv_robust(USER_CSV)
-daily_df = read_csv_robust(DAILY_CSV)
-workouts_df = load_workouts()
+catalog = load_workouts()
 
 # 도시 입력
 st.markdown("## 🌍 도시 입력")
@@ -421,14 +76,14 @@ st.markdown("---")
 
 # 사용자 선택
 st.markdown("## 👤 사용자 선택")
-user_name = st.selectbox("추천 받을 사용자", users_df["이름"].astype(str).tolist())
+user_name = st.selectbox("추천 받을 사용자", storage.list_user_names())
 
 # 날짜 선택
 st.markdown("## 📅 날짜 선택")
 
-daily_df["_date"] = pd.to_datetime(daily_df["날짜"], errors="coerce").dt.date
-user_daily = daily_df[daily_df["이름"].astype(str) == str(user_name)].copy()
-available_dates = sorted([d for d in user_daily["_date"].dropna().unique()])
+# 선택한 사용자의 기록만 조회
+daily_index = storage.get_daily_index(user_name)
+available_dates = daily_index.dates
 
 if not available_dates:
     st.error("해당 사용자의 동적 정보 기록이 없습니다. '오늘의 컨디션 입력'에서 저장해주세요.")
@@ -441,32 +96,16 @@ if pick_mode == "기록에서 선택":
 else:
     pick_date = st.date_input("추천 기준 날짜를 선택하세요", value=available_dates[-1])
 
-pick_date_dt = pd.to_datetime(pick_date, errors="coerce").date()
-
 # 선택 날짜가 없으면 최근 기록으로 대체
-exact_rows = user_daily[user_daily["_date"] == pick_date_dt]
-if len(exact_rows) > 0:
-    daily_row = exact_rows.iloc[0]
-    used_date = pick_date_dt
-else:
-    before_rows = user_daily[user_daily["_date"] <= pick_date_dt].sort_values("_date")
-    if len(before_rows) > 0:
-        daily_row = before_rows.iloc[-1]
-        used_date = daily_row["_date"]
-    else:
-        daily_row = user_daily.sort_values("_date").iloc[-1]
-        used_date = daily_row["_date"]
-
+daily_row, used_date = daily_index.lookup(pick_date)
+if used_date != pick_date:
     st.caption(f"선택한 날짜 기록이 없어 **{used_date}** 기록을 기준으로 추천합니다.")
 
 # users.csv 정적 정보
-user_row = users_df[users_df["이름"].astype(str) == str(user_name)].iloc[0]
+user_row = storage.get_user(user_name)
 
 # users.csv(정적) + daily_info(보완) 합치기
-merged_user_info = user_row.to_dict()
-for k, v in daily_row.to_dict().items():
-    if k not in merged_user_info or pd.isna(merged_user_info.get(k)):
-        merged_user_info[k] = v
+merged_user_info = merge_user_info(user_row, daily_row)
 
 # daily_info 기반 변수
 purpose = str(daily_row.get("운동목적", "체력 향상") or "체력 향상")
@@ -479,39 +118,71 @@ equip_list = split_tags(daily_row.get("보유장비", ""))
 st.caption(place_msg)
 
 # 후보군 생성 (화면 숨김)
-candidates_df = filter_candidates(workouts_df, purpose, target_intensity)
+candidates_df = filter_candidates(catalog, purpose, target_intensity)
 
 st.markdown("---")
 
+# 추천 방식: AI 코치(LLM) / 빠른 추천(로컬 점수, 네트워크 없음)
+RANKING_LABELS = {"llm": "AI 코치 추천", "local": "빠른 추천 (오프라인)"}
+ranking_mode = st.radio(
+    "추천 방식",
+    list(RANKING_LABELS),
+    index=1 if RANKING_MODE == "local" else 0,
+    format_func=RANKING_LABELS.get,
+    horizontal=True
+)
+
 if st.button("🤖 Top3 운동 추천 받기", use_container_width=True):
     if len(candidates_df) == 0:
         st.error("추천할 후보 운동이 없습니다. 운동목적/강도 조건을 확인해주세요.")
         st.stop()
 
+    # 순위 → 저장은 백그라운드로
+    rank_queue = queue.Queue()
+    run = build_top3_pipeline(with_music=False, streaming=LLM_STREAMING).start(
+        storage=storage,
+        candidates_df=candidates_df, user_row=user_row, daily_row=daily_row,
+        weather=weather, temp=temp, city=city,
+        place_pref=place_pref, equip_list=equip_list,
+        merged_user_info=merged_user_info,
+        user_name=user_name, used_date=used_date,
+        ranking_mode=ranking_mode,
+        rank_queue=rank_queue
+    )
+
+    # 순위 항목이 완성되는 대로 카드부터 그림 (rank_queue가 None을 주면 끝)
+    st.markdown("## 🏅 추천 Top3")
     with st.spinner("운동 추천을 생성 중입니다..."):
-        top3 = llm_rank_top3(
-            candidates_df, user_row, daily_row,
-            weather, temp, city,
-            place_pref, equip_list,
-            merged_user_info
-        )
+        while True:
+            item = rank_queue.get()
+            if item is None:
+                break
+            st.markdown(f"""
+            <div style="
+                background:#f7f9fc; 
+                border-radius:16px; 
+                padding:18px; 
+                margin-bottom:10px;
+                border:1px solid #e5e7eb;">
+                <h3 style="margin:0;">#{item['rank']}  {item['운동명']}</h3>
+                <p style="margin-top:6px; color:#374151;">
+                    {item['이유']}
+                </p>
+            </div>
+            """, unsafe_allow_html=True)
+
+    try:
+        run.result("rank")  # 순위 단계 실패(API 키 없음 등)는 여기서 다시 발생
+    except MissingApiKeyError as e:
+        st.error(str(e))
+        st.stop()
 
-    daily_df = save_recommendations(daily_df, user_name, used_date, top3)
+    with st.expander("⏱ 단계별 소요 시간"):
+        st.table(run.timing_rows())
+        cstats = get_rank_cache().stats()
+        st.caption(
+            f"추천 캐시: hit {cstats['hit']} / miss {cstats['miss']} "
+            f"(적중률 {cstats['hit_rate']:.0%}, 우회 {cstats['bypass']})"
+        )
 
-    st.markdown("## 🏅 추천 Top3")
-    for item in top3:
-        st.markdown(f"""
-        <div style="
-            background:#f7f9fc; 
-            border-radius:16px; 
-            padding:18px; 
-            margin-bottom:10px;
-            border:1px solid #e5e7eb;">
-            <h3 style="margin:0;">#{item['rank']}  {item['운동명']}</h3>
-            <p style="margin-top:6px; color:#374151;">
-                {item['이유']}
-            </p>
-        </div>
-        """, unsafe_allow_html=True)
-
-    daily_df.drop(columns=["_date"], inplace=True, errors="ignore")
+render_sidebar(trace)
@@ -0,0 +1,239 @@
+# server.py
+# -*- coding: utf-8 -*-
+"""
+추천 HTTP API (표준 라이브러리만 사용)
+
+  python server.py --port 8000 [--processes 4] [--fake-providers]
+
+  GET  /health
+  GET  /users
+  GET  /recommend?user_name=...&date=YYYY-MM-DD&city=Seoul&music=0&ranking_mode=llm|local&save=1
+  POST /recommend  {"user_name": ..., "date": ..., "city": ..., "music": false, "ranking_mode": ..., "save": true}
+"""
+import os
+import sys
+import json
+import signal
+import argparse
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from storage import get_storage
+from engine import recommend, RecommendError
+from llm import MissingApiKeyError
+from clients import use_fake_providers
+from catalog import start_catalog_watcher
+from ratelimit import limiter_stats
+from singleflight import flight_stats
+from llm_guard import guard_stats
+
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("API_PORT", "8000"))
+# 동시에 처리하는 요청 수 / 그 외에 대기시킬 수 있는 요청 수 (넘으면 바로 503)
+API_WORKERS = int(os.getenv("API_WORKERS", "32"))
+API_MAX_PENDING = int(os.getenv("API_MAX_PENDING", "256"))
+# 같은 소켓을 나눠 받는 프로세스 수 (GIL 때문에 한 프로세스의 CPU 처리량에는 한계가 있음)
+API_PROCESSES = int(os.getenv("API_PROCESSES", "1"))
+API_MAX_BODY = 64 * 1024
+
+_BUSY_RESPONSE = (
+    b"HTTP/1.0 503 Service Unavailable\r\n"
+    b"Content-Type: application/json\r\n"
+    b"Content-Length: 17\r\n"
+    b"Connection: close\r\n\r\n"
+    b'{"error": "busy"}'
+)
+
+
+def _flag(v) -> bool:
+    return str(v).strip().lower() in ("1", "true", "yes", "on")
+
+
+# =========================
+# 1) 요청 처리
+# =========================
+class RecommendHandler(BaseHTTPRequestHandler):
+    server_version = "MoodfitAPI/1.0"
+    access_log = False
+
+    def log_message(self, format, *args):
+        if self.access_log:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _recommend(self, params):
+        user_name = str(params.get("user_name") or "").strip()
+        if not user_name:
+            return self._send_json(400, {"error": "user_name이 필요합니다."})
+
+        ranking_mode = params.get("ranking_mode") or None
+        if ranking_mode not in (None, "llm", "local"):
+            return self._send_json(400, {"error": f"알 수 없는 ranking_mode: {ranking_mode}"})
+
+        try:
+            result = recommend(
+                self.server.storage, user_name,
+                pick_date=params.get("date") or None,
+                city=params.get("city") or "Seoul",
+                with_music=_flag(params.get("music", False)),
+                ranking_mode=ranking_mode,
+                save=_flag(params.get("save", True))
+            )
+        except RecommendError as e:
+            return self._send_json(e.status, {"error": str(e)})
+        except MissingApiKeyError as e:
+            return self._send_json(503, {"error": str(e)})
+        except TimeoutError as e:
+            return self._send_json(504, {"error": str(e)})
+        except Exception as e:
+            traceback.print_exc()
+            return self._send_json(500, {"error": f"{type(e).__name__}: {e}"})
+        return self._send_json(200, result)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/health":
+            return self._send_json(200, {
+                "status": "ok", "rate_limits": limiter_stats(), "single_flight": flight_stats(),
+                "llm": guard_stats(),
+            })
+        if url.path == "/users":
+            return self._send_json(200, {"users": self.server.storage.list_user_names()})
+        if url.path == "/recommend":
+            params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            return self._recommend(params)
+        return self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/recommend":
+            return self._send_json(404, {"error": "not found"})
+
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > API_MAX_BODY:
+            return self._send_json(413, {"error": "요청 본문이 너무 큽니다."})
+        try:
+            params = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self._send_json(400, {"error": "JSON 본문을 읽을 수 없습니다."})
+        if not isinstance(params, dict):
+            return self._send_json(400, {"error": "JSON 객체가 필요합니다."})
+        return self._recommend(params)
+
+
+# =========================
+# 2) 고정 크기 워커 풀 서버
+#   ThreadingHTTPServer는 요청마다 스레드를 새로 만들어 부하가 몰리면 끝없이 늘어나므로
+#   정해진 수의 워커로만 처리하고, 대기열까지 차면 즉시 503으로 돌려보냄
+# =========================
+class PooledHTTPServer(HTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, handler, storage, workers=API_WORKERS, max_pending=API_MAX_PENDING):
+        super().__init__(address, handler)
+        self.storage = storage
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api")
+        self.slots = threading.BoundedSemaphore(workers + max_pending)
+
+    def process_request(self, request, client_address):
+        if not self.slots.acquire(blocking=False):
+            try:
+                request.sendall(_BUSY_RESPONSE)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        self.pool.submit(self._work, request, client_address)
+
+    def _work(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.slots.release()
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def make_server(host=API_HOST, port=API_PORT, storage=None, workers=API_WORKERS,
+                max_pending=API_MAX_PENDING) -> PooledHTTPServer:
+    storage = storage or get_storage()
+    return PooledHTTPServer((host, port), RecommendHandler, storage, workers, max_pending)
+
+
+def serve(server, processes=1):
+    """
+    processes > 1이면 소켓을 연 뒤 fork해서 모든 프로세스가 같은 소켓에서 accept
+    (CSV 저장소는 프로세스 간 잠금이 없으므로 이 경우 sqlite 저장소 또는 save=false 권장).
+    workout.csv 변경 감시 스레드는 fork한 뒤 프로세스마다 따로 띄움
+    (fork 전에 띄우면 자식에는 스레드 없이 그 스레드가 잡고 있던 잠금만 복사될 수 있음)
+    """
+    children = []
+    if processes > 1 and hasattr(os, "fork"):
+        # 부모가 종료 신호를 받으면 finally에서 자식도 정리
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        for _ in range(processes - 1):
+            pid = os.fork()
+            if pid == 0:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                try:
+                    start_catalog_watcher(server.storage)
+                    server.serve_forever()
+                finally:
+                    os._exit(0)
+            children.append(pid)
+    try:
+        start_catalog_watcher(server.storage)
+        server.serve_forever()
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Moodfit 추천 HTTP API")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--workers", type=int, default=API_WORKERS)
+    parser.add_argument("--max-pending", type=int, default=API_MAX_PENDING)
+    parser.add_argument("--processes", type=int, default=API_PROCESSES)
+    parser.add_argument("--fake-providers", action="store_true",
+                        help="OpenAI/Spotify/날씨 대신 fakes.py 대역 사용 (부하 테스트용)")
+    parser.add_argument("--access-log", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.fake_providers:
+        use_fake_providers(True)
+    RecommendHandler.access_log = args.access_log
+
+    server = make_server(args.host, args.port, workers=args.workers, max_pending=args.max_pending)
+    print(f"listening on http://{args.host}:{args.port} "
+          f"(processes={args.processes}, workers={args.workers})", file=sys.stderr)
+    try:
+        serve(server, args.processes)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# singleflight.py
+# -*- coding: utf-8 -*-
+"""
+같은 입력으로 동시에 들어온 외부 호출을 하나로 합치는 single-flight
+
+- 요청을 정규화한 해시(request_key)가 같은 호출이 이미 진행 중이면 새로 호출하지 않고
+  그 호출의 Future를 기다려 같은 결과(또는 같은 예외)를 받음
+- 결과는 끝난 뒤 바로 잊음 (캐시가 아니라 "지금 진행 중인 호출"만 공유)
+- 대표 호출이 결과 없이 중단되면(스트림을 중간에 닫음 등) 기다리던 쪽 중 하나가 새로 대표가 됨
+- 기다리는 쪽은 SINGLEFLIGHT_WAIT_SEC까지만 기다리고, 넘기면 합치지 않고 직접 호출
+  (대표가 끝내지도 닫지도 않은 채 멈춰도 뒤따르는 요청이 영영 막히지 않게)
+"""
+import os
+import copy
+import json
+import hashlib
+import threading
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+
+# 진행 중인 같은 호출을 기다리는 최대 시간 (초, 0이면 끝까지 기다림)
+SINGLEFLIGHT_WAIT_SEC = float(os.getenv("SINGLEFLIGHT_WAIT_SEC", "60"))
+
+
+class FlightAbandoned(Exception):
+    """대표 호출이 결과 없이 중단됨 (기다리던 쪽은 다시 시도)"""
+
+
+def request_key(*parts) -> str:
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {"leader": 0, "shared": 0, "wait_timeouts": 0}
+
+    def begin(self, key):
+        """
+        (future, leader). leader=True면 호출한 쪽이 실제로 실행하고 finish/abandon 해야 함
+        """
+        with self._lock:
+            fut = self._calls.get(key)
+            if fut is not None:
+                self._stats["shared"] += 1
+                return fut, False
+            fut = self._calls[key] = Future()
+            self._stats["leader"] += 1
+            return fut, True
+
+    def _pop(self, key, fut):
+        with self._lock:
+            if self._calls.get(key) is fut:
+                del self._calls[key]
+
+    def finish(self, key, fut, result=None, exc=None) -> None:
+        self._pop(key, fut)
+        if exc is not None:
+            fut.set_exception(exc)
+        else:
+            fut.set_result(result)
+
+    def abandon(self, key, fut) -> None:
+        self.finish(key, fut, exc=FlightAbandoned(self.name))
+
+    def wait(self, key, timeout=None):
+        """
+        (leader_future, None) 또는 (None, 공유 결과).
+        진행 중인 같은 호출이 있으면 그 결과를 기다리고, 없으면 대표 자리를 돌려줌.
+        timeout초(None이면 SINGLEFLIGHT_WAIT_SEC) 안에 결과가 없으면 등록되지 않은 Future를
+        돌려줌: 호출한 쪽이 직접 실행하고 finish 해도 다른 호출자에게는 영향 없음
+        """
+        timeout = SINGLEFLIGHT_WAIT_SEC if timeout is None else timeout
+        while True:
+            fut, leader = self.begin(key)
+            if leader:
+                return fut, None
+            try:
+                # 결과는 여러 호출자가 나눠 쓰므로 각자 사본을 가짐
+                return None, copy.deepcopy(fut.result(timeout=timeout or None))
+            except FlightAbandoned:
+                continue
+            except FutureTimeout:
+                with self._lock:
+                    self._stats["wait_timeouts"] += 1
+                return Future(), None
+
+    def do(self, key, fn, *args, **kwargs):
+        fut, shared = self.wait(key)
+        if fut is None:
+            return shared
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self.finish(key, fut, exc=e)
+            raise
+        except BaseException:
+            self.abandon(key, fut)
+            raise
+        self.finish(key, fut, result)
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self._stats)
+            out["in_flight"] = len(self._calls)
+            return out
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def get_flight(name) -> SingleFlight:
+    with _flights_lock:
+        flight = _flights.get(name)
+        if flight is None:
+            flight = _flights[name] = SingleFlight(name)
+        return flight
+
+
+def flight_stats() -> dict:
+    with _flights_lock:
+        flights = dict(_flights)
+    return {name: flight.stats() for name, flight in flights.items()}
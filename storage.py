@@ -0,0 +1,888 @@
+# storage.py
+# -*- coding: utf-8 -*-
+import os
+import csv
+import codecs
+import hashlib
+import sqlite3
+import argparse
+import threading
+import pandas as pd
+
+from daily_index import UserDailyIndex
+from tracing import span, traced
+
+try:
+    import chardet
+except ImportError:
+    chardet = None
+
+CSV_ENCODING = "utf-8-sig"
+
+USER_CSV = "users.csv"
+DAILY_CSV = "daily_info.csv"
+# 추천 결과만 한 줄씩 덧붙이는 곁다리 파일 (daily_info.csv 전체를 다시 쓰지 않기 위해)
+RECOMMENDATION_CSV = "recommendations.csv"
+# 곁다리 파일이 이 크기를 넘으면 daily_info.csv에 합치고 비움
+RECOMMENDATION_COMPACT_BYTES = int(os.getenv("RECOMMENDATION_COMPACT_BYTES", str(1024 * 1024)))
+WORKOUT_CSV = "workout.csv"
+DEFAULT_DB = "moodfit.db"
+
+# 같은 프로세스(여러 Streamlit 세션)에서 동시에 쓰는 경우를 막기 위한 락
+_WRITE_LOCK = threading.RLock()
+
+# read_csv_robust 결과 캐시: 절대경로 → (mtime_ns, size, DataFrame)
+_DF_CACHE = {}
+_CACHE_LOCK = threading.Lock()
+
+
+# =========================
+# 1) 인코딩/헤더 확인 (파일 앞부분만 읽음)
+# =========================
+def detect_encoding(head: bytes) -> str:
+    """
+    바이트 앞부분만 보고 인코딩을 추정
+    (BOM 있으면 utf-8-sig, utf-8로 읽히면 utf-8, 아니면 chardet 결과, 최종 기본값 cp949)
+    """
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    try:
+        head.decode("utf-8")
+        return "utf-8"
+    except UnicodeDecodeError as e:
+        # 샘플 끝에서 멀티바이트 문자가 잘린 경우는 utf-8로 인정
+        if e.reason == "unexpected end of data":
+            return "utf-8"
+
+    if chardet is not None:
+        guess = chardet.detect(head) or {}
+        enc = str(guess.get("encoding") or "").lower()
+        # EUC-KR로 잡혀도 확장 문자까지 읽을 수 있게 cp949로 읽음
+        if enc in ("euc-kr", "cp949", "uhc", "johab"):
+            return "cp949"
+        if enc and (guess.get("confidence") or 0) >= 0.5:
+            try:
+                return codecs.lookup(enc).name
+            except LookupError:
+                pass
+    return "cp949"
+
+
+# 파일별로 한 번 추정한 인코딩 기억 (직접 전체를 다시 쓸 때만 forget)
+_ENCODINGS = {}
+
+
+def sniff_encoding(path: str, sample_size: int = 4096) -> str:
+    key = os.path.abspath(path)
+    enc = _ENCODINGS.get(key)
+    if enc is None:
+        with open(path, "rb") as f:
+            enc = detect_encoding(f.read(sample_size))
+        _ENCODINGS[key] = enc
+    return enc
+
+
+def forget(path: str) -> None:
+    key = os.path.abspath(path)
+    _ENCODINGS.pop(key, None)
+    with _CACHE_LOCK:
+        _DF_CACHE.pop(key, None)
+
+
+def read_header(path: str, encoding: str = None) -> list:
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return []
+    enc = encoding or sniff_encoding(path)
+    with open(path, "r", encoding=enc, newline="") as f:
+        return next(csv.reader(f), [])
+
+
+def _line_terminator(path: str) -> str:
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(0, size - 2))
+        tail = f.read()
+    return "\r\n" if tail.endswith(b"\r\n") else "\n"
+
+
+def _ends_with_newline(path: str) -> bool:
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() == 0:
+            return True
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def _to_cell(v) -> str:
+    if v is None:
+        return ""
+    if not isinstance(v, (list, tuple, dict)) and pd.isna(v):
+        return ""
+    return str(v)
+
+
+# =========================
+# 2) 스키마(헤더) 확장 - 새 컬럼이 생겼을 때만 한 번 실행
+# =========================
+def ensure_columns(path: str, columns) -> list:
+    """
+    헤더에 없는 컬럼이 있으면 파일 끝에 빈 컬럼으로 추가하고 새 헤더를 반환.
+    전체 파일을 다시 쓰는 건 스키마가 바뀌는 이때뿐이고, 평소에는 헤더만 읽음.
+    """
+    with _WRITE_LOCK:
+        enc = sniff_encoding(path)
+        header = read_header(path, enc)
+        missing = [c for c in columns if c not in header]
+        if not missing:
+            return header
+
+        new_header = header + missing
+        lineterminator = _line_terminator(path)
+        tmp_path = path + ".tmp"
+
+        with open(path, "r", encoding=enc, newline="") as src, \
+                open(tmp_path, "w", encoding=CSV_ENCODING, newline="") as dst:
+            reader = csv.reader(src)
+            writer = csv.writer(dst, lineterminator=lineterminator)
+            next(reader, None)
+            writer.writerow(new_header)
+            for row in reader:
+                writer.writerow(row + [""] * (len(new_header) - len(row)))
+
+        os.replace(tmp_path, path)
+        forget(path)
+        return new_header
+
+
+# =========================
+# 3) 한 줄 이어 쓰기 (기존 기록 양과 무관하게 O(1))
+# =========================
+def append_row(path: str, row: dict) -> None:
+    """
+    row(dict)를 CSV 끝에 한 줄 추가.
+    파일이 없으면 row의 키 순서로 헤더를 만들고, 헤더에 없는 키는 ensure_columns로 먼저 확장.
+    """
+    with _WRITE_LOCK:
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            header = list(row.keys())
+            with open(path, "w", encoding=CSV_ENCODING, newline="") as f:
+                writer = csv.writer(f, lineterminator="\n")
+                writer.writerow(header)
+                writer.writerow([_to_cell(row.get(c)) for c in header])
+            forget(path)
+            return
+
+        header = ensure_columns(path, list(row.keys()))
+        enc = sniff_encoding(path)
+        if enc == "utf-8-sig":
+            enc = "utf-8"  # BOM은 파일 맨 앞에만
+
+        lineterminator = _line_terminator(path)
+        needs_newline = not _ends_with_newline(path)
+
+        with open(path, "a", encoding=enc, newline="") as f:
+            if needs_newline:
+                f.write(lineterminator)
+            writer = csv.writer(f, lineterminator=lineterminator)
+            writer.writerow([_to_cell(row.get(c)) for c in header])
+
+
+# =========================
+# 4) 전체 다시 쓰기 (임시파일 → 교체, 쓰기 락 공유)
+# =========================
+def write_csv(df: pd.DataFrame, path: str) -> None:
+    with _WRITE_LOCK:
+        tmp_path = path + ".tmp"
+        df.to_csv(tmp_path, index=False, encoding=CSV_ENCODING)
+        os.replace(tmp_path, path)
+        forget(path)
+
+
+def read_csv_robust(path: str) -> pd.DataFrame:
+    """
+    인코딩은 파일 앞부분으로 한 번만 추정하고,
+    (경로, mtime, 크기)가 그대로면 이전에 파싱한 DataFrame을 재사용.
+    호출한 쪽에서 컬럼을 바꿔도 캐시가 오염되지 않게 복사본을 반환.
+    """
+    key = os.path.abspath(path)
+    st_ = os.stat(path)
+    sig = (st_.st_mtime_ns, st_.st_size)
+    with span("read_csv", file=os.path.basename(path), bytes=sig[1]) as sp:
+        with _CACHE_LOCK:
+            hit = _DF_CACHE.get(key)
+        sp.set(cache_hit=hit is not None and hit[0] == sig)
+        if hit is not None and hit[0] == sig:
+            return hit[1].copy()
+
+        enc = sniff_encoding(path)
+        try:
+            df = pd.read_csv(path, encoding=enc)
+        except UnicodeDecodeError:
+            # 추정이 틀렸으면(앞부분만 ASCII 등) 예전 방식대로 차례로 시도
+            _ENCODINGS.pop(key, None)
+            df, enc = None, None
+            last_err = None
+            for candidate in ["utf-8-sig", "utf-8", "cp949"]:
+                try:
+                    df = pd.read_csv(path, encoding=candidate)
+                    enc = candidate
+                    break
+                except UnicodeDecodeError as e:
+                    last_err = e
+            if df is None:
+                raise last_err
+            _ENCODINGS[key] = enc
+
+        with _CACHE_LOCK:
+            _DF_CACHE[key] = (sig, df)
+        return df.copy()
+
+
+def normalize_date(d) -> str:
+    """
+    날짜 값을 'YYYY-MM-DD' 문자열로 통일 (파싱 실패 시 빈 문자열)
+    """
+    dt = pd.to_datetime(d, errors="coerce")
+    if pd.isna(dt):
+        return ""
+    return dt.date().isoformat()
+
+
+# =========================
+# 5) 저장소 인터페이스
+#   - 페이지는 필요한 행만 요청하고, 실제 저장 방식(CSV/SQLite)은 몰라도 됨
+# =========================
+class Storage:
+    def is_ready(self) -> bool:
+        raise NotImplementedError
+
+    def list_user_names(self) -> list:
+        raise NotImplementedError
+
+    def get_user(self, name):
+        """이름으로 사용자 1명(pd.Series) 조회, 없으면 None"""
+        raise NotImplementedError
+
+    def add_user(self, row: dict) -> None:
+        raise NotImplementedError
+
+    def get_user_daily(self, name) -> pd.DataFrame:
+        """해당 사용자의 daily 기록만 반환"""
+        raise NotImplementedError
+
+    def append_daily(self, row: dict) -> None:
+        raise NotImplementedError
+
+    @traced("get_daily_index")
+    def get_daily_index(self, name) -> UserDailyIndex:
+        """해당 사용자의 날짜 색인 (기본: 매번 get_user_daily로 만듦)"""
+        return UserDailyIndex(self.get_user_daily(name))
+
+    def load_workouts_raw(self):
+        """운동 카탈로그 원본 DataFrame, 없으면 None"""
+        raise NotImplementedError
+
+    def workouts_version(self):
+        """운동 카탈로그가 바뀌면 달라지는 값 (캐시 키), 없으면 None"""
+        raise NotImplementedError
+
+    def workouts_content_hash(self):
+        """운동 카탈로그 내용의 해시 (컴파일 파일 키), 없으면 None"""
+        wdf = self.load_workouts_raw()
+        if wdf is None:
+            return None
+        h = hashlib.sha256("\x1f".join(map(str, wdf.columns)).encode("utf-8"))
+        h.update(pd.util.hash_pandas_object(wdf, index=False).to_numpy().tobytes())
+        return h.hexdigest()
+
+    @traced("save_recommendations")
+    def save_recommendations(self, user_name, pick_date, top3) -> bool:
+        """(이름, 날짜) 행에 추천운동/추천이유 저장, 대상 행이 없으면 False"""
+        return self.save_recommendations_bulk([(user_name, pick_date, top3)]) > 0
+
+    def save_recommendations_bulk(self, results) -> int:
+        """
+        results: [(이름, 날짜, top3), ...]를 한 번에 저장 (CSV는 파일 1회 재작성).
+        실제로 갱신한 행 수 반환
+        """
+        raise NotImplementedError
+
+    def pending_recommendations(self, pick_date=None) -> list:
+        """추천운동1~3 중 비어 있는 칸이 있는 (이름, 'YYYY-MM-DD') 목록 (pick_date로 거를 수 있음)"""
+        raise NotImplementedError
+
+    def rewrite_daily(self, transform, columns) -> int:
+        """
+        daily 전체를 transform(df) 결과로 한 번에 갱신 (컬럼 추가 마이그레이션용).
+        columns: transform이 채우는 컬럼 목록. 처리한 행 수 반환
+        """
+        raise NotImplementedError
+
+
+RECOMMENDATION_COLS = [f"{c}{k}" for k in range(1, 4) for c in ("추천운동", "추천이유")]
+
+
+def _recommendation_values(top3) -> dict:
+    values = {}
+    for item in top3:
+        rk = int(item["rank"])
+        if 1 <= rk <= 3:
+            values[f"추천운동{rk}"] = item["운동명"]
+            values[f"추천이유{rk}"] = item["이유"]
+    return values
+
+
+def _is_blank(series: pd.Series) -> pd.Series:
+    return series.isna() | (series.astype(str).str.strip() == "")
+
+
+def _file_sig(path: str):
+    try:
+        st_ = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st_.st_mtime_ns, st_.st_size)
+
+
+def _index_columns(indexes: dict) -> list:
+    for idx in indexes.values():
+        return [c for c in idx.columns if c != "_date"]
+    return ["이름", "날짜"]
+
+
+def _daily_keys(df: pd.DataFrame) -> pd.Series:
+    return df["이름"].astype(str) + "|" + df["날짜"].apply(normalize_date)
+
+
+def apply_recommendations(df: pd.DataFrame, recs: pd.DataFrame) -> pd.DataFrame:
+    """
+    곁다리 추천 기록(recs: 이름, 날짜, 추천운동/이유...)을 daily 행에 덮어씀.
+    같은 (이름, 날짜)는 나중 기록이 우선이고, daily에서는 그 키의 첫 행에만 적용
+    """
+    for col in RECOMMENDATION_COLS:
+        if col not in df.columns:
+            df[col] = ""
+        df[col] = df[col].astype(object)
+    if recs is None or len(recs) == 0 or len(df) == 0:
+        return df
+
+    keys = _daily_keys(df)
+    first = ~keys.duplicated()
+    rec_keys = recs["이름"].astype(str) + "|" + recs["날짜"].apply(normalize_date)
+    latest = recs.assign(_key=rec_keys).drop_duplicates("_key", keep="last").set_index("_key")
+    for col in RECOMMENDATION_COLS:
+        if col not in latest.columns:
+            continue
+        vals = keys.map(latest[col])
+        mask = first & vals.notna()
+        df.loc[mask, col] = vals[mask]
+    return df
+
+
+class CsvStorage(Storage):
+    """
+    추천 저장은 recommendations.csv에 한 줄 덧붙이는 것으로 끝내고(O(1)),
+    읽을 때 daily 행에 겹쳐 보여줌. 일괄 저장/compact() 때만 daily_info.csv에 합침
+    """
+    def __init__(self, user_csv=USER_CSV, daily_csv=DAILY_CSV, workout_csv=WORKOUT_CSV,
+                 rec_csv=RECOMMENDATION_CSV):
+        self.user_csv = user_csv
+        self.daily_csv = daily_csv
+        self.workout_csv = workout_csv
+        self.rec_csv = rec_csv
+        self._keys = None  # (daily 파일 (mtime, size), {(이름|날짜)})
+        self._keys_lock = threading.Lock()
+        # (daily 파일 sig, 곁다리 파일 sig, {이름: UserDailyIndex}) - 자기 쓰기는 제자리 갱신
+        self._indexes = None
+        self._indexes_lock = threading.Lock()
+
+    def is_ready(self):
+        return os.path.exists(self.user_csv) and os.path.exists(self.daily_csv)
+
+    def _users(self):
+        if not os.path.exists(self.user_csv):
+            return pd.DataFrame(columns=["이름"])
+        return read_csv_robust(self.user_csv)
+
+    def _recommendations(self):
+        if not os.path.exists(self.rec_csv) or os.path.getsize(self.rec_csv) == 0:
+            return None
+        return read_csv_robust(self.rec_csv)
+
+    def _daily_key_set(self) -> set:
+        """daily_info.csv가 바뀔 때만 다시 만드는 (이름|날짜) 집합"""
+        st_ = os.stat(self.daily_csv)
+        sig = (st_.st_mtime_ns, st_.st_size)
+        with self._keys_lock:
+            hit = self._keys
+        if hit is not None and hit[0] == sig:
+            return hit[1]
+        keys = set(_daily_keys(read_csv_robust(self.daily_csv)))
+        with self._keys_lock:
+            self._keys = (sig, keys)
+        return keys
+
+    def list_user_names(self):
+        return self._users()["이름"].astype(str).tolist()
+
+    def get_user(self, name):
+        users_df = self._users()
+        rows = users_df[users_df["이름"].astype(str) == str(name)]
+        return rows.iloc[0] if len(rows) > 0 else None
+
+    def add_user(self, row):
+        append_row(self.user_csv, row)
+
+    def get_user_daily(self, name):
+        daily_df = read_csv_robust(self.daily_csv)
+        user_df = daily_df[daily_df["이름"].astype(str) == str(name)].reset_index(drop=True)
+        recs = self._recommendations()
+        if recs is not None:
+            recs = recs[recs["이름"].astype(str) == str(name)]
+            user_df = apply_recommendations(user_df, recs)
+        return user_df
+
+    def append_daily(self, row):
+        with _WRITE_LOCK:
+            before = _file_sig(self.daily_csv)
+            append_row(self.daily_csv, row)
+            self._after_write(before, _file_sig(self.rec_csv), str(row.get("이름")),
+                              lambda idx: idx.add(row),
+                              daily_key=f"{row.get('이름')}|{normalize_date(row.get('날짜'))}")
+
+    def _daily_indexes(self) -> dict:
+        daily_sig, rec_sig = _file_sig(self.daily_csv), _file_sig(self.rec_csv)
+        with self._indexes_lock:
+            state = self._indexes
+        if state is not None and state[0] == daily_sig and state[1] == rec_sig:
+            return state[2]
+
+        # 파일이 바깥에서 바뀌었으면 한 번 훑어서 전체 사용자 색인을 다시 만듦
+        df = apply_recommendations(read_csv_robust(self.daily_csv), self._recommendations())
+        indexes = {
+            name: UserDailyIndex(g.reset_index(drop=True))
+            for name, g in df.groupby(df["이름"].astype(str), sort=False)
+        }
+        with self._indexes_lock:
+            self._indexes = (daily_sig, rec_sig, indexes)
+        return indexes
+
+    def _after_write(self, daily_before, rec_before, name, patch, daily_key=None):
+        """
+        쓰기 직전 sig로 만든 색인이면 그 사용자 색인만 patch하고 sig를 새 값으로 옮김.
+        daily에 행을 붙였으면(daily_key) (이름|날짜) 집합도 같은 방식으로 키만 추가.
+        (다른 곳에서 이미 바뀌었으면 그대로 두고 다음 조회 때 다시 만듦)
+        """
+        if daily_key is not None:
+            with self._keys_lock:
+                if self._keys is not None and self._keys[0] == daily_before:
+                    self._keys[1].add(daily_key)
+                    self._keys = (_file_sig(self.daily_csv), self._keys[1])
+        with self._indexes_lock:
+            state = self._indexes
+            if state is None or state[0] != daily_before or state[1] != rec_before:
+                return
+            indexes = state[2]
+            idx = indexes.get(name)
+            if idx is None:
+                idx = indexes[name] = UserDailyIndex(pd.DataFrame(columns=_index_columns(indexes)))
+            patch(idx)
+            self._indexes = (_file_sig(self.daily_csv), _file_sig(self.rec_csv), indexes)
+
+    @traced("get_daily_index")
+    def get_daily_index(self, name):
+        if not os.path.exists(self.daily_csv):
+            return UserDailyIndex(pd.DataFrame(columns=["이름", "날짜"]))
+        idx = self._daily_indexes().get(str(name))
+        if idx is None:
+            return UserDailyIndex(pd.DataFrame(columns=["이름", "날짜"]))
+        return idx
+
+    def load_workouts_raw(self):
+        if not os.path.exists(self.workout_csv):
+            return None
+        return read_csv_robust(self.workout_csv)
+
+    def workouts_version(self):
+        if not os.path.exists(self.workout_csv):
+            return None
+        st_ = os.stat(self.workout_csv)
+        return (st_.st_mtime_ns, st_.st_size)
+
+    def workouts_content_hash(self):
+        # 파싱 없이 파일 바이트만 해시
+        if not os.path.exists(self.workout_csv):
+            return None
+        h = hashlib.sha256()
+        with open(self.workout_csv, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
+    @traced("save_recommendations")
+    def save_recommendations(self, user_name, pick_date, top3):
+        day = normalize_date(pick_date)
+        if f"{user_name}|{day}" not in self._daily_key_set():
+            return False
+
+        values = _recommendation_values(top3)
+        row = {"이름": str(user_name), "날짜": day}
+        row.update({c: "" for c in RECOMMENDATION_COLS})
+        row.update(values)
+        with _WRITE_LOCK:
+            daily_before, rec_before = _file_sig(self.daily_csv), _file_sig(self.rec_csv)
+            append_row(self.rec_csv, row)
+            self._after_write(daily_before, rec_before, str(user_name),
+                              lambda idx: idx.update(day, values))
+            if os.path.getsize(self.rec_csv) > RECOMMENDATION_COMPACT_BYTES:
+                self.compact()
+        return True
+
+    def save_recommendations_bulk(self, results):
+        results = list(results)
+        if not results:
+            return 0
+
+        with _WRITE_LOCK:
+            df = apply_recommendations(read_csv_robust(self.daily_csv), self._recommendations())
+
+            # (이름, 날짜) → 첫 행 위치
+            first_pos = {}
+            for pos, key in enumerate(_daily_keys(df)):
+                first_pos.setdefault(key, pos)
+
+            updated = 0
+            for user_name, pick_date, top3 in results:
+                pos = first_pos.get(f"{user_name}|{normalize_date(pick_date)}")
+                if pos is None:
+                    continue
+                values = _recommendation_values(top3)
+                if values:
+                    df.loc[df.index[pos], list(values)] = list(values.values())
+                updated += 1
+
+            if updated:
+                self._replace_daily(df)
+            return updated
+
+    def _replace_daily(self, df):
+        # daily_info.csv에 곁다리 내용까지 합쳐 썼으므로 곁다리는 비움
+        write_csv(df, self.daily_csv)
+        if os.path.exists(self.rec_csv):
+            os.remove(self.rec_csv)
+            forget(self.rec_csv)
+
+    def compact(self) -> int:
+        """recommendations.csv를 daily_info.csv에 합치고 비움. 합친 기록 수 반환"""
+        with _WRITE_LOCK:
+            recs = self._recommendations()
+            if recs is None:
+                return 0
+            df = apply_recommendations(read_csv_robust(self.daily_csv), recs)
+            self._replace_daily(df)
+            return len(recs)
+
+    def pending_recommendations(self, pick_date=None):
+        if not os.path.exists(self.daily_csv):
+            return []
+        df = apply_recommendations(read_csv_robust(self.daily_csv), self._recommendations())
+        dates = df["날짜"].apply(normalize_date)
+
+        blank = pd.Series(False, index=df.index)
+        for k in range(1, 4):
+            blank |= _is_blank(df[f"추천운동{k}"])
+        mask = blank & (dates != "")
+        if pick_date is not None:
+            mask &= dates == normalize_date(pick_date)
+
+        pairs = zip(df.loc[mask, "이름"].astype(str), dates[mask])
+        return list(dict.fromkeys(pairs))
+
+    def rewrite_daily(self, transform, columns):
+        if not os.path.exists(self.daily_csv):
+            return 0
+        with _WRITE_LOCK:
+            df = apply_recommendations(read_csv_robust(self.daily_csv), self._recommendations())
+            df = transform(df)
+            self._replace_daily(df)
+            return len(df)
+
+
+# =========================
+# 6) SQLite 저장소
+#   - users("이름") 유니크 인덱스, daily("이름", "날짜") 인덱스
+#   - 날짜는 'YYYY-MM-DD' 문자열로 저장 (문자열 비교 = 날짜 비교)
+# =========================
+def _q(name: str) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _to_sql_value(v):
+    if v is None:
+        return None
+    if not isinstance(v, (list, tuple, dict)) and pd.isna(v):
+        return None
+    if hasattr(v, "item"):  # numpy 스칼라
+        return v.item()
+    if isinstance(v, (int, float, str, bytes)):
+        return v
+    return str(v)
+
+
+class SqliteStorage(Storage):
+    def __init__(self, db_path=DEFAULT_DB):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._columns = {}
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _table_columns(self, table) -> list:
+        cols = self._columns.get(table)
+        if cols is None:
+            cur = self._conn().execute(f"PRAGMA table_info({_q(table)})")
+            cols = [r[1] for r in cur.fetchall()]
+            if cols:
+                self._columns[table] = cols
+        return cols
+
+    def _ensure_table(self, table, columns) -> None:
+        conn = self._conn()
+        existing = self._table_columns(table)
+        if not existing:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {_q(table)} ({', '.join(_q(c) for c in columns)})"
+            )
+            create_indexes(conn)
+            self._columns.pop(table, None)
+            return
+
+        missing = [c for c in columns if c not in existing]
+        for c in missing:
+            conn.execute(f"ALTER TABLE {_q(table)} ADD COLUMN {_q(c)}")
+        if missing:
+            self._columns.pop(table, None)
+
+    def _query_df(self, sql, params=()) -> pd.DataFrame:
+        with span("sqlite_query") as sp:
+            df = pd.read_sql_query(sql, self._conn(), params=params)
+            sp.set(rows=len(df))
+            return df
+
+    def _insert(self, table, row) -> None:
+        with _WRITE_LOCK:
+            self._ensure_table(table, list(row.keys()))
+            cols = list(row.keys())
+            sql = (
+                f"INSERT INTO {_q(table)} ({', '.join(_q(c) for c in cols)}) "
+                f"VALUES ({', '.join('?' for _ in cols)})"
+            )
+            conn = self._conn()
+            conn.execute(sql, [_to_sql_value(row[c]) for c in cols])
+            conn.commit()
+
+    def is_ready(self):
+        return bool(self._table_columns("users")) and bool(self._table_columns("daily"))
+
+    def list_user_names(self):
+        if not self._table_columns("users"):
+            return []
+        cur = self._conn().execute('SELECT "이름" FROM users ORDER BY rowid')
+        return [str(r[0]) for r in cur.fetchall()]
+
+    def get_user(self, name):
+        if not self._table_columns("users"):
+            return None
+        df = self._query_df('SELECT * FROM users WHERE "이름" = ? LIMIT 1', (str(name),))
+        return df.iloc[0] if len(df) > 0 else None
+
+    def add_user(self, row):
+        self._insert("users", row)
+
+    def get_user_daily(self, name):
+        if not self._table_columns("daily"):
+            return pd.DataFrame()
+        return self._query_df(
+            'SELECT * FROM daily WHERE "이름" = ? ORDER BY "날짜", rowid', (str(name),)
+        )
+
+    def append_daily(self, row):
+        row = dict(row)
+        row["날짜"] = normalize_date(row.get("날짜"))
+        self._insert("daily", row)
+
+    def load_workouts_raw(self):
+        if not self._table_columns("workouts"):
+            return None
+        return self._query_df("SELECT * FROM workouts ORDER BY rowid")
+
+    def workouts_version(self):
+        if not self._table_columns("workouts"):
+            return None
+        conn = self._conn()
+        # import 시 테이블을 통째로 교체하므로 schema_version도 함께 봄
+        schema_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+        count, max_rowid = conn.execute("SELECT count(*), max(rowid) FROM workouts").fetchone()
+        return (schema_version, count, max_rowid)
+
+    def save_recommendations_bulk(self, results):
+        results = list(results)
+        if not results or not self._table_columns("daily"):
+            return 0
+
+        updated = 0
+        with _WRITE_LOCK:
+            conn = self._conn()
+            self._ensure_table("daily", RECOMMENDATION_COLS)
+            # 한 트랜잭션으로 묶어서 커밋 1회
+            with conn:
+                for user_name, pick_date, top3 in results:
+                    hit = conn.execute(
+                        'SELECT rowid FROM daily WHERE "이름" = ? AND "날짜" = ? ORDER BY rowid LIMIT 1',
+                        (str(user_name), normalize_date(pick_date))
+                    ).fetchone()
+                    if hit is None:
+                        continue
+                    values = _recommendation_values(top3)
+                    if values:
+                        sets = ", ".join(f"{_q(c)} = ?" for c in values)
+                        conn.execute(
+                            f"UPDATE daily SET {sets} WHERE rowid = ?",
+                            [_to_sql_value(v) for v in values.values()] + [hit[0]]
+                        )
+                    updated += 1
+        return updated
+
+    def pending_recommendations(self, pick_date=None):
+        if not self._table_columns("daily"):
+            return []
+        existing = self._table_columns("daily")
+        conds = []
+        for k in range(1, 4):
+            col = f"추천운동{k}"
+            if col not in existing:
+                conds = []  # 컬럼 자체가 없으면 모든 행이 대상
+                break
+            conds.append(f"{_q(col)} IS NULL OR trim({_q(col)}) = ''")
+        where = "(" + " OR ".join(f"({c})" for c in conds) + ")" if conds else "1"
+        where += ' AND "날짜" != \'\''
+        params = []
+        if pick_date is not None:
+            where += ' AND "날짜" = ?'
+            params.append(normalize_date(pick_date))
+        cur = self._conn().execute(
+            f'SELECT DISTINCT "이름", "날짜" FROM daily WHERE {where} ORDER BY "날짜", "이름"', params
+        )
+        return [(str(r[0]), r[1]) for r in cur.fetchall()]
+
+    def rewrite_daily(self, transform, columns):
+        if not self._table_columns("daily"):
+            return 0
+        columns = list(columns)
+        with _WRITE_LOCK:
+            conn = self._conn()
+            df = self._query_df("SELECT rowid AS _rowid, * FROM daily")
+            df = transform(df)
+            self._ensure_table("daily", columns)
+            sets = ", ".join(f"{_q(c)} = ?" for c in columns)
+            rows = (
+                [_to_sql_value(v) for v in values[1:]] + [int(values[0])]
+                for values in df[["_rowid"] + columns].itertuples(index=False, name=None)
+            )
+            with conn:
+                conn.executemany(f"UPDATE daily SET {sets} WHERE rowid = ?", rows)
+            return len(df)
+
+
+def create_indexes(conn) -> None:
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    if "users" in tables:
+        conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_users_name ON users("이름")')
+    if "daily" in tables:
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_daily_user_date ON daily("이름", "날짜")')
+
+
+# =========================
+# 7) CSV → SQLite 1회 이관
+# =========================
+def import_csvs(db_path=DEFAULT_DB, user_csv=USER_CSV, daily_csv=DAILY_CSV,
+                workout_csv=WORKOUT_CSV, rec_csv=RECOMMENDATION_CSV) -> dict:
+    """
+    기존 CSV 3종(+ 추천 곁다리 파일)을 SQLite로 옮김 (기존 테이블은 교체). 테이블별 행 수 반환
+    """
+    conn = sqlite3.connect(db_path)
+    counts = {}
+    try:
+        if os.path.exists(user_csv):
+            users_df = read_csv_robust(user_csv)
+            users_df["이름"] = users_df["이름"].astype(str)
+            users_df = users_df.drop_duplicates(subset=["이름"], keep="first")
+            users_df.to_sql("users", conn, if_exists="replace", index=False)
+            counts["users"] = len(users_df)
+
+        if os.path.exists(daily_csv):
+            daily_df = read_csv_robust(daily_csv)
+            if os.path.exists(rec_csv) and os.path.getsize(rec_csv) > 0:
+                daily_df = apply_recommendations(daily_df, read_csv_robust(rec_csv))
+            daily_df["이름"] = daily_df["이름"].astype(str)
+            daily_df["날짜"] = daily_df["날짜"].apply(normalize_date)
+            daily_df.to_sql("daily", conn, if_exists="replace", index=False)
+            counts["daily"] = len(daily_df)
+
+        if os.path.exists(workout_csv):
+            workouts_df = read_csv_robust(workout_csv)
+            workouts_df.to_sql("workouts", conn, if_exists="replace", index=False)
+            counts["workouts"] = len(workouts_df)
+
+        create_indexes(conn)
+        conn.commit()
+    finally:
+        conn.close()
+    return counts
+
+
+# =========================
+# 8) 저장소 선택 (MOODFIT_STORAGE=csv|sqlite, MOODFIT_DB=경로)
+# =========================
+_storage = None
+
+
+def get_storage() -> Storage:
+    global _storage
+    if _storage is None:
+        backend = os.getenv("MOODFIT_STORAGE", "csv").strip().lower()
+        if backend == "sqlite":
+            _storage = SqliteStorage(os.getenv("MOODFIT_DB", DEFAULT_DB))
+        else:
+            _storage = CsvStorage()
+    return _storage
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="MoodFit 저장소 도구")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_import = sub.add_parser("import", help="CSV 3종을 SQLite로 1회 이관")
+    p_import.add_argument("--db", default=DEFAULT_DB)
+    p_import.add_argument("--users", default=USER_CSV)
+    p_import.add_argument("--daily", default=DAILY_CSV)
+    p_import.add_argument("--workouts", default=WORKOUT_CSV)
+    p_import.add_argument("--recommendations", default=RECOMMENDATION_CSV)
+    sub.add_parser("compact", help="recommendations.csv를 daily_info.csv에 합침")
+    args = parser.parse_args()
+
+    if args.cmd == "compact":
+        print(f"{CsvStorage().compact()} rows merged")
+
+    if args.cmd == "import":
+        result = import_csvs(args.db, args.users, args.daily, args.workouts, args.recommendations)
+        for table, n in result.items():
+            print(f"{table}: {n} rows")
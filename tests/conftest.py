@@ -0,0 +1,9 @@
+# tests/conftest.py
+# -*- coding: utf-8 -*-
+# 저장소 루트의 모듈(condition, storage ...)을 바로 import할 수 있게 경로 추가
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
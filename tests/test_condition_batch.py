@@ -0,0 +1,162 @@
+# tests/test_condition_batch.py
+# -*- coding: utf-8 -*-
+# condition.py 일괄(DataFrame) 함수가 행 단위 함수를 한 행씩 부른 결과와 같은지 확인
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import ROOT
+from condition import (
+    get_arousal_from_daily, get_emotion_from_daily, infer_target_intensity,
+    get_arousal_level, compute_avg_arousal,
+    get_arousal_batch, get_emotion_batch, infer_target_intensity_batch, align_users,
+    get_arousal_level_batch, compute_avg_arousal_batch,
+)
+from storage import read_csv_robust
+
+
+# =========================
+# 0) 행 단위 기준값 / 비교
+# =========================
+def _user_row(users_df, name):
+    """storage.get_user(이름)와 같은 행. 없는 사용자는 align_users처럼 NaN 행"""
+    hit = users_df[users_df["이름"].astype(str) == str(name)]
+    if len(hit):
+        return hit.iloc[0]
+    return pd.Series(np.nan, index=users_df.columns, dtype=object)
+
+
+def _same_float(a, b):
+    return (np.isnan(a) and np.isnan(b)) or a == b
+
+
+def assert_parity(daily_df, users_df):
+    arousal = get_arousal_batch(daily_df)
+    emotion = get_emotion_batch(daily_df)
+    target, target_arousal = infer_target_intensity_batch(daily_df, users_df)
+    aligned = align_users(daily_df, users_df)
+    assert len(arousal) == len(emotion) == len(target) == len(aligned) == len(daily_df)
+
+    for i in range(len(daily_df)):
+        row = daily_df.iloc[i]
+        user_row = _user_row(users_df, row["이름"])
+        exp_target, exp_arousal = infer_target_intensity(row, user_row)
+
+        assert _same_float(get_arousal_from_daily(row), arousal[i]), (i, row.to_dict())
+        assert get_emotion_from_daily(row) == emotion[i], (i, row.to_dict())
+        assert exp_target == target[i], (i, row.to_dict(), user_row.to_dict())
+        assert _same_float(exp_arousal, target_arousal[i]), i
+        # align_users의 행은 행 단위 조회와 같은 값 (없는 사용자는 전부 NaN)
+        for col in users_df.columns:
+            a, b = user_row[col], aligned.iloc[i][col]
+            assert (pd.isna(a) and pd.isna(b)) or a == b, (i, col)
+
+
+# =========================
+# 1) 저장소에 있는 CSV
+# =========================
+@pytest.fixture(scope="module")
+def users_df():
+    return read_csv_robust(os.path.join(ROOT, "users.csv"))
+
+
+@pytest.fixture(scope="module")
+def daily_df():
+    return read_csv_robust(os.path.join(ROOT, "daily_info.csv"))
+
+
+def test_bundled_csv(daily_df, users_df):
+    assert_parity(daily_df, users_df)
+
+
+def test_bundled_csv_without_precomputed_columns(daily_df, users_df):
+    # 저장 시 계산 컬럼이 없는 예전 형식: 감정 문자열/기본값 경로
+    legacy = daily_df.drop(columns=["감정_평균각성점수", "감정_대표ID", "감정_리스트"], errors="ignore")
+    assert_parity(legacy, users_df)
+
+
+def test_bundled_users_missing(daily_df, users_df):
+    # users.csv에 없는 사용자만 남김
+    assert_parity(daily_df, users_df.iloc[0:0])
+    assert_parity(daily_df, users_df[users_df["이름"] != daily_df["이름"].iloc[0]])
+
+
+# =========================
+# 2) 만든 데이터 (NaN/None, 숫자 아닌 문자열, 컬럼 없음, 없는 사용자)
+# =========================
+USERS = pd.DataFrame({
+    "이름": ["가", "나", "다", "가"],
+    "활동량": ["높음", None, "낮음", "보통"],          # "가" 중복: 첫 행 사용
+    "부상 이력": ["없음", "있음", np.nan, "있음"],
+})
+
+ODD_AROUSAL = [4.5, "4.5", "높음", None, np.nan, "", 0, "1e400", True, 2.5]
+ODD_EMOTION = ["기쁨, 피로", None, np.nan, "", " ", "nan", "알수없음", "분노", "활력,집중", 3]
+ODD_EMOTION_ID = [0, 3, None, np.nan, "x", -1, 999, 1.0, "2", True]
+
+
+def _generated(seed, n=300):
+    rng = np.random.default_rng(seed)
+
+    def pick(values):
+        return [values[j] for j in rng.integers(0, len(values), n)]
+
+    return pd.DataFrame({
+        "이름": pick(["가", "나", "다", "라", None]),     # "라"/None은 users에 없음
+        "감정_평균각성점수": pick(ODD_AROUSAL),
+        "각성도": pick(ODD_AROUSAL),
+        "감정_대표ID": pick(ODD_EMOTION_ID),
+        "감정": pick(ODD_EMOTION),
+        "수면시간": pick([3, 4.9, 5, 8, None, np.nan, 0]),
+        "스트레스": pick(["높음", "보통", None, np.nan, ""]),
+        "운동가능시간(분)": pick([30, 60, 90, None, np.nan, 0]),
+        "운동목적": pick(["스트레스 해소", "체중 감량, 스트레스 해소", None, np.nan, ""]),
+    })
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_generated_frames(seed):
+    assert_parity(_generated(seed), USERS)
+
+
+@pytest.mark.parametrize("drop", [
+    ["감정_평균각성점수"],
+    ["감정_평균각성점수", "각성도"],
+    ["감정_대표ID"],
+    ["감정_대표ID", "감정"],
+    ["수면시간", "스트레스", "운동가능시간(분)", "운동목적"],
+])
+def test_generated_missing_columns(drop):
+    assert_parity(_generated(7).drop(columns=drop), USERS)
+
+
+def test_users_missing_columns():
+    assert_parity(_generated(8), USERS[["이름"]])
+
+
+def test_non_numeric_sleep_raises_in_both():
+    daily = pd.DataFrame({"이름": ["가"], "수면시간": ["많이"]})
+    with pytest.raises(ValueError):
+        infer_target_intensity(daily.iloc[0], _user_row(USERS, "가"))
+    with pytest.raises(ValueError):
+        infer_target_intensity_batch(daily, USERS)
+
+
+# =========================
+# 3) 각성도 레벨 / 평균 각성 점수
+# =========================
+def test_arousal_level_batch():
+    scores = [np.nan, -1, 0, 0.99, 1, 1.5, 2, 2.99, 3, 3.5, 4, 4.01, 10]
+    assert list(get_arousal_level_batch(scores)) == [get_arousal_level(s) for s in scores]
+
+
+def test_avg_arousal_batch():
+    lists = [["기쁨", "피로"], [], ["알수없음"], "기쁨, 피로", "", "분노,  ,집중", ["분노"] * 3]
+    expected = [
+        compute_avg_arousal([x.strip() for x in v.split(",") if x.strip()] if isinstance(v, str) else v)
+        for v in lists
+    ]
+    got = compute_avg_arousal_batch(lists)
+    assert all(_same_float(a, b) for a, b in zip(expected, got)), (expected, got)
@@ -0,0 +1,232 @@
+# tracing.py
+# -*- coding: utf-8 -*-
+"""
+가벼운 구간 추적 (어디서 시간이 드는지: CSV 읽기, 날씨, 후보 필터, LLM, 스포티파이, 저장 ...)
+
+    with span("get_weather", city=city) as sp:
+        ...
+        sp.set(bytes=len(body), cache_hit=False)
+
+    @traced("filter_candidates")
+    def filter_candidates(...): ...
+
+- 구간은 중첩되고(부모 구간 id), 끝날 때마다 TRACE_FILE(JSONL)에 한 줄씩 기록
+- 추적 중이 아닐 때 span()을 열면 그 구간이 새 추적의 뿌리가 됨 (HTTP 요청, 배치 한 건 등)
+- Streamlit 페이지는 rerun마다 start_trace()로 새 추적을 시작하고 render_sidebar()로 폭포도 표시
+- 다른 스레드 풀로 넘기는 작업은 bind(fn)로 감싸야 같은 추적/부모 구간에 붙음
+- MOODFIT_TRACE가 꺼져 있으면 span()은 공용 빈 객체, traced/bind는 함수를 그대로 돌려줌
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import itertools
+import threading
+import contextvars
+from functools import wraps
+
+TRACE_ENABLED = os.getenv("MOODFIT_TRACE", "").strip().lower() in ("1", "true", "yes")
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+
+_trace_var = contextvars.ContextVar("moodfit_trace", default=None)
+_span_var = contextvars.ContextVar("moodfit_span", default=None)
+_span_ids = itertools.count(1)
+
+_file = None
+_file_lock = threading.Lock()
+
+
+def _write(record) -> None:
+    global _file
+    line = json.dumps(record, ensure_ascii=False, default=str)
+    with _file_lock:
+        try:
+            if _file is None:
+                _file = open(TRACE_FILE, "a", encoding="utf-8", buffering=1)
+            _file.write(line + "\n")
+        except OSError as e:
+            print(f"trace: {TRACE_FILE} 기록 실패 ({e})", file=sys.stderr)
+
+
+# =========================
+# 1) 추적 / 구간
+# =========================
+class Trace:
+    def __init__(self, name, **attrs):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attrs = attrs
+        self.started = time.time()
+        self.t0 = time.perf_counter()
+        self.spans = []   # 끝난 구간 기록 (끝난 순서)
+        self._lock = threading.Lock()
+
+    def add(self, record) -> None:
+        with self._lock:
+            self.spans.append(record)
+        _write(record)
+
+    def records(self) -> list:
+        with self._lock:
+            return list(self.spans)
+
+
+class Span:
+    __slots__ = ("name", "attrs", "trace", "id", "parent", "start", "_tokens")
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        # 추적 중이 아니면 이 구간이 새 추적의 뿌리
+        trace = _trace_var.get() or Trace(self.name)
+        self.trace = trace
+        self.id = next(_span_ids)
+        self.parent = _span_var.get()
+        self._tokens = (_trace_var.set(trace), _span_var.set(self.id))
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        _span_var.reset(self._tokens[1])
+        _trace_var.reset(self._tokens[0])
+        record = {
+            "trace": self.trace.id,
+            "trace_name": self.trace.name,
+            "span": self.id,
+            "parent": self.parent,
+            "name": self.name,
+            "start_ms": round((self.start - self.trace.t0) * 1000, 3),
+            "dur_ms": round((end - self.start) * 1000, 3),
+            "thread": threading.current_thread().name,
+        }
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        record.update(self.attrs)
+        self.trace.add(record)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attrs) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name, **attrs):
+    if not TRACE_ENABLED:
+        return _NOOP
+    return Span(name, attrs)
+
+
+def traced(name=None):
+    """함수 전체를 구간으로 기록하는 데코레이터 (꺼져 있으면 함수를 그대로 반환)"""
+    def deco(fn):
+        if not TRACE_ENABLED:
+            return fn
+        label = name or fn.__name__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with Span(label, {}):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def bind(fn):
+    """다른 스레드에서 돌릴 함수를 지금 추적/부모 구간에 묶음 (제출할 때마다 새로 감쌀 것)"""
+    if not TRACE_ENABLED:
+        return fn
+    ctx = contextvars.copy_context()
+
+    @wraps(fn)
+    def bound(*args, **kwargs):
+        return ctx.run(fn, *args, **kwargs)
+    return bound
+
+
+def start_trace(name, **attrs):
+    """현재 컨텍스트에서 새 추적 시작 (Streamlit rerun 맨 앞). 꺼져 있으면 None"""
+    if not TRACE_ENABLED:
+        return None
+    trace = Trace(name, **attrs)
+    _trace_var.set(trace)
+    _span_var.set(None)
+    return trace
+
+
+def current_trace():
+    return _trace_var.get()
+
+
+# =========================
+# 2) 폭포도 (현재 rerun)
+# =========================
+def waterfall_rows(trace) -> list:
+    """시작 순서대로 (구간, 시작ms, 소요ms, 속성). 구간 이름은 중첩 깊이만큼 들여씀"""
+    if trace is None:
+        return []
+    records = trace.records()
+    parents = {r["span"]: r["parent"] for r in records}
+
+    def depth(r):
+        d, p = 0, r["parent"]
+        while p is not None and d < 32:
+            d += 1
+            p = parents.get(p)
+        return d
+
+    skip = {"trace", "trace_name", "span", "parent", "name", "start_ms", "dur_ms", "thread"}
+    rows = []
+    for r in sorted(records, key=lambda r: r["start_ms"]):
+        extra = {k: v for k, v in r.items() if k not in skip}
+        rows.append({
+            "구간": "  " * depth(r) + r["name"],
+            "시작(ms)": round(r["start_ms"], 1),
+            "소요(ms)": round(r["dur_ms"], 1),
+            "속성": ", ".join(f"{k}={v}" for k, v in extra.items()),
+        })
+    return rows
+
+
+def render_sidebar(trace, width=24) -> None:
+    """Streamlit 사이드바에 현재 rerun의 폭포도 표시 (디버그용, 켜기 체크박스 포함)"""
+    if trace is None:
+        return
+    import streamlit as st
+
+    if not st.sidebar.checkbox("⏱ 구간 추적 보기", value=False):
+        return
+    rows = waterfall_rows(trace)
+    if not rows:
+        st.sidebar.caption("기록된 구간이 없습니다.")
+        return
+
+    total = max(r["시작(ms)"] + r["소요(ms)"] for r in rows) or 1.0
+    lines = []
+    for r in rows:
+        left = int(r["시작(ms)"] / total * width)
+        bar = max(1, int(round(r["소요(ms)"] / total * width)))
+        bar = min(bar, width - left) or 1
+        lines.append(f"{' ' * left}{'█' * bar}{' ' * (width - left - bar)} {r['소요(ms)']:>8.1f}ms {r['구간']}")
+    st.sidebar.markdown(f"**rerun {trace.id[:8]}** · 총 {total:.0f}ms")
+    st.sidebar.code("\n".join(lines))
+    with st.sidebar.expander("구간 속성"):
+        st.table([{k: r[k] for k in ("구간", "소요(ms)", "속성")} for r in rows])
@@ -1,6 +1,5 @@
 import streamlit as st
-import pandas as pd
-import os
+from storage import get_storage
 
 # 페이지 기본 설정
 st.set_page_config(
@@ -21,7 +20,8 @@ st.markdown("""
     </p>
 """, unsafe_allow_html=True)
 
-csv_path = "users.csv"
+# 저장소 (MOODFIT_STORAGE=csv|sqlite)
+storage = get_storage()
 
 # -----------------------------------
 # 기본 정보 입력
@@ -77,19 +77,6 @@ if injury_status == "있음":
 
 st.markdown("---")
 
-# -----------------------------------
-# 인코딩 안전 읽기 함수
-# -----------------------------------
-def read_csv_robust(path: str) -> pd.DataFrame:
-    encodings_to_try = ["utf-8-sig", "utf-8", "cp949"]
-    last_err = None
-    for enc in encodings_to_try:
-        try:
-            return pd.read_csv(path, encoding=enc)
-        except Exception as e:
-            last_err = e
-    raise last_err
-
 # -----------------------------------
 # 등록 버튼
 # -----------------------------------
@@ -99,36 +86,28 @@ if st.button("💾 회원 등록 완료", use_container_width=True):
     if name.strip() == "":
         st.warning("⚠️ 이름을 입력해주세요.")
     else:
-        new_data = pd.DataFrame({
-            "이름": [name],
-            "나이": [age],
-            "성별": [gender],
-            "키(cm)": [height],
-            "몸무게(kg)": [weight],
-            "활동량": [activity],
-            "부상 이력": [injury_status],
-            "부상 상세": [injury_detail]
-        })
-
-        # CSV 파일이 존재하는 경우
-        if os.path.exists(csv_path):
-            try:
-                existing = read_csv_robust(csv_path)
-            except Exception as e:
-                st.error(f"❌ CSV 인코딩 오류 발생: {e}")
-                st.info("파일을 엑셀로 연 뒤 '다른 이름으로 저장 → CSV UTF-8'로 저장하면 해결돼요!")
-                st.stop()
-
-            # 중복 회원 체크
-            if "이름" in existing.columns and name in existing["이름"].astype(str).values:
-                st.warning("⚠️ 이미 등록된 회원입니다.")
-            else:
-                updated = pd.concat([existing, new_data], ignore_index=True)
-                updated.to_csv(csv_path, index=False, encoding="utf-8-sig")
-                st.success("🎉 회원 등록이 완료되었습니다!")
-                st.balloons()
+        new_data = {
+            "이름": name,
+            "나이": age,
+            "성별": gender,
+            "키(cm)": height,
+            "몸무게(kg)": weight,
+            "활동량": activity,
+            "부상 이력": injury_status,
+            "부상 상세": injury_detail
+        }
+
+        try:
+            existing = storage.get_user(name)
+        except Exception as e:
+            st.error(f"❌ CSV 인코딩 오류 발생: {e}")
+            st.info("파일을 엑셀로 연 뒤 '다른 이름으로 저장 → CSV UTF-8'로 저장하면 해결돼요!")
+            st.stop()
 
+        # 중복 회원 체크
+        if existing is not None:
+            st.warning("⚠️ 이미 등록된 회원입니다.")
         else:
-            # 새 파일 생성
-            new_data.to_csv(csv_path, index=False, encoding="utf-8-sig")
+            storage.add_user(new_data)
             st.success("🎉 회원 등록이 완료되었습니다!")
+            st.balloons()
@@ -0,0 +1,137 @@
+# weather.py
+# -*- coding: utf-8 -*-
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+from clients import get_http_session, fake_providers_enabled, WEATHER_TIMEOUT
+from tracing import span, bind
+
+# .env는 프로세스 시작 시 한 번만
+load_dotenv()
+
+# 신선한 결과로 쓰는 시간 / 만료 후에도 갱신하는 동안 그대로 보여줄 최대 시간 (초)
+WEATHER_TTL = float(os.getenv("WEATHER_TTL_SEC", "600"))
+WEATHER_MAX_STALE = float(os.getenv("WEATHER_MAX_STALE_SEC", "3600"))
+# 조회 실패는 짧게만 기억 (API를 계속 두드리지 않도록)
+WEATHER_ERROR_TTL = 60.0
+# 캐시가 없을 때 첫 조회를 기다리는 최대 시간
+WEATHER_WAIT_TIMEOUT = 5.0
+
+UNKNOWN = ("unknown", 0.0)
+
+# 도시키 → (만료시각, 조회시각, (weather, temp))
+_cache = {}
+# 도시키 → 진행 중인 조회 Future (같은 도시는 요청 1번만)
+_inflight = {}
+_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="weather")
+
+
+def normalize_city(city: str) -> str:
+    return " ".join(str(city or "").split()).lower()
+
+
+# =========================
+# 1) 실제 API 호출
+# =========================
+def fetch_weather(city: str):
+    """
+    OpenWeatherMap 조회. 키가 없거나 실패하면 None
+    """
+    key = os.getenv("WEATHER_API_KEY")
+    if not key and not fake_providers_enabled():
+        return None
+
+    url = "http://api.openweathermap.org/data/2.5/weather"
+    params = {"q": city, "appid": key, "lang": "kr", "units": "metric"}
+    with span("weather_api", city=city) as sp:
+        try:
+            res = get_http_session().get(url, params=params, timeout=WEATHER_TIMEOUT)
+            sp.set(bytes=len(getattr(res, "content", b"") or b""))
+            data = res.json()
+            weather = data.get("weather", [{}])[0].get("main", "unknown").lower()
+            temp = float(data.get("main", {}).get("temp", 0))
+            return weather, temp
+        except Exception as e:
+            sp.set(error=type(e).__name__)
+            return None
+
+
+def _refresh(city_key: str, city: str):
+    """
+    진행 중인 조회가 있으면 그 Future를, 없으면 새로 시작해서 반환
+    """
+    with _lock:
+        fut = _inflight.get(city_key)
+        if fut is not None:
+            return fut
+
+        def job():
+            try:
+                value = fetch_weather(city)
+                now = time.monotonic()
+                with _lock:
+                    old = _cache.get(city_key)
+                    if value is not None:
+                        _cache[city_key] = (now + WEATHER_TTL, now, value)
+                    elif old is not None:
+                        # 실패하면 이전 값을 유지하되 잠시 재시도하지 않음
+                        _cache[city_key] = (now + WEATHER_ERROR_TTL, old[1], old[2])
+                    else:
+                        _cache[city_key] = (now + WEATHER_ERROR_TTL, now, UNKNOWN)
+                return value
+            finally:
+                with _lock:
+                    _inflight.pop(city_key, None)
+
+        fut = _executor.submit(bind(job))
+        _inflight[city_key] = fut
+        return fut
+
+
+# =========================
+# 2) 캐시 + stale-while-revalidate 조회
+# =========================
+def get_weather(city: str):
+    """
+    (weather, temp) 반환.
+    - TTL 안: 캐시 그대로
+    - TTL 지남(최대 stale 이내): 이전 값 즉시 반환 + 백그라운드 갱신
+    - 캐시 없음: 같은 도시 조회 1건만 실행하고 모두 그 결과를 기다림
+    """
+    with span("get_weather", city=city) as sp:
+        return _get_weather(city, sp)
+
+
+def _get_weather(city, sp):
+    city_key = normalize_city(city)
+    if not city_key:
+        return UNKNOWN
+
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get(city_key)
+
+    if entry is not None:
+        expires_at, fetched_at, value = entry
+        if now < expires_at:
+            sp.set(cache="fresh")
+            return value
+        if now - fetched_at < WEATHER_MAX_STALE:
+            sp.set(cache="stale")
+            _refresh(city_key, city)
+            return value
+
+    sp.set(cache="miss")
+    try:
+        value = _refresh(city_key, city).result(timeout=WEATHER_WAIT_TIMEOUT)
+    except Exception:
+        value = None
+
+    if value is None:
+        return entry[2] if entry is not None else UNKNOWN
+    return value